@@ -0,0 +1,90 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Startup benchmark for resolving the app version.
+
+    python -m benchmarks.app_startup [runs]
+
+Each measurement runs in a fresh interpreter so that imports are cold, as
+they are when a gunicorn worker boots. It compares the old per-call
+pkg_resources lookup with importlib.metadata, and times create_app.
+"""
+import statistics
+import subprocess
+import sys
+
+LOOKUPS = {
+    "pkg_resources": """
+import pkg_resources
+try:
+    pkg_resources.get_distribution('servicex_app').version
+except pkg_resources.DistributionNotFound:
+    pass
+""",
+    "importlib.metadata": """
+from importlib.metadata import version, PackageNotFoundError
+try:
+    version('servicex_app')
+except PackageNotFoundError:
+    pass
+""",
+    "create_app": """
+from unittest import mock
+from servicex import create_app
+from tests.resource_test_base import ResourceTestBase
+config = ResourceTestBase._app_config()
+config.update({'TRANSFORMER_MANAGER_ENABLED': False,
+               'DID_FINDER_DEFAULT_SCHEME': 'rucio', 'VALID_DID_SCHEMES': ['rucio']})
+with mock.patch('builtins.print'):
+    create_app(config, provided_rabbit_adaptor=mock.MagicMock())
+"""
+}
+
+TIMER = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def time_cold(code):
+    output = subprocess.run([sys.executable, "-c", TIMER.format(code=code)],
+                            check=True, stdout=subprocess.PIPE).stdout
+    return float(output.decode().split()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for label, code in LOOKUPS.items():
+        timings = [time_cold(code) for _ in range(runs)]
+        print(f"{label:>18}: {statistics.median(timings) * 1e3:8.1f} ms (median of {runs})")
+
+
+if __name__ == '__main__':
+    main()
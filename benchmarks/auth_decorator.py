@@ -0,0 +1,89 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Microbenchmark for auth_required with and without the authorized user cache.
+
+    python -m benchmarks.auth_decorator [calls]
+
+JWT verification is stubbed out so that the timings show the cost of the
+user lookup alone, against an in-memory SQLite database.
+"""
+import sys
+import timeit
+from unittest import mock
+
+from flask import make_response
+from sqlalchemy import event
+
+from servicex import create_app
+from servicex.decorators import auth_required
+from servicex.models import UserModel, db
+from tests.resource_test_base import ResourceTestBase
+
+
+@auth_required
+def fake_route():
+    return make_response({'data': 'abc123'})
+
+
+def run(ttl, calls):
+    config = ResourceTestBase._app_config()
+    config.update({'ENABLE_AUTH': True, 'AUTH_USER_CACHE_TTL': ttl,
+                   'TRANSFORMER_MANAGER_ENABLED': False,
+                   'DID_FINDER_DEFAULT_SCHEME': 'rucio',
+                   'VALID_DID_SCHEMES': ['rucio']})
+    app = create_app(config,
+                     provided_rabbit_adaptor=mock.MagicMock(),
+                     provided_code_gen_service=mock.MagicMock(),
+                     provided_lookup_result_processor=mock.MagicMock(),
+                     provided_docker_repo_adapter=mock.MagicMock())
+    with app.test_request_context():
+        db.init_app(app)
+        db.create_all()
+        UserModel(name='Jane Doe', email='jane@example.com', sub='janedoe',
+                  refresh_token='abcdef', pending=False).save_to_db()
+        UserModel._auth_cache.clear()
+
+        statements = []
+        event.listen(db.get_engine(), "before_cursor_execute",
+                     lambda *args: statements.append(args[2]))
+        with mock.patch('servicex.decorators.verify_jwt_in_request'), \
+                mock.patch('servicex.decorators.get_jwt_identity', return_value='janedoe'):
+            seconds = timeit.timeit(fake_route, number=calls)
+    return seconds / calls, len(statements) / calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for label, ttl in [("uncached", 0), ("cached", 60)]:
+        per_call, queries = run(ttl, calls)
+        print(f"{label:>9}: {per_call * 1e6:8.1f} us/call {queries:6.3f} queries/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+Microbenchmark for connections opened to the Kubernetes API server by a
+transformer launch and shutdown cycle.
+
+    python -m benchmarks.k8s_client_reuse [cycles]
+
+A local plain HTTP server stands in for the API server and counts the
+connections it accepts. Each of them would be a TLS handshake against a
+real cluster. The per-call case builds a new API object, and so a new
+ApiClient, for every operation, as the TransformerManager used to.
+"""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from kubernetes import client
+
+from servicex import create_app
+from servicex.models import db
+from servicex.transformer_manager import TransformerManager
+from tests.resource_test_base import ResourceTestBase
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeApiHandler)
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_DELETE = do_GET = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+def per_call_cycle(request_id, namespace):
+    name = "transformer-" + request_id
+    client.AppsV1Api().create_namespaced_deployment(body={}, namespace=namespace)
+    client.AutoscalingV1Api().create_namespaced_horizontal_pod_autoscaler(
+        body={}, namespace=namespace)
+    client.AutoscalingV1Api().delete_namespaced_horizontal_pod_autoscaler(
+        name=name, namespace=namespace)
+    client.AppsV1Api().delete_namespaced_deployment(name=name, namespace=namespace)
+
+
+def shared_cycle(manager, request_id, namespace):
+    manager.launch_transformer_jobs(
+        image='sslhep/servicex-transformer:develop', request_id=request_id,
+        workers=1, chunk_size=500, rabbitmq_uri='amqp://localhost',
+        namespace=namespace, x509_secret='x509', generated_code_cm=None,
+        result_destination='object-store', result_format='parquet')
+    manager.shutdown_transformer_job(request_id, namespace)
+
+
+def run(server, cycles):
+    configuration = client.Configuration()
+    configuration.host = 'http://127.0.0.1:%d' % server.server_address[1]
+    client.Configuration.set_default(configuration)
+
+    with mock.patch('kubernetes.config.load_kube_config'):
+        manager = TransformerManager('external-kubernetes')
+
+    config = ResourceTestBase._app_config()
+    config.update({'TRANSFORMER_AUTOSCALE_ENABLED': True,
+                   'MINIO_URL_TRANSFORMER': 'minio:9000',
+                   'MINIO_ACCESS_KEY': 'miniouser',
+                   'MINIO_SECRET_KEY': 'leftfoot1',
+                   'TRANSFORMER_CPU_LIMIT': 1,
+                   'TRANSFORMER_CPU_SCALE_THRESHOLD': 70,
+                   'TRANSFORMER_MIN_REPLICAS': 1,
+                   'TRANSFORMER_MAX_REPLICAS': 20,
+                   'DID_FINDER_DEFAULT_SCHEME': 'rucio',
+                   'VALID_DID_SCHEMES': ['rucio']})
+    app = create_app(config,
+                     provided_transformer_manager=manager,
+                     provided_rabbit_adaptor=mock.MagicMock(),
+                     provided_code_gen_service=mock.MagicMock(),
+                     provided_lookup_result_processor=mock.MagicMock(),
+                     provided_docker_repo_adapter=mock.MagicMock())
+
+    results = {}
+    with app.app_context(), mock.patch('builtins.print'):
+        # Launches check whether the request has already finished
+        db.init_app(app)
+        db.create_all()
+        for label, cycle in [("per-call", per_call_cycle),
+                             ("shared", lambda r, n: shared_cycle(manager, r, n))]:
+            before = server.connections
+            for i in range(cycles):
+                cycle('req-%d' % i, 'servicex')
+            results[label] = (server.connections - before) / cycles
+    return results
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    server = FakeApiServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for label, connections in run(server, cycles).items():
+            print(f"{label:>9}: {connections:6.2f} connections/cycle")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Fingerprint of a request's output-determining fields
+
+Revision ID: 3b7d2e9f4c61
+Revises: 8c41d0b7a9e2
+Create Date: 2026-10-18 16:05:12.418273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d2e9f4c61'
+down_revision = '8c41d0b7a9e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('requests', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_requests_fingerprint'), 'requests', ['fingerprint'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_requests_fingerprint'), table_name='requests')
+    op.drop_column('requests', 'fingerprint')
@@ -0,0 +1,53 @@
+"""Per-request progress counters
+
+Revision ID: 5e3f2a8c1d47
+Revises: 04b9fb8ffee1
+Create Date: 2026-10-18 14:30:12.417233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e3f2a8c1d47'
+down_revision = '04b9fb8ffee1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('requests', sa.Column('completed_files', sa.Integer(),
+                                        nullable=False, server_default='0'))
+    op.add_column('requests', sa.Column('failed_files', sa.Integer(),
+                                        nullable=False, server_default='0'))
+    op.add_column('requests', sa.Column('processed_bytes', sa.BigInteger(),
+                                        nullable=False, server_default='0'))
+    op.add_column('requests', sa.Column('processed_events', sa.BigInteger(),
+                                        nullable=False, server_default='0'))
+
+    # Seed the counters for requests that already have results recorded
+    op.execute("""
+        UPDATE requests SET
+            completed_files = (
+                SELECT COUNT(*) FROM transform_result
+                WHERE transform_result.request_id = requests.request_id
+                AND transform_result.transform_status = 'success'),
+            failed_files = (
+                SELECT COUNT(*) FROM transform_result
+                WHERE transform_result.request_id = requests.request_id
+                AND transform_result.transform_status <> 'success'),
+            processed_bytes = (
+                SELECT COALESCE(SUM(transform_result.total_bytes), 0) FROM transform_result
+                WHERE transform_result.request_id = requests.request_id),
+            processed_events = (
+                SELECT COALESCE(SUM(transform_result.total_events), 0) FROM transform_result
+                WHERE transform_result.request_id = requests.request_id)
+    """)
+
+
+def downgrade():
+    op.drop_column('requests', 'processed_events')
+    op.drop_column('requests', 'processed_bytes')
+    op.drop_column('requests', 'failed_files')
+    op.drop_column('requests', 'completed_files')
@@ -0,0 +1,24 @@
+"""Earlier request a cached request's results were copied from
+
+Revision ID: 7f2c4a9e1b35
+Revises: 3b7d2e9f4c61
+Create Date: 2026-10-18 19:12:40.702118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2c4a9e1b35'
+down_revision = '3b7d2e9f4c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('requests', sa.Column('cached_from', sa.String(length=48), nullable=True))
+
+
+def downgrade():
+    op.drop_column('requests', 'cached_from')
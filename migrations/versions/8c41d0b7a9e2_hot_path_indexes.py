@@ -0,0 +1,30 @@
+"""Indexes for per-request lookups
+
+Revision ID: 8c41d0b7a9e2
+Revises: 5e3f2a8c1d47
+Create Date: 2026-10-18 15:42:51.093814
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d0b7a9e2'
+down_revision = '5e3f2a8c1d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_transform_result_request_id_transform_status', 'transform_result',
+                    ['request_id', 'transform_status'], unique=False)
+    op.create_index('ix_files_request_id', 'files', ['request_id'], unique=False)
+    op.create_index('ix_file_status_request_id_status', 'file_status',
+                    ['request_id', 'status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_file_status_request_id_status', table_name='file_status')
+    op.drop_index('ix_files_request_id', table_name='files')
+    op.drop_index('ix_transform_result_request_id_transform_status',
+                  table_name='transform_result')
@@ -27,18 +27,25 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_jwt_extended import (JWTManager)
 from flask_restful import Api
 
+from servicex.callback_consumer import CallbackConsumer
 from servicex.code_gen_adapter import CodeGenAdapter
 from servicex.docker_repo_adapter import DockerRepoAdapter
+from servicex.file_status_buffer import FileStatusBuffer
 from servicex.lookup_result_processor import LookupResultProcessor
 from servicex.object_store_manager import ObjectStoreManager
 from servicex.rabbit_adaptor import RabbitAdaptor
+from servicex.request_event_hub import RequestEventHub
 from servicex.routes import add_routes
 from servicex.transformer_manager import TransformerManager
+from servicex.version import resolve_app_version
 
 
 def create_app(test_config=None,
@@ -59,6 +66,9 @@ def create_app(test_config=None,
         app.config.from_mapping(test_config)
         print("Transformer enabled: ", test_config['TRANSFORMER_MANAGER_ENABLED'])
 
+    # Reading package metadata is slow, so only do it once
+    app.app_version = resolve_app_version(app.config.get('APP_VERSION'))
+
     with app.app_context():
         # Validate did-finder scheme
         schemes = app.config['VALID_DID_SCHEMES']
@@ -76,12 +86,18 @@ def create_app(test_config=None,
             object_store = None
 
         if app.config['TRANSFORMER_MANAGER_ENABLED'] and not provided_transformer_manager:
-            transformer_manager = TransformerManager(app.config['TRANSFORMER_MANAGER_MODE'])
+            transformer_manager = TransformerManager(
+                app.config['TRANSFORMER_MANAGER_MODE'],
+                pool_size=app.config.get('TRANSFORMER_API_POOL_SIZE', 10))
         else:
             transformer_manager = provided_transformer_manager
 
         if not provided_rabbit_adaptor:
-            rabbit_adaptor = RabbitAdaptor(app.config['RABBIT_MQ_URL'])
+            rabbit_adaptor = RabbitAdaptor(
+                app.config['RABBIT_MQ_URL'],
+                pool_size=app.config.get('RABBIT_PUBLISHER_POOL_SIZE', 4),
+                max_retries=app.config.get('RABBIT_RETRIES'),
+                max_retry_interval=app.config.get('RABBIT_RETRY_INTERVAL', 10))
         else:
             rabbit_adaptor = provided_rabbit_adaptor
 
@@ -102,10 +118,41 @@ def create_app(test_config=None,
             lookup_result_processor = provided_lookup_result_processor
 
         if not provided_docker_repo_adapter:
-            docker_repo_adapter = DockerRepoAdapter()
+            docker_repo_adapter = DockerRepoAdapter(
+                timeout=app.config.get('DOCKER_REGISTRY_TIMEOUT', 10),
+                positive_ttl=app.config.get('DOCKER_IMAGE_CACHE_TTL', 3600),
+                negative_ttl=app.config.get('DOCKER_IMAGE_NEGATIVE_CACHE_TTL', 60))
+            refresh_interval = app.config.get('DOCKER_IMAGE_REFRESH_INTERVAL')
+            if refresh_interval and app.config.get('TRANSFORMER_VALIDATE_DOCKER_IMAGE'):
+                docker_repo_adapter.start_refresher(
+                    [app.config['TRANSFORMER_DEFAULT_IMAGE']], refresh_interval)
         else:
             docker_repo_adapter = provided_docker_repo_adapter
 
+        # Run the slow submission steps in the background if requested, and
+        # copies of cached results whenever the result cache is on
+        if app.config.get('SUBMISSION_ASYNC_ENABLED') or \
+                app.config.get('TRANSFORM_RESULT_CACHE_ENABLED'):
+            submission_executor = ThreadPoolExecutor(
+                max_workers=app.config.get('SUBMISSION_ASYNC_WORKERS', 4))
+        else:
+            submission_executor = None
+
+        # Pushes progress to clients following a request's event stream
+        event_hub = RequestEventHub(app,
+                                    poll_interval=app.config.get('EVENTS_POLL_INTERVAL', 5),
+                                    max_subscriptions=app.config.get('EVENTS_MAX_STREAMS', 4))
+
+        # Write transformer status updates in bulk rather than one at a time
+        if app.config.get('FILE_STATUS_BUFFER_ENABLED'):
+            file_status_buffer = FileStatusBuffer(
+                app,
+                max_size=app.config.get('FILE_STATUS_BUFFER_SIZE', 500),
+                flush_interval=app.config.get('FILE_STATUS_FLUSH_INTERVAL', 1.0))
+            file_status_buffer.start()
+        else:
+            file_status_buffer = None
+
         api = Api(app)
 
         # ensure the instance folder exists
@@ -120,8 +167,34 @@ def create_app(test_config=None,
             db.init_app(app)
             db.create_all()
 
+            # Submissions being set up in the background when a worker died
+            # are never finished, so fail them rather than leave them hanging
+            if submission_executor:
+                from servicex.models import TransformRequest
+                recovery_age = app.config.get('SUBMISSION_RECOVERY_AGE', 1800)
+                for request in TransformRequest.fail_abandoned_setup(
+                        timedelta(seconds=recovery_age)):
+                    app.logger.warning(f"Marked abandoned request {request.request_id} Fatal")
+                    if request.cached_from and object_store:
+                        try:
+                            object_store.remove_bucket(request.request_id)
+                        except Exception as eek:
+                            app.logger.error(f"Unable to remove bucket "
+                                             f"{request.request_id}: {eek}")
+
         add_routes(api, transformer_manager, rabbit_adaptor, object_store, code_gen_service,
-                   lookup_result_processor, docker_repo_adapter)
+                   lookup_result_processor, docker_repo_adapter, submission_executor,
+                   event_hub, file_status_buffer)
+
+        # Apply callbacks sent over RabbitMQ, using the resources set up above
+        if app.config.get('CALLBACK_QUEUE_ENABLED'):
+            callback_consumer = CallbackConsumer(
+                app, app.config['RABBIT_MQ_URL'],
+                queue_name=app.config.get('CALLBACK_QUEUE', 'servicex_callbacks'),
+                batch_size=app.config.get('CALLBACK_BATCH_SIZE', 100),
+                flush_interval=app.config.get('CALLBACK_FLUSH_INTERVAL', 0.5),
+                event_hub=event_hub)
+            callback_consumer.start()
 
         # Inject useful Python modules to make them available in all templates
         @app.context_processor
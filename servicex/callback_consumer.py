@@ -0,0 +1,260 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+import random
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Set
+
+import pika
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+
+class CallbackConsumer(object):
+    """
+    Applies the callbacks that transformers and DID finders would otherwise
+    make over HTTP, read from a durable RabbitMQ queue. Messages are taken off
+    the queue in micro-batches, applied with the same logic as the internal
+    endpoints, committed in one transaction and then acknowledged, so bursts
+    wait in the broker and nothing is lost if the app restarts. Publishing
+    files to the transformers and shutting them down can't be rolled back,
+    so those only happen once the transaction has committed.
+
+    Each message is a JSON object with the request ID, a type and the body
+    the corresponding endpoint accepts:
+
+        {"type": "file-complete", "request-id": "...", "body": {...}}
+
+    The types are files, fileset-complete, file-complete, file-status (which
+    also needs a file-id) and status.
+    """
+
+    TYPES = ('files', 'fileset-complete', 'file-complete', 'file-status', 'status')
+
+    def __init__(self, app, amqp_url, queue_name='servicex_callbacks',
+                 batch_size: int = 100, flush_interval: float = 0.5,
+                 retry_interval: float = 5, event_hub=None):
+        """
+        :param app: Flask app used to reach the database.
+        :param amqp_url: Comma separated URLs of the RabbitMQ brokers.
+        :param queue_name: Queue to consume callbacks from.
+        :param batch_size: Maximum number of messages applied per transaction.
+        :param flush_interval: Seconds to wait for more messages before
+            applying a partial batch.
+        :param retry_interval: Seconds to wait before reconnecting to the
+            broker, or retrying after the database was unavailable.
+        :param event_hub: Hub to notify of progress on watched requests.
+        """
+        self._app = app
+        self._url_list = [pika.URLParameters(u) for u in amqp_url.split(",")]
+        self.queue_name = queue_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.event_hub = event_hub
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='callback-consumer',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def apply_batch(self, messages: List[dict],
+                    deferred: Optional[List[Callable[[], None]]] = None) -> Set[str]:
+        """
+        Apply a batch of callbacks without committing. Files and file
+        completions are grouped by request and written in bulk. Lookup
+        results are applied before file completions so the completion check
+        sees the final file count.
+        :param messages: Decoded callback messages.
+        :param deferred: If given, publishes and transformer shutdowns are
+            appended to this list to be run after the commit.
+        :return: IDs of the requests whose progress changed.
+        :raises ValueError: If a message has an unknown type.
+        """
+        from servicex.models import db
+        from servicex.resources.add_file_to_dataset import AddFileToDataset
+        from servicex.resources.file_transform_status import FileTransformationStatus
+        from servicex.resources.fileset_complete import FilesetComplete
+        from servicex.resources.transform_status import TransformationStatusInternal
+        from servicex.resources.transformer_file_complete import \
+            TransformerFileCompleteBatch
+
+        grouped = {message_type: OrderedDict() for message_type in self.TYPES}
+        for message in messages:
+            message_type = message.get('type')
+            if message_type not in grouped:
+                raise ValueError(f"Unknown callback type: {message_type}")
+            request_id = message['request-id']
+            body = message['body']
+            if message_type == 'file-status':
+                body = FileTransformationStatus.file_status(request_id, message['file-id'],
+                                                            body)
+            if message_type == 'files' and isinstance(body, list):
+                grouped[message_type].setdefault(request_id, []).extend(body)
+            else:
+                grouped[message_type].setdefault(request_id, []).append(body)
+
+        changed = set()
+        for request_id, files in grouped['files'].items():
+            AddFileToDataset().add_files(request_id, files, deferred)
+
+        for request_id, summaries in grouped['fileset-complete'].items():
+            for summary in summaries:
+                FilesetComplete().record_fileset_complete(request_id, summary, deferred)
+            changed.add(request_id)
+
+        for request_id, infos in grouped['file-complete'].items():
+            if TransformerFileCompleteBatch().record_files_complete(request_id, infos,
+                                                                    deferred):
+                changed.add(request_id)
+            else:
+                current_app.logger.warning(f"File completions for unknown request {request_id}")
+
+        for records in grouped['file-status'].values():
+            db.session.add_all(records)
+
+        for request_id, statuses in grouped['status'].items():
+            for status in statuses:
+                if TransformationStatusInternal().record_status(request_id, status):
+                    changed.add(request_id)
+
+        db.session.flush()
+        return changed
+
+    def _publish_progress(self, request_ids: Set[str]):
+        from servicex.models import TransformRequest
+
+        if not self.event_hub:
+            return
+        watched = [r for r in request_ids if self.event_hub.is_watched(r)]
+        if watched:
+            for transform in TransformRequest.return_requests(watched):
+                self.event_hub.publish_status(transform.request_id, transform.progress_json())
+
+    def _apply(self, bodies) -> Set[str]:
+        from servicex.models import db
+
+        deferred = []
+        changed = self.apply_batch([json.loads(body) for body in bodies], deferred)
+        db.session.commit()
+
+        # The batch is committed and won't be replayed, so a failure here
+        # must not be treated as a failure of the batch
+        for action in deferred:
+            try:
+                action()
+            except Exception as err:
+                current_app.logger.exception(f"Failed to act on committed callbacks: {err}")
+        return changed
+
+    def flush(self, channel, deliveries):
+        """
+        Apply and acknowledge a batch of deliveries. If the batch fails, its
+        messages are retried one at a time and any that still fail are
+        dropped. If the database is unreachable they are all returned to
+        the queue instead.
+        :param channel: Channel the messages were delivered on.
+        :param deliveries: (delivery_tag, body) pairs, in delivery order.
+        """
+        from servicex.models import db
+
+        with self._app.app_context():
+            try:
+                try:
+                    changed = self._apply([body for _, body in deliveries])
+                    channel.basic_ack(delivery_tag=deliveries[-1][0], multiple=True)
+                except OperationalError as err:
+                    db.session.rollback()
+                    current_app.logger.error(f"Database unavailable, requeueing callbacks: {err}")
+                    channel.basic_nack(delivery_tag=deliveries[-1][0], multiple=True,
+                                       requeue=True)
+                    self._stopped.wait(self.retry_interval)
+                    return
+                except Exception as err:
+                    db.session.rollback()
+                    current_app.logger.warning(
+                        f"Failed to apply {len(deliveries)} callbacks together, "
+                        f"applying them one at a time: {err}")
+                    changed = set()
+                    for delivery_tag, body in deliveries:
+                        try:
+                            changed |= self._apply([body])
+                            channel.basic_ack(delivery_tag=delivery_tag)
+                        except Exception as err:
+                            db.session.rollback()
+                            current_app.logger.error(f"Dropping callback {body!r}: {err}")
+                            channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+
+                self._publish_progress(changed)
+            finally:
+                db.session.remove()
+
+    def consume(self, channel):
+        """
+        Read from the queue until stopped, flushing whenever a batch is full
+        or no message has arrived for flush_interval seconds.
+        """
+        deliveries = []
+        for method, _, body in channel.consume(self.queue_name,
+                                               inactivity_timeout=self.flush_interval):
+            if method is not None:
+                deliveries.append((method.delivery_tag, body))
+            if deliveries and (method is None or len(deliveries) >= self.batch_size):
+                self.flush(channel, deliveries)
+                deliveries = []
+            if self._stopped.is_set():
+                break
+        channel.cancel()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                random.shuffle(self._url_list)
+                connection = pika.BlockingConnection(self._url_list)
+                channel = connection.channel()
+                channel.queue_declare(queue=self.queue_name, durable=True)
+                channel.basic_qos(prefetch_count=self.batch_size)
+                self.consume(channel)
+            except pika.exceptions.AMQPError as err:
+                with self._app.app_context():
+                    current_app.logger.warning(
+                        f"Callback consumer lost its connection, retrying: {err}")
+                self._stopped.wait(self.retry_interval)
+            finally:
+                if connection is not None and connection.is_open:
+                    connection.close()
@@ -25,39 +25,102 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import hashlib
+from typing import Optional
+
 import requests
 
+from servicex.cache import LRUCache
 from servicex.models import TransformRequest
 
 
 class CodeGenAdapter:
-    def __init__(self, code_gen_url, transformer_manager):
+    def __init__(self, code_gen_url, transformer_manager, zip_cache_size: int = 64):
+        """
+        :param code_gen_url: Base URL of the code generator service.
+        :param transformer_manager: Creates the ConfigMaps holding generated code.
+        :param zip_cache_size: Number of generated code zips kept in memory.
+        """
         self.code_gen_url = code_gen_url
         self.transformer_manager = transformer_manager
+        self._zip_cache = LRUCache(max_size=zip_cache_size)
+
+    @staticmethod
+    def selection_hash(selection: str, code_gen_image: Optional[str]) -> str:
+        """
+        Content hash identifying the code generated for a selection. The
+        code generator image is included so that upgrading it invalidates
+        previously generated code.
+        :param selection: Selection string of the request.
+        :param code_gen_image: Code generator image the request was submitted with.
+        :return: Hex digest.
+        """
+        digest = hashlib.sha256()
+        digest.update((code_gen_image or "").encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(selection.encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def configmap_name(selection_hash: str) -> str:
+        return "generated-code-{}".format(selection_hash[:40])
+
+    def _fetch_generated_code(self, selection: str, key: str) -> bytes:
+        """
+        Zipped generated code for a selection, from the in-memory cache or
+        from the code generator service.
+        """
+        content = self._zip_cache.get(key)
+        if content is None:
+            result = requests.post(self.code_gen_url + "/servicex/generated-code",
+                                   data=selection)
+
+            if result.status_code != 200:
+                msg = result.json()['Message']
+                raise ValueError(f'Failed to generate translation code: {msg}')
+
+            content = result.content
+            self._zip_cache.put(key, content)
+        return content
 
     def generate_code_for_selection(
         self, request_record: TransformRequest, namespace: str
-    ):
+    ) -> str:
         """
-        Generates the C++ code for a request's selection string.
-        Places the results in a ConfigMap resource in the
-        Starts a transformation request, deploys transformers, and updates record.
+        Generates the C++ code for a request's selection string and places
+        the results in a ConfigMap resource in the given namespace.
+        ConfigMaps are named after a hash of the selection and code generator
+        image, so identical selections share a single ConfigMap and skip the
+        round-trip to the code generator.
         :param request_record: A TransformationRequest.
         :param namespace: Namespace in which to place resulting ConfigMap.
+        :return: Name of the ConfigMap holding the generated code.
+        """
+        return self.ensure_generated_code(request_record.selection,
+                                          request_record.code_gen_image, namespace)
+
+    def ensure_generated_code(self, selection: str, code_gen_image: Optional[str],
+                              namespace: str) -> str:
+        """
+        Make sure the ConfigMap holding the code generated for a selection
+        exists, generating the code and creating it if not. Takes the fields
+        it needs rather than a request, so it can be queued to run later.
+        :param selection: Selection string of the request.
+        :param code_gen_image: Code generator image the request was submitted with.
+        :param namespace: Namespace in which to place resulting ConfigMap.
+        :return: Name of the ConfigMap holding the generated code.
         """
         from io import BytesIO
         from zipfile import ZipFile
 
-        result = requests.post(self.code_gen_url + "/servicex/generated-code",
-                               data=request_record.selection)
-
-        if result.status_code != 200:
-            msg = result.json()['Message']
-            raise ValueError(f'Failed to generate translation code: {msg}')
+        assert self.transformer_manager, "Code Generator won't work without a Transformer Manager"
 
-        zipfile = ZipFile(BytesIO(result.content))
+        key = self.selection_hash(selection, code_gen_image)
+        configmap_name = self.configmap_name(key)
+        if self.transformer_manager.configmap_exists(configmap_name, namespace):
+            return configmap_name
 
-        assert self.transformer_manager, "Code Generator won't work without a Transformer Manager"
+        zipfile = ZipFile(BytesIO(self._fetch_generated_code(selection, key)))
         return self.transformer_manager.create_configmap_from_zip(zipfile,
-                                                                  request_record.request_id,
+                                                                  configmap_name,
                                                                   namespace)
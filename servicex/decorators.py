@@ -44,7 +44,8 @@ def auth_required(fn: Callable[..., Response]) -> Callable[..., Response]:
             verify_jwt_in_request()
         except NoAuthorizationError as exc:
             return make_response({'message': str(exc)}, 401)
-        user = UserModel.find_by_sub(get_jwt_identity())
+        user = UserModel.find_auth_by_sub(get_jwt_identity(),
+                                          ttl=current_app.config.get('AUTH_USER_CACHE_TTL', 60))
         if not user:
             msg = 'Not Authorized: No user found matching this API token. ' \
                   'Your account may have been deleted. ' \
@@ -77,7 +78,8 @@ def admin_required(fn: Callable[..., Response]) -> Callable[..., Response]:
             verify_jwt_in_request()
         except NoAuthorizationError as exc:
             return make_response({'message': str(exc)}, 401)
-        user = UserModel.find_by_sub(get_jwt_identity())
+        user = UserModel.find_auth_by_sub(get_jwt_identity(),
+                                          ttl=current_app.config.get('AUTH_USER_CACHE_TTL', 60))
         if not (user and user.admin):
             return make_response({'message': msg}, 401)
         return fn(*args, **kwargs)
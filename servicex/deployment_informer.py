@@ -0,0 +1,155 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import threading
+from typing import Dict, Iterable, Optional
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+DeploymentStatus = client.V1DeploymentStatus
+
+
+class DeploymentInformer(object):
+    """
+    Keeps an in-memory copy of the status of every transformer deployment in
+    a namespace. The deployments are listed once and then kept up to date by
+    a long-lived watch, so status reads never reach the API server.
+    """
+
+    PREFIX = "transformer-"
+
+    def __init__(self, namespace: str, logger, watch_timeout: int = 300,
+                 retry_interval: float = 1.0, max_retry_interval: float = 30.0,
+                 api_client: Optional[client.ApiClient] = None):
+        """
+        :param namespace: Namespace the transformers are deployed in.
+        :param logger: Logger for errors from the watch thread.
+        :param watch_timeout: Seconds before the API server ends a watch, after
+            which it is resumed from the last resource version seen.
+        :param retry_interval: Delay before relisting after the first error.
+            It doubles for each further error in a row.
+        :param max_retry_interval: Upper limit for the delay between relists.
+        :param api_client: Client to reach the API server with. Defaults to a new one.
+        """
+        self.namespace = namespace
+        self._logger = logger
+        self._watch_timeout = watch_timeout
+        self._retry_interval = retry_interval
+        self._max_retry_interval = max_retry_interval
+        self._api_client = api_client
+
+        self._statuses: Dict[str, DeploymentStatus] = {}
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watch: Optional[watch.Watch] = None
+
+    @property
+    def synced(self) -> bool:
+        """True once the deployments have been listed and while the watch is healthy"""
+        return self._synced.is_set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='deployment-informer',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch:
+            self._watch.stop()
+
+    def get(self, request_id: str) -> Optional[DeploymentStatus]:
+        with self._lock:
+            return self._statuses.get(request_id)
+
+    def get_many(self, request_ids: Iterable[str]) -> Dict[str, DeploymentStatus]:
+        with self._lock:
+            return {request_id: self._statuses[request_id]
+                    for request_id in request_ids if request_id in self._statuses}
+
+    def _request_id(self, deployment) -> Optional[str]:
+        name = deployment.metadata.name
+        if name and name.startswith(self.PREFIX):
+            return name[len(self.PREFIX):]
+        return None
+
+    def _list(self, api: client.AppsV1Api) -> str:
+        results = api.list_namespaced_deployment(self.namespace)
+        statuses = {}
+        for deployment in results.items:
+            request_id = self._request_id(deployment)
+            if request_id:
+                statuses[request_id] = deployment.status
+        with self._lock:
+            self._statuses = statuses
+        self._synced.set()
+        return results.metadata.resource_version
+
+    def _apply(self, event) -> Optional[str]:
+        """
+        Update the cache from a watch event.
+        :return: The resource version to resume the watch from.
+        """
+        if event['type'] == 'ERROR':
+            # Usually 410 Gone, meaning our resource version is too old
+            raise ApiException(status=event['raw_object'].get('code'),
+                               reason=event['raw_object'].get('message'))
+
+        deployment = event['object']
+        request_id = self._request_id(deployment)
+        if request_id:
+            with self._lock:
+                if event['type'] == 'DELETED':
+                    self._statuses.pop(request_id, None)
+                else:
+                    self._statuses[request_id] = deployment.status
+        return deployment.metadata.resource_version
+
+    def _run(self):
+        api = client.AppsV1Api(self._api_client)
+        errors = 0
+        while not self._stopped.is_set():
+            try:
+                resource_version = self._list(api)
+                errors = 0
+                while not self._stopped.is_set():
+                    self._watch = watch.Watch()
+                    for event in self._watch.stream(api.list_namespaced_deployment,
+                                                    self.namespace,
+                                                    resource_version=resource_version,
+                                                    timeout_seconds=self._watch_timeout):
+                        resource_version = self._apply(event) or resource_version
+            except Exception as err:
+                # Serve callers from the API server until we have relisted
+                self._synced.clear()
+                self._logger.warning(f"Deployment watch failed, relisting: {err}")
+                delay = min(self._retry_interval * 2 ** errors, self._max_retry_interval)
+                errors += 1
+                self._stopped.wait(delay)
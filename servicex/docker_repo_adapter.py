@@ -26,13 +26,41 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import re
+import threading
+from typing import Iterable, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from servicex.cache import LRUCache
 
 
 class DockerRepoAdapter:
-    def __init__(self, registry_endpoint="https://hub.docker.com"):
+    def __init__(self, registry_endpoint="https://hub.docker.com",
+                 session: Optional[requests.Session] = None, timeout: float = 10,
+                 positive_ttl: float = 3600, negative_ttl: float = 60,
+                 cache_size: int = 256):
+        """
+        :param registry_endpoint: Base URL of the registry.
+        :param session: Session to make requests with. Defaults to a new pooled one.
+        :param timeout: Seconds to wait for the registry to connect or respond.
+        :param positive_ttl: Seconds to remember that an image exists.
+        :param negative_ttl: Seconds to remember that an image does not exist.
+        :param cache_size: Maximum number of images remembered.
+        """
         self.registry_endpoint = registry_endpoint
+        self.timeout = timeout
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = LRUCache(max_size=cache_size)
+
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+        self._session = session
+
+        self._refresher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
 
     def check_image_exists(self, tagged_image: str) -> bool:
         """
@@ -40,6 +68,12 @@ class DockerRepoAdapter:
         :param tagged_image: Full Docker image name, e.g. "sslhep/servicex_app:latest".
         :return: Whether or not the image exists in the registry.
         """
+        cached = self._cache.get(tagged_image)
+        if cached is not None:
+            return cached
+        return self._query_registry(tagged_image)
+
+    def _query_registry(self, tagged_image: str) -> bool:
         search_result = re.search("(.+)/(.+):(.+)", tagged_image)
         if not search_result or len(search_result.groups()) != 3:
             return False
@@ -47,9 +81,40 @@ class DockerRepoAdapter:
         (repo, image, tag) = search_result.groups()
 
         query = f'{self.registry_endpoint}/v2/repositories/{repo}/{image}/tags/{tag}'
-        r = requests.get(query)
+        r = self._session.get(query, timeout=self.timeout)
         if r.status_code == 404:
+            self._cache.put(tagged_image, False, ttl=self.negative_ttl)
             return False
 
-        print("Requested Image: "+tagged_image+" exists, last updated "+r.json()['last_updated'])
+        # Anything else, such as being rate limited, is not worth remembering
+        if r.status_code == 200:
+            print("Requested Image: "+tagged_image+" exists, last updated " +
+                  r.json()['last_updated'])
+            self._cache.put(tagged_image, True, ttl=self.positive_ttl)
         return True
+
+    def start_refresher(self, images: Iterable[str], interval: float):
+        """
+        Re-check some images in a background thread, so that their cache
+        entries never expire and submissions using them skip the network.
+        :param images: Images to keep fresh, e.g. the default transformer image.
+        :param interval: Seconds between checks. Should be less than positive_ttl.
+        """
+        images = list(images)
+
+        def refresh():
+            while True:
+                for image in images:
+                    try:
+                        self._query_registry(image)
+                    except requests.RequestException as err:
+                        print(f"Failed to refresh Docker image {image}: {err}")
+                if self._stopped.wait(interval):
+                    return
+
+        self._refresher = threading.Thread(target=refresh, name='docker-image-refresher',
+                                           daemon=True)
+        self._refresher.start()
+
+    def stop_refresher(self):
+        self._stopped.set()
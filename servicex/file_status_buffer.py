@@ -0,0 +1,169 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import atexit
+import threading
+import time
+from typing import List
+
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+
+from servicex.models import FileStatus
+
+
+class FileStatusBuffer(object):
+    """
+    Per-process write-behind buffer for the status updates transformers send
+    for each file. Updates are queued in memory and written with one bulk
+    insert when the buffer fills up or every flush_interval seconds, rather
+    than with a transaction per update. Whatever is left is flushed when the
+    process exits.
+    """
+
+    def __init__(self, app, max_size: int = 500, flush_interval: float = 1.0,
+                 max_pending: int = 10000):
+        """
+        :param app: Flask app used to reach the database.
+        :param max_size: Number of buffered updates that triggers a flush.
+        :param flush_interval: Maximum seconds an update waits to be written.
+        :param max_pending: Updates kept for retry while the database is
+            unavailable. Beyond this the oldest are dropped.
+        """
+        self._app = app
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._rows: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.flushed = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, file_status: FileStatus):
+        """Queue a status update to be written with the next flush"""
+        with self._lock:
+            self._rows.append(file_status.to_row())
+            full = len(self._rows) >= self.max_size
+        if full:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._rows),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "last-flush-latency": self.last_flush_latency,
+            "max-flush-latency": self.max_flush_latency
+        }
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return rows
+
+    def _requeue(self, rows: List[dict]):
+        with self._lock:
+            self._rows = rows + self._rows
+            overflow = len(self._rows) - self.max_pending
+            if overflow > 0:
+                del self._rows[:overflow]
+                self.dropped += overflow
+
+    def flush(self) -> int:
+        """
+        Write out everything buffered so far.
+        :return: Number of updates written.
+        """
+        with self._flush_lock, self._app.app_context():
+            rows = self._take()
+            if not rows:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                FileStatus.bulk_insert(rows)
+                written = len(rows)
+            except OperationalError as err:
+                current_app.logger.error(f"Failed to write file statuses, will retry: {err}")
+                self._requeue(rows)
+                return 0
+            except Exception as err:
+                # A bad row fails the whole statement, so save the rest
+                current_app.logger.warning(f"Failed to bulk write file statuses: {err}")
+                written = 0
+                for row in rows:
+                    try:
+                        FileStatus.bulk_insert([row])
+                        written += 1
+                    except Exception as row_err:
+                        current_app.logger.error(f"Dropping file status {row}: {row_err}")
+                        self.dropped += 1
+
+            self.last_flush_latency = time.perf_counter() - start
+            self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+            self.flushed += written
+            self.flushes += 1
+            return written
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='file-status-flusher',
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Stop the flusher thread and write out anything still buffered"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as err:
+                with self._app.app_context():
+                    current_app.logger.error(f"File status flusher failed: {err}")
@@ -0,0 +1,148 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import atexit
+import queue
+import random
+import threading
+from typing import Callable, Optional
+
+from flask import current_app
+from kubernetes.client.rest import ApiException
+
+# Client errors that won't go away by trying again
+_PERMANENT_ERRORS = {400, 401, 403, 404, 409, 410, 422}
+
+
+class KubernetesWorkQueue(object):
+    """
+    Runs Kubernetes API operations on a background thread, so request
+    handlers only have to queue them. Operations run one at a time in the
+    order they were submitted. Each is retried with exponential backoff before
+    the next one starts, so a deployment queued for deletion after its
+    creation is never deleted first. That only holds within one queue: each
+    worker process has its own, so callers must cope with operations on the
+    same resources submitted from other processes. Operations must be
+    idempotent, since a retried call may already have taken effect.
+    """
+
+    def __init__(self, logger, max_attempts: int = 6, retry_interval: float = 1.0,
+                 max_retry_interval: float = 30.0):
+        """
+        :param logger: Logger for failed operations.
+        :param max_attempts: Attempts at an operation before giving up on it.
+        :param retry_interval: Delay before the first retry. It doubles for
+            each further failure.
+        :param max_retry_interval: Upper limit for the delay between attempts.
+        """
+        self._logger = logger
+        self.max_attempts = max_attempts
+        self._retry_interval = retry_interval
+        self._max_retry_interval = max_retry_interval
+
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.failed = 0
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def submit(self, description: str, operation: Callable[[], None],
+               on_failure: Optional[Callable[[str], None]] = None):
+        """
+        Queue an operation. It runs inside the current app's context.
+        :param description: What the operation does, for the logs.
+        :param operation: Makes the API calls.
+        :param on_failure: Called with an error message, in the app's
+            context, if the operation is given up on.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='kubernetes-work-queue',
+                                                daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        self._queue.put((description, operation, on_failure,
+                         current_app._get_current_object()))
+
+    def join(self):
+        """Wait until every queued operation has run"""
+        self._queue.join()
+
+    def close(self, timeout: float = 30):
+        """
+        Finish the queued operations, waiting up to timeout seconds, and stop
+        the worker thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._stopped.set()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._execute(*item)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, description, operation, on_failure, app) -> bool:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with app.app_context():
+                    operation()
+                return True
+            except ApiException as eek:
+                err = eek
+                if eek.status in _PERMANENT_ERRORS:
+                    break
+            except Exception as eek:
+                err = eek
+
+            if attempt < self.max_attempts:
+                delay = min(self._retry_interval * 2 ** (attempt - 1), self._max_retry_interval)
+                self._logger.warning(f"Failed to {description}, retrying: {err}")
+                # Add jitter so that workers don't retry in lock-step
+                if self._stopped.wait(delay * random.uniform(0.5, 1.0)):
+                    break
+
+        message = f"Failed to {description}: {err}"
+        self._logger.error(message)
+        self.failed += 1
+        if on_failure:
+            try:
+                with app.app_context():
+                    on_failure(message)
+            except Exception as eek:
+                self._logger.error(f"Failed to record that {description} failed: {eek}")
+        return False
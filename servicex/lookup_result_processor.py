@@ -27,6 +27,8 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import json
 
+from servicex.models import DatasetFile
+
 
 class LookupResultProcessor:
     def __init__(self, rabbitmq_adaptor, advertised_endpoint):
@@ -46,10 +48,8 @@ class LookupResultProcessor:
                                             routing_key='validation_requests',
                                             body=json.dumps(preflight_request))
 
-    def add_file_to_dataset(self, submitted_request, dataset_file):
+    def _transform_request_message(self, submitted_request, dataset_file):
         request_id = submitted_request.request_id
-        dataset_file.save_to_db()
-
         transform_request = {
             'request-id': request_id,
             'file-id': dataset_file.id,
@@ -68,11 +68,46 @@ class LookupResultProcessor:
             transform_request.update(
                 {'kafka-broker': submitted_request.kafka_broker}
             )
+        return transform_request
+
+    def add_file_to_dataset(self, submitted_request, dataset_file):
+        request_id = submitted_request.request_id
+        dataset_file.save_to_db()
+
+        transform_request = self._transform_request_message(submitted_request,
+                                                            dataset_file)
 
         self.rabbitmq_adaptor.basic_publish(exchange='transformation_requests',
                                             routing_key=request_id,
                                             body=json.dumps(transform_request))
 
+    def add_files_to_dataset(self, submitted_request, dataset_files, deferred=None):
+        """
+        Record a batch of files for a request with a single bulk insert and
+        then publish the transform request messages in batches.
+        :param submitted_request: The TransformRequest the files belong to
+        :param dataset_files: List of transient DatasetFile records
+        :param deferred: If given, the publish is appended to this list rather
+            than run, so the caller can send it once the files are committed.
+        """
+        DatasetFile.bulk_save_to_db(dataset_files)
+
+        request_id = submitted_request.request_id
+        bodies = [
+            json.dumps(self._transform_request_message(submitted_request, dataset_file))
+            for dataset_file in dataset_files
+        ]
+
+        def publish():
+            self.rabbitmq_adaptor.publish_many(exchange='transformation_requests',
+                                               routing_key=request_id,
+                                               bodies=bodies)
+
+        if deferred is None:
+            publish()
+        else:
+            deferred.append(publish)
+
     def report_fileset_complete(self, submitted_request,
                                 num_files, num_skipped=0, total_events=0,
                                 total_bytes=0, did_lookup_time=0):
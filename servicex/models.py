@@ -26,21 +26,36 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import hashlib
+import json
+from collections import defaultdict, deque
 from datetime import datetime, timedelta
-from typing import Iterable, List, Optional
+from typing import Iterable, List, NamedTuple, Optional, Tuple
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func, ForeignKey, DateTime
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 
+from servicex.cache import LRUCache
 from servicex.mailgun_adaptor import MailgunAdaptor
 
 db = SQLAlchemy()
 max_string_size = 10485760
 
 
+class AuthUser(NamedTuple):
+    """The fields of a user checked by auth_required and admin_required"""
+    id: int
+    pending: bool
+    admin: bool
+
+
 class UserModel(db.Model):
     __tablename__ = 'users'
+
+    # Users recently authorized by an API token, keyed by sub
+    _auth_cache = LRUCache(max_size=10000)
+
     admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(DateTime, default=datetime.utcnow)
     email = db.Column(db.String(320), nullable=False, unique=True)
@@ -61,6 +76,7 @@ class UserModel(db.Model):
     def delete_from_db(self):
         db.session.delete(self)
         db.session.commit()
+        UserModel.invalidate_auth(self.sub)
 
     def send_email(self, template_path):
         MailgunAdaptor().send(self.email, template_path)
@@ -73,6 +89,30 @@ class UserModel(db.Model):
     def find_by_sub(cls, sub) -> Optional['UserModel']:
         return cls.query.filter_by(sub=sub).first()
 
+    @classmethod
+    def find_auth_by_sub(cls, sub, ttl: float = 60) -> Optional[AuthUser]:
+        """
+        Look up the user behind an API token, answering from a per-process
+        cache when possible. Pending users are not cached, so that accepting
+        them takes effect at once in every process.
+        :param sub: Subject of the token.
+        :param ttl: Seconds an active user stays cached. 0 disables caching.
+        :return: The user's id, pending and admin flags, or None if not found.
+        """
+        auth_user = cls._auth_cache.get(sub)
+        if auth_user is None:
+            user = cls.find_by_sub(sub)
+            if not user:
+                return None
+            auth_user = AuthUser(user.id, user.pending, user.admin)
+            if ttl and not user.pending:
+                cls._auth_cache.put(sub, auth_user, ttl=ttl)
+        return auth_user
+
+    @classmethod
+    def invalidate_auth(cls, sub):
+        cls._auth_cache.invalidate(sub)
+
     # Defined for convenience in testing, since query is difficult to mock.
     @classmethod
     def find_by_id(cls, user_id) -> Optional['UserModel']:
@@ -104,12 +144,14 @@ class UserModel(db.Model):
     def delete_all(cls):
         num_rows_deleted = db.session.query(cls).delete()
         db.session.commit()
+        cls._auth_cache.clear()
         return {'message': '{} row(s) deleted'.format(num_rows_deleted)}
 
     @classmethod
     def delete_all_pending(cls):
         num_rows_deleted = db.session.query.filter_by(pending=True).delete()
         db.session.commit()
+        cls._auth_cache.clear()
         return {'message': '{} row(s) deleted'.format(num_rows_deleted)}
 
     @classmethod
@@ -119,6 +161,7 @@ class UserModel(db.Model):
             raise NoResultFound(f"No user registered with email: {email}")
         pending_user.pending = False
         pending_user.save_to_db()
+        UserModel.invalidate_auth(pending_user.sub)
         pending_user.send_email('welcome.html')
 
     @staticmethod
@@ -130,12 +173,30 @@ class UserModel(db.Model):
         return UserModel.generate_hash(provided_password) == key
 
 
+class RequestSubmission(NamedTuple):
+    """The fields of a transformation request that are fixed at submission"""
+    id: int
+    request_id: str
+    did: str
+    columns: Optional[str]
+    tree_name: Optional[str]
+    chunk_size: Optional[int]
+    result_destination: str
+    kafka_broker: Optional[str]
+
+
 class TransformRequest(db.Model):
     __tablename__ = 'requests'
     OBJECT_STORE_DEST = 'object-store'
     KAFKA_DEST = 'kafka'
 
-    _cache = {}
+    # Submission fields never change after a request is created, so the
+    # internal callbacks can read them from here instead of loading the row
+    _cache = LRUCache(max_size=1000, ttl=3600)
+
+    # Statuses of a request while it is set up on the submission executor
+    SETUP_STATUSES = ("Queued", "Creating Bucket", "Validating Image", "Generating Code",
+                      "Configuring Queues", "Copying Results")
 
     id = db.Column(db.Integer, primary_key=True)
     request_id = db.Column(db.String(48), unique=True, nullable=False, index=True)
@@ -164,11 +225,58 @@ class TransformRequest(db.Model):
     failure_description = db.Column(db.String(max_string_size), nullable=True)
     app_version = db.Column(db.String(64), nullable=True)
     code_gen_image = db.Column(db.String(256), nullable=True)
+    # Hash of the fields that determine a request's output, see compute_fingerprint
+    fingerprint = db.Column(db.String(64), nullable=True, index=True)
+    # Earlier request whose results this one was answered with
+    cached_from = db.Column(db.String(48), nullable=True)
+
+    # Progress counters maintained as transformers report each file
+    completed_files = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failed_files = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    processed_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    processed_events = db.Column(db.BigInteger, nullable=False, default=0,
+                                 server_default='0')
 
     def save_to_db(self):
         db.session.add(self)
         db.session.flush()
 
+    def record_file_result(self, transform_status, total_bytes, total_events):
+        """
+        Bump the progress counters for a file reported by a transformer.
+        The increments are written as SQL expressions so that concurrent
+        reports are applied atomically by the database; the counters are
+        reloaded from the row the next time they are read.
+        :param transform_status: Status reported for the file
+        :param total_bytes: Bytes produced for the file
+        :param total_events: Events processed in the file
+        """
+        self.record_file_results([(transform_status, total_bytes, total_events)])
+
+    def record_file_results(self, results: Iterable[Tuple[str, Optional[int], Optional[int]]]):
+        """
+        Bump the progress counters once for a batch of files, as
+        record_file_result does for a single one.
+        :param results: (transform_status, total_bytes, total_events) per file
+        """
+        completed = failed = processed_bytes = processed_events = 0
+        for transform_status, total_bytes, total_events in results:
+            if transform_status == 'success':
+                completed += 1
+            else:
+                failed += 1
+            processed_bytes += total_bytes or 0
+            processed_events += total_events or 0
+
+        cls = TransformRequest
+        if completed:
+            self.completed_files = cls.completed_files + completed
+        if failed:
+            self.failed_files = cls.failed_files + failed
+        self.processed_bytes = cls.processed_bytes + processed_bytes
+        self.processed_events = cls.processed_events + processed_events
+        self.save_to_db()
+
     def to_json(self):
         return {
             'request_id': self.request_id,
@@ -187,7 +295,17 @@ class TransformRequest(db.Model):
             'status': self.status,
             'failure-info': self.failure_description,
             'app-version': self.app_version,
-            'code-gen-image': self.code_gen_image
+            'code-gen-image': self.code_gen_image,
+            'cached-from': self.cached_from
+        }
+
+    def progress_json(self) -> dict:
+        return {
+            "status": self.status,
+            "request-id": self.request_id,
+            "files-processed": self.files_processed,
+            "files-skipped": self.files_failed,
+            "files-remaining": self.files_remaining
         }
 
     @classmethod
@@ -195,13 +313,24 @@ class TransformRequest(db.Model):
         return {'requests': [r.to_json() for r in requests]}
 
     @classmethod
-    def get_request_cached(cls, request_id):
-        if request_id in TransformRequest._cache:
-            return TransformRequest._cache[request_id]
+    def get_request_cached(cls, request_id) -> Optional['RequestSubmission']:
+        """
+        Look up the immutable submission fields of a request, only going to
+        the database on a cache miss.
+        :param request_id: UUID of transformation request.
+        :return: The submission fields, or None if there is no such request.
+        """
+        def load():
+            row = db.session.query(
+                *[getattr(cls, field) for field in RequestSubmission._fields]
+            ).filter_by(request_id=request_id).one_or_none()
+            return RequestSubmission(*row) if row else None
+
+        return cls._cache.get_or_load(request_id, load)
 
-        live_val = TransformRequest.return_request(request_id)
-        TransformRequest._cache[request_id] = live_val.id
-        return live_val.id
+    @classmethod
+    def invalidate_cached(cls, request_id):
+        cls._cache.invalidate(request_id)
 
     @classmethod
     def return_request(cls, request_id) -> Optional['TransformRequest']:
@@ -210,6 +339,100 @@ class TransformRequest(db.Model):
         except NoResultFound:
             return None
 
+    @classmethod
+    def return_requests(cls, request_ids: Iterable[str]) -> List['TransformRequest']:
+        """
+        Load several requests in a single query. Unknown IDs are ignored.
+        :param request_ids: UUIDs of transformation requests.
+        """
+        return cls.query.filter(cls.request_id.in_(list(request_ids))).all()
+
+    def compute_fingerprint(self, file_list: Optional[List[str]] = None) -> str:
+        """
+        Hash of everything that determines the output of a transform, so that
+        byte-identical resubmissions can be recognised.
+        :param file_list: Static list of files, for requests without a DID.
+        :return: Hex digest.
+        """
+        fields = [self.did, file_list, self.columns, self.selection, self.tree_name,
+                  self.image, self.code_gen_image, self.chunk_size,
+                  self.result_destination, self.result_format]
+        return hashlib.sha256(json.dumps(fields).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def find_cached_result(cls, fingerprint: str) -> Optional['TransformRequest']:
+        """
+        The most recent request with this fingerprint that completed without
+        any failed files, whose results could be served again.
+        :param fingerprint: Fingerprint of the new request.
+        """
+        return cls.query.filter_by(fingerprint=fingerprint,
+                                   status="Complete",
+                                   failed_files=0) \
+            .order_by(cls.id.desc()).first()
+
+    def complete_from_cached(self, cached: 'TransformRequest'):
+        """
+        Mark this request Complete with the results of an identical earlier
+        one, copying its file and progress counters.
+        :param cached: The completed request found by find_cached_result.
+        """
+        for column in ['files', 'files_skipped', 'total_events', 'total_bytes',
+                       'did_lookup_time', 'completed_files', 'failed_files',
+                       'processed_bytes', 'processed_events']:
+            setattr(self, column, getattr(cached, column))
+        self.cached_from = cached.request_id
+        self.status = 'Complete'
+
+    @classmethod
+    def fail_abandoned_setup(cls, older_than: timedelta) -> List['TransformRequest']:
+        """
+        Mark Fatal the requests left part way through setup on the submission
+        executor of a worker process that has since died. Their setup will
+        never finish, and the file list of a file list request isn't kept, so
+        it can't be started again.
+        :param older_than: How long ago a request must have been submitted.
+            Setup normally finishes well within this, so requests still being
+            set up by live workers are left alone.
+        :return: The requests marked Fatal.
+        """
+        cutoff = datetime.utcnow() - older_than
+        abandoned = cls.query.filter(cls.status.in_(cls.SETUP_STATUSES),
+                                     cls.submit_time < cutoff).all()
+        for request in abandoned:
+            request.failure_description = f"Submission was interrupted while {request.status}"
+            request.status = "Fatal"
+        db.session.commit()
+        return abandoned
+
+    @classmethod
+    def configmap_in_use(cls, configmap_name: str,
+                         exclude_request_id: Optional[str] = None) -> bool:
+        """
+        Whether any running request still refers to a generated code ConfigMap.
+        Identical selections share one ConfigMap, so this is its reference count.
+        :param configmap_name: Name of the ConfigMap.
+        :param exclude_request_id: Request to leave out of the count.
+        """
+        query = cls.query.filter(cls.generated_code_cm == configmap_name,
+                                 cls.status.notin_(["Complete", "Fatal"]))
+        if exclude_request_id is not None:
+            query = query.filter(cls.request_id != exclude_request_id)
+        return db.session.query(query.exists()).scalar()
+
+    @classmethod
+    def dashboard_query(cls, submitted_by: Optional[int] = None):
+        """
+        Query for the dashboards' requests table, newest first. The submitter
+        is joined in eagerly and the progress counters live on the request row,
+        so rendering a page needs no per-row queries.
+        :param submitted_by: Only include requests from this user, if given.
+        """
+        query = cls.query.options(joinedload(cls.user))
+        if submitted_by is not None:
+            query = query.filter_by(submitted_by=submitted_by)
+        return query.order_by(cls.id.desc())
+
     @property
     def age(self) -> timedelta:
         return datetime.utcnow() - self.submit_time
@@ -228,7 +451,7 @@ class TransformRequest(db.Model):
 
     @property
     def result_count(self) -> int:
-        return TransformationResult.query.filter_by(request_id=self.request_id).count()
+        return self.files_processed + self.files_failed
 
     @property
     def results(self) -> List['TransformationResult']:
@@ -243,19 +466,15 @@ class TransformRequest(db.Model):
 
     @property
     def files_processed(self) -> int:
-        return TransformationResult.query.filter_by(
-            request_id=self.request_id, transform_status="success"
-        ).count()
+        return self.completed_files or 0
 
     @property
     def files_failed(self) -> int:
-        return TransformationResult.query.filter_by(
-            request_id=self.request_id, transform_status="failure"
-        ).count()
+        return self.failed_files or 0
 
-    @property
-    def statistics(self) -> Optional[dict]:
-        rslt_list = db.session.query(
+    @staticmethod
+    def _statistics_query():
+        return db.session.query(
             TransformationResult.request_id,
             func.sum(TransformationResult.messages).label('total_msgs'),
             func.min(TransformationResult.transform_time).label('min_time'),
@@ -265,14 +484,13 @@ class TransformRequest(db.Model):
             func.avg(TransformationResult.avg_rate).label('avg_rate'),
             func.sum(TransformationResult.total_bytes).label('total_bytes'),
             func.sum(TransformationResult.total_events).label('total_events')
-        ).group_by(TransformationResult.request_id).filter_by(
-            request_id=self.request_id).all()
+        ).group_by(TransformationResult.request_id)
 
-        if len(rslt_list) == 0:
+    @staticmethod
+    def _statistics_from_row(rslt) -> Optional[dict]:
+        if rslt is None or rslt.request_id is None:
             return None
 
-        rslt = rslt_list[0]
-
         return {
             "total-messages": int(rslt.total_msgs),
             "min-time": int(rslt.min_time),
@@ -284,9 +502,45 @@ class TransformRequest(db.Model):
             "total-events": int(rslt.total_events)
         }
 
+    @classmethod
+    def return_request_with_statistics(cls, request_id) -> Optional['TransformRequest']:
+        """
+        Load a request along with its transform statistics in a single query.
+        The progress counters live on the request row, so everything needed
+        for a status report comes back in one round-trip.
+        :param request_id: UUID of transformation request.
+        :return: The request with its statistics preloaded, or None if not found
+        """
+        stats = cls._statistics_query().filter_by(request_id=request_id).subquery()
+        row = db.session.query(cls, stats).outerjoin(
+            stats, stats.c.request_id == cls.request_id
+        ).filter(cls.request_id == request_id).one_or_none()
+        if row is None:
+            return None
+
+        request = row[0]
+        request._preloaded_statistics = cls._statistics_from_row(row)
+        return request
+
+    @property
+    def statistics(self) -> Optional[dict]:
+        if hasattr(self, '_preloaded_statistics'):
+            return self._preloaded_statistics
+
+        rslt_list = self._statistics_query().filter_by(request_id=self.request_id).all()
+
+        if len(rslt_list) == 0:
+            return None
+
+        return self._statistics_from_row(rslt_list[0])
+
 
 class TransformationResult(db.Model):
     __tablename__ = 'transform_result'
+    __table_args__ = (
+        db.Index('ix_transform_result_request_id_transform_status',
+                 'request_id', 'transform_status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     did = db.Column(db.String(512), unique=False, nullable=False)
@@ -304,6 +558,32 @@ class TransformationResult(db.Model):
     def to_json_list(cls, a_list):
         return [TransformationResult.to_json(msg) for msg in a_list]
 
+    @classmethod
+    def for_request(cls, request_id, after_id=None, limit=None):
+        """
+        Results for a request in order of id. Rows are fetched from the
+        database in batches as the result is iterated.
+        :param request_id: UUID of transformation request.
+        :param after_id: Only return results with an id greater than this
+        :param limit: Maximum number of rows to return
+        """
+        query = cls.query.filter_by(request_id=request_id).order_by(cls.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.yield_per(1000)
+
+    @classmethod
+    def bulk_insert(cls, results: List[dict], chunk_size: int = 1000):
+        """
+        Insert a batch of results with multi-row INSERT statements.
+        :param results: Column values for each result
+        :param chunk_size: Maximum number of rows per INSERT statement
+        """
+        for start in range(0, len(results), chunk_size):
+            db.session.execute(cls.__table__.insert().values(results[start:start + chunk_size]))
+
     @classmethod
     def to_json(cls, x):
         return {
@@ -327,6 +607,9 @@ class TransformationResult(db.Model):
 
 class DatasetFile(db.Model):
     __tablename__ = 'files'
+    __table_args__ = (
+        db.Index('ix_files_request_id', 'request_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     request_id = db.Column(db.String(48),
@@ -343,6 +626,40 @@ class DatasetFile(db.Model):
         db.session.add(self)
         db.session.flush()
 
+    @classmethod
+    def bulk_save_to_db(cls, dataset_files: List['DatasetFile'],
+                        chunk_size: int = 1000):
+        """
+        Insert a batch of files with multi-row INSERT statements and assign the
+        generated primary keys back onto the records.
+        RETURNING rows are not guaranteed to come back in VALUES order, so the
+        keys are matched to records by file path.
+        Falls back to a single ORM flush on databases without RETURNING support.
+        :param dataset_files: Transient DatasetFile records to insert
+        :param chunk_size: Maximum number of rows per INSERT statement
+        """
+        if not dataset_files:
+            return
+
+        if not db.session.get_bind().dialect.implicit_returning:
+            db.session.add_all(dataset_files)
+            db.session.flush()
+            return
+
+        columns = ['request_id', 'file_path', 'adler32', 'file_size', 'file_events']
+        for start in range(0, len(dataset_files), chunk_size):
+            chunk = dataset_files[start:start + chunk_size]
+            stmt = cls.__table__.insert().values(
+                [{c: getattr(f, c) for c in columns} for f in chunk]
+            ).returning(cls.__table__.c.id, cls.__table__.c.file_path)
+
+            # A path may be listed more than once; its copies are identical
+            by_path = defaultdict(deque)
+            for dataset_file in chunk:
+                by_path[dataset_file.file_path].append(dataset_file)
+            for row in db.session.execute(stmt):
+                by_path[row.file_path].popleft().id = row.id
+
     @classmethod
     def get_by_id(cls, dataset_file_id):
         return cls.query.filter_by(id=dataset_file_id).one()
@@ -353,6 +670,9 @@ class DatasetFile(db.Model):
 
 class FileStatus(db.Model):
     __tablename__ = 'file_status'
+    __table_args__ = (
+        db.Index('ix_file_status_request_id_status', 'request_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     file_id = db.Column(db.Integer, nullable=False)
@@ -370,9 +690,42 @@ class FileStatus(db.Model):
         db.session.add(self)
         db.session.flush()
 
+    def to_row(self) -> dict:
+        """Column values for inserting this status with bulk_insert"""
+        return {column.name: getattr(self, column.name)
+                for column in self.__table__.columns if column.name != 'id'}
+
+    @classmethod
+    def bulk_insert(cls, rows: List[dict], chunk_size: int = 1000):
+        """
+        Insert a batch of statuses in their own transaction, with multi-row
+        INSERT statements, independently of the current session.
+        :param rows: Column values for each status, see to_row
+        :param chunk_size: Maximum number of rows per INSERT statement
+        """
+        with db.engine.begin() as connection:
+            for start in range(0, len(rows), chunk_size):
+                connection.execute(cls.__table__.insert().values(rows[start:start + chunk_size]))
+
     @classmethod
-    def failures_for_request(cls, request_id):
-        return db.session.query(DatasetFile, FileStatus).filter(
+    def failures_for_request(cls, request_id, after_id=None, limit=None):
+        """
+        Failed file statuses for a request, paired with the file they refer to,
+        in order of FileStatus id. Rows are fetched from the database in
+        batches as the result is iterated.
+        :param request_id: UUID of transformation request.
+        :param after_id: Only return statuses with an id greater than this
+        :param limit: Maximum number of rows to return
+        """
+        query = db.session.query(DatasetFile, FileStatus).join(
+            FileStatus, DatasetFile.id == FileStatus.file_id
+        ).filter(
             FileStatus.request_id == request_id,
-            DatasetFile.request_id == FileStatus.request_id,
-            FileStatus.status == 'failure').all()
+            FileStatus.status == 'failure'
+        ).order_by(FileStatus.id)
+
+        if after_id is not None:
+            query = query.filter(FileStatus.id > after_id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.yield_per(1000)
@@ -37,5 +37,30 @@ class ObjectStoreManager:
     def create_bucket(self, bucket_name):
         self.minio_client.make_bucket(bucket_name)
 
+    def bucket_exists(self, bucket_name):
+        return self.minio_client.bucket_exists(bucket_name)
+
     def list_buckets(self):
         return self.minio_client.list_buckets()
+
+    def copy_bucket(self, source_bucket, bucket_name):
+        """
+        Create a bucket holding copies of every object in another one. The
+        objects are copied by the object store without passing through here.
+        """
+        from minio.commonconfig import CopySource
+        self.create_bucket(bucket_name)
+        for obj in self.minio_client.list_objects(source_bucket, recursive=True):
+            self.minio_client.copy_object(bucket_name, obj.object_name,
+                                          CopySource(source_bucket, obj.object_name))
+
+    def remove_bucket(self, bucket_name):
+        """
+        Delete a bucket along with any objects in it. Does nothing if the
+        bucket doesn't exist.
+        """
+        if not self.bucket_exists(bucket_name):
+            return
+        for obj in self.minio_client.list_objects(bucket_name, recursive=True):
+            self.minio_client.remove_object(bucket_name, obj.object_name)
+        self.minio_client.remove_bucket(bucket_name)
@@ -27,24 +27,97 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 # -*- coding: utf-8 -*-
 # pylint: disable=C0111,C0103,R0205
+import queue
 import random
+import threading
+import time
 
 import pika
 from flask import current_app
+from pika.adapters.blocking_connection import ReturnedMessage
+
+
+class _Publisher(object):
+    """A connection with a channel in transaction mode, used by one thread at a
+    time to publish batches of messages. Messages published on the channel are
+    only accepted by the broker when the transaction is committed, so a whole
+    batch costs a single Tx.Commit round-trip.
+
+    """
+
+    def __init__(self, url_list):
+        self._url_list = url_list
+        self._connection = None
+        self._channel = None
+        self._returned = []
+
+    @property
+    def channel(self):
+        if not self._channel:
+            current_app.logger.info('Opening a new publisher connection')
+            self._connection = pika.BlockingConnection(self._url_list)
+            self._channel = self._connection.channel()
+            self._channel.tx_select()
+            self._channel.add_on_return_callback(self._on_return)
+        return self._channel
+
+    def _on_return(self, channel, method, properties, body):
+        self._returned.append(ReturnedMessage(method, properties, body))
+
+    def take_returned(self):
+        """Return the messages the broker sent back as unroutable since the
+        last call. The broker returns them before it acknowledges the commit,
+        but they are only dispatched when events are processed.
+
+        """
+        self._connection.process_data_events(time_limit=0)
+        returned, self._returned = self._returned, []
+        return returned
+
+    def reset_closed(self):
+        self._connection = None
+        self._channel = None
+        self._returned = []
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+        self.reset_closed()
 
 
 class RabbitAdaptor(object):
+    MAX_DECLARED = 1000
 
-    def __init__(self, amqp_url):
+    def __init__(self, amqp_url, pool_size=4, max_retries=None,
+                 retry_interval=0.5, max_retry_interval=10):
         """Setup the example publisher object, passing in the URL we will use
         to connect to RabbitMQ.
 
         :param str amqp_url: The URL for connecting to RabbitMQ
+        :param int pool_size: Maximum number of publisher connections used
+            by publish_many
+        :param int max_retries: Give up and re-raise the error after this many
+            consecutive failed attempts. None retries forever.
+        :param float retry_interval: Delay before the second retry. The first
+            retry is immediate and the delay doubles after each further failure.
+        :param float max_retry_interval: Upper limit for the retry delay
 
         """
         self._connection = None
         self._channel = None
         self._url_list = [pika.URLParameters(u) for u in amqp_url.split(",")]
+        self._lock = threading.RLock()
+
+        # Exchanges, queues and bindings already declared on this connection
+        self._declared = set()
+
+        self._pool_size = pool_size
+        self._publishers = queue.LifoQueue()
+        self._all_publishers = []
+
+        self._max_retries = max_retries
+        self._retry_interval = retry_interval
+        self._max_retry_interval = max_retry_interval
 
     def connect(self):
         """This method connects to RabbitMQ, returning the connection handle.
@@ -54,6 +127,7 @@ class RabbitAdaptor(object):
         """
         random.shuffle(self._url_list)
         current_app.logger.info('Connecting to %s', self._url_list)
+        self._declared.clear()
         self._connection = pika.BlockingConnection(self._url_list)
 
     def open_channel(self):
@@ -82,6 +156,31 @@ class RabbitAdaptor(object):
     def reset_closed(self):
         self._connection = None
         self._channel = None
+        self._declared.clear()
+
+    def _remember_declared(self, key):
+        # Per-request queues make this grow with every submission, so start
+        # over rather than let a long-lived connection hold them all
+        if len(self._declared) >= self.MAX_DECLARED:
+            self._declared.clear()
+        self._declared.add(key)
+
+    def _wait_to_retry(self, attempt, err):
+        """Back off before the next attempt of a failed broker operation.
+
+        :param int attempt: Number of consecutive failures so far
+        :param Exception err: The error that caused the failure. It is re-raised
+            once max_retries is exhausted.
+
+        """
+        if self._max_retries is not None and attempt > self._max_retries:
+            current_app.logger.error("Giving up after %d attempts", attempt)
+            raise err
+        if attempt > 1:
+            delay = min(self._retry_interval * 2 ** (attempt - 2),
+                        self._max_retry_interval)
+            # Add jitter so that workers don't reconnect in lock-step
+            time.sleep(delay * random.uniform(0.5, 1.0))
 
     def setup_exchange(self, exchange_name):
         """Setup the exchange on RabbitMQ by invoking the Exchange.Declare RPC
@@ -90,31 +189,41 @@ class RabbitAdaptor(object):
         :param str|unicode exchange_name: The name of the exchange to declare
 
         """
+        key = ('exchange', exchange_name)
+        if key in self._declared:
+            return
+
         current_app.logger.info('Declaring exchange %s', exchange_name)
 
-        while True:
-            try:
-                channel = self.channel
-                channel.exchange_declare(exchange=exchange_name)
-                return
-            except pika.exceptions.ConnectionClosedByBroker:
-                # Uncomment this to make the example not attempt recovery
-                # from server-initiated connection closure, including
-                # when the node is stopped cleanly
-                #
-                # break
-                self.reset_closed()
-                continue
-            # Do not recover on channel errors
-            except pika.exceptions.AMQPChannelError as err:
-                current_app.logger.warning("Caught a channel error: {}, retrying...".format(err))
-                self.reset_closed()
-                continue
-            # Recover on all other connection errors
-            except pika.exceptions.AMQPConnectionError:
-                current_app.logger.warning("Connection was closed, retrying...")
-                self.reset_closed()
-                continue
+        attempt = 0
+        with self._lock:
+            while True:
+                try:
+                    channel = self.channel
+                    channel.exchange_declare(exchange=exchange_name)
+                    self._remember_declared(key)
+                    return
+                except pika.exceptions.ConnectionClosedByBroker as err:
+                    current_app.logger.warning("Connection was closed by broker, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                # Do not recover on channel errors
+                except pika.exceptions.AMQPChannelError as err:
+                    current_app.logger.warning(
+                        "Caught a channel error: {}, retrying...".format(err))
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                # Recover on all other connection errors
+                except pika.exceptions.AMQPConnectionError as err:
+                    current_app.logger.warning("Connection was closed, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
 
     def setup_queue(self, queue_name):
         """Setup the queue on RabbitMQ by invoking the Queue.Declare RPC
@@ -123,88 +232,232 @@ class RabbitAdaptor(object):
         :param str|unicode queue_name: The name of the queue to declare.
 
         """
+        key = ('queue', queue_name)
+        if key in self._declared:
+            return
+
         current_app.logger.info('Declaring queue %s', queue_name)
 
-        while True:
-            try:
-                channel = self.channel
-                channel.queue_declare(queue=queue_name)
-                return
-            except pika.exceptions.ConnectionClosedByBroker:
-                current_app.logger.warning("Connection was closed by broker, stopping...")
-                break
-            # Attempt to reconnect if the channel closed due to timeout
-            except pika.exceptions.ChannelWrongStateError:
-                current_app.logger.warning("Connection was closed, retrying...")
-                self.reset_closed()
-                continue
-            # Recover on all other connection errors
-            except pika.exceptions.AMQPConnectionError:
-                current_app.logger.warning("Connection was closed, retrying...")
-                self.reset_closed()
-                continue
+        attempt = 0
+        with self._lock:
+            while True:
+                try:
+                    channel = self.channel
+                    channel.queue_declare(queue=queue_name)
+                    self._remember_declared(key)
+                    return
+                except pika.exceptions.ConnectionClosedByBroker as err:
+                    current_app.logger.warning("Connection was closed by broker, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                # Attempt to reconnect if the channel closed due to timeout
+                except pika.exceptions.ChannelWrongStateError as err:
+                    current_app.logger.warning("Connection was closed, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                # Recover on all other connection errors
+                except pika.exceptions.AMQPConnectionError as err:
+                    current_app.logger.warning("Connection was closed, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
 
     def bind_queue_to_exchange(self, exchange, queue):
+        key = ('binding', exchange, queue)
+        if key in self._declared:
+            return
+
         current_app.logger.info('Binding queue %s to exchange %s', (queue, exchange))
 
-        while True:
-            try:
-                channel = self.channel
-                channel.queue_bind(exchange=exchange,
-                                   queue=queue,
-                                   routing_key=queue)
-                return
-            except pika.exceptions.ConnectionClosedByBroker:
-                # Uncomment this to make the example not attempt recovery
-                # from server-initiated connection closure, including
-                # when the node is stopped cleanly
-                #
-                # break
-                continue
-            # Do not recover on channel errors
-            except pika.exceptions.AMQPChannelError as err:
-                current_app.logger.exception("Caught a channel error: {}, stopping...".format(err))
-                break
-            # Recover on all other connection errors
-            except pika.exceptions.AMQPConnectionError:
-                current_app.logger.warning("Connection was closed, retrying...")
-                self.reset_closed()
-                continue
+        attempt = 0
+        with self._lock:
+            while True:
+                try:
+                    channel = self.channel
+                    channel.queue_bind(exchange=exchange,
+                                       queue=queue,
+                                       routing_key=queue)
+                    self._remember_declared(key)
+                    return
+                except pika.exceptions.ConnectionClosedByBroker as err:
+                    current_app.logger.warning("Connection was closed by broker, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                # Do not recover on channel errors
+                except pika.exceptions.AMQPChannelError as err:
+                    current_app.logger.exception(
+                        "Caught a channel error: {}, stopping...".format(err))
+                    self.reset_closed()
+                    raise
+                # Recover on all other connection errors
+                except pika.exceptions.AMQPConnectionError as err:
+                    current_app.logger.warning("Connection was closed, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+
+    def setup_request_topology(self, request_id):
+        """Declare everything the transformers for a request need: the shared
+        request and failure exchanges, the request's queue and its error queue,
+        and the bindings between them. The shared exchanges are only declared
+        once per connection, leaving the two queue declarations and two
+        bindings as the only round-trips for each new request.
+
+        :param str request_id: The request to set up queues for
+
+        """
+        with self._lock:
+            self.setup_exchange('transformation_requests')
+            self.setup_exchange('transformation_failures')
+
+            # Create queue for transformers to read from
+            self.setup_queue(request_id)
+            self.bind_queue_to_exchange(exchange="transformation_requests",
+                                        queue=request_id)
+
+            # Also setup an error queue for dead letters generated by transformer
+            self.setup_queue(request_id + "_errors")
+            self.bind_queue_to_exchange(exchange="transformation_failures",
+                                        queue=request_id + "_errors")
 
     def basic_publish(self, exchange, routing_key, body):
-        while True:
-            try:
-                channel = self.channel
-
-                channel.basic_publish(exchange=exchange,
-                                      routing_key=routing_key,
-                                      body=body,
-                                      properties=pika.BasicProperties(delivery_mode=1),
-                                      mandatory=True)
-                return
-
-            except pika.exceptions.ConnectionClosedByBroker:
-                # Uncomment this to make the example not attempt recovery
-                # from server-initiated connection closure, including
-                # when the node is stopped cleanly
-                #
-                # break
-                continue
-            except pika.exceptions.ChannelWrongStateError:
-                current_app.logger.info("Channel in wrong state. Reset and see if that fixes it")
-                self.reset_closed()
-                continue
-
-            # Do not recover on channel errors
-            except pika.exceptions.AMQPChannelError as err:
-                current_app.logger.exception("Caught a channel error: {}, stopping...".format(err))
-                break
-
-            # Recover on all other connection errors
-            except pika.exceptions.AMQPConnectionError:
-                current_app.logger.info("Connection was closed, retrying...")
-                self.reset_closed()
-                continue
+        attempt = 0
+        with self._lock:
+            while True:
+                try:
+                    channel = self.channel
+
+                    channel.basic_publish(exchange=exchange,
+                                          routing_key=routing_key,
+                                          body=body,
+                                          properties=pika.BasicProperties(delivery_mode=1),
+                                          mandatory=True)
+                    return
+
+                except pika.exceptions.ConnectionClosedByBroker as err:
+                    current_app.logger.warning("Connection was closed by broker, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+                except pika.exceptions.ChannelWrongStateError as err:
+                    current_app.logger.info(
+                        "Channel in wrong state. Reset and see if that fixes it")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+
+                # Do not recover on channel errors
+                except pika.exceptions.AMQPChannelError as err:
+                    current_app.logger.exception(
+                        "Caught a channel error: {}, stopping...".format(err))
+                    self.reset_closed()
+                    raise
+
+                # Recover on all other connection errors
+                except pika.exceptions.AMQPConnectionError as err:
+                    current_app.logger.info("Connection was closed, retrying...")
+                    self.reset_closed()
+                    attempt += 1
+                    self._wait_to_retry(attempt, err)
+                    continue
+
+    def _acquire_publisher(self):
+        """Check a publisher out of the pool, opening a new one if the pool
+        has not reached its size limit, otherwise waiting for one to be
+        returned.
+
+        """
+        try:
+            return self._publishers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if len(self._all_publishers) < self._pool_size:
+                    publisher = _Publisher(self._url_list)
+                    self._all_publishers.append(publisher)
+                    return publisher
+            return self._publishers.get()
+
+    def _release_publisher(self, publisher):
+        self._publishers.put(publisher)
+
+    def publish_many(self, exchange, routing_key, bodies, batch_size=500):
+        """Publish a sequence of messages to the same exchange and routing key.
+        Messages are sent in batches on a pooled publisher connection, so
+        concurrent callers don't contend for the shared channel. The broker
+        acknowledges each batch with a single commit, and a batch
+        interrupted by a connection failure is rolled back and re-sent.
+        Messages are published as mandatory, as in basic_publish, and
+        UnroutableError is raised once a batch that no queue accepted has
+        been committed.
+
+        :param str exchange: The exchange to publish to
+        :param str routing_key: The routing key for every message
+        :param list bodies: The message bodies
+        :param int batch_size: Maximum number of messages per commit
+
+        """
+        bodies = list(bodies)
+        publisher = self._acquire_publisher()
+        try:
+            for start in range(0, len(bodies), batch_size):
+                batch = bodies[start:start + batch_size]
+                attempt = 0
+                while True:
+                    try:
+                        channel = publisher.channel
+                        for body in batch:
+                            channel.basic_publish(exchange=exchange,
+                                                  routing_key=routing_key,
+                                                  body=body,
+                                                  properties=pika.BasicProperties(
+                                                      delivery_mode=1),
+                                                  mandatory=True)
+                        channel.tx_commit()
+                        returned = publisher.take_returned()
+                        break
+
+                    except pika.exceptions.ChannelWrongStateError as err:
+                        current_app.logger.info(
+                            "Channel in wrong state. Reset and see if that fixes it")
+                        publisher.reset_closed()
+                        attempt += 1
+                        self._wait_to_retry(attempt, err)
+                        continue
+
+                    # Do not recover on channel errors
+                    except pika.exceptions.AMQPChannelError as err:
+                        current_app.logger.exception(
+                            "Caught a channel error: {}, stopping...".format(err))
+                        publisher.reset_closed()
+                        raise
+
+                    # Recover on all other connection errors
+                    except pika.exceptions.AMQPConnectionError as err:
+                        current_app.logger.info("Connection was closed, retrying...")
+                        publisher.reset_closed()
+                        attempt += 1
+                        self._wait_to_retry(attempt, err)
+                        continue
+
+                # Every message in the batch has the same routing, so a batch
+                # is either delivered or returned as a whole
+                if returned:
+                    current_app.logger.error(
+                        "{} messages to {} could not be routed".format(len(returned),
+                                                                       routing_key))
+                    raise pika.exceptions.UnroutableError(returned)
+        finally:
+            self._release_publisher(publisher)
 
     def close_channel(self):
         """Invoke this command to close the channel with RabbitMQ by sending
@@ -216,7 +469,11 @@ class RabbitAdaptor(object):
             self._channel.close()
 
     def close_connection(self):
-        """This method closes the connection to RabbitMQ."""
+        """This method closes the connection to RabbitMQ, along with any
+        pooled publisher connections."""
         if self._connection is not None:
             current_app.logger.info('Closing connection')
             self._connection.close()
+
+        for publisher in self._all_publishers:
+            publisher.close()
@@ -0,0 +1,185 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import queue
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from flask import current_app
+
+TERMINAL_STATES = {"Complete", "Fatal"}
+
+
+class Subscription(object):
+    """The events for one client watching a transformation request"""
+
+    def __init__(self, request_id: str, max_events: int):
+        self.request_id = request_id
+        self._events = queue.Queue(maxsize=max_events)
+
+    def put(self, event: Tuple[str, dict]):
+        # A slow client loses its oldest events rather than blocking publishers
+        while True:
+            try:
+                self._events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[str, dict]]:
+        """
+        Wait for the next event.
+        :return: An (event, data) tuple or None if the timeout expired.
+        """
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RequestEventHub(object):
+    """
+    Fans out progress events for transformation requests to every client
+    watching them. Events published by this process are delivered at once.
+    Progress recorded by other worker processes is picked up by one poller
+    thread, which reads the status of all watched requests in a single query
+    per interval however many clients are watching.
+    """
+
+    def __init__(self, app=None, poll_interval: float = 5.0, max_events: int = 100,
+                 max_subscriptions: Optional[int] = None):
+        """
+        :param app: Flask app used by the poller thread to reach the database.
+            Without one, only events published in this process are delivered.
+        :param poll_interval: Seconds between polls of the watched requests.
+        :param max_events: Events buffered for each client before the oldest
+            are dropped.
+        :param max_subscriptions: Clients that may watch at once. Each one
+            holds a worker thread, so this keeps some free for other requests.
+        """
+        self._app = app
+        self._poll_interval = poll_interval
+        self._max_events = max_events
+        self._max_subscriptions = max_subscriptions
+        self._subscription_count = 0
+
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._last_status: Dict[str, dict] = {}
+        self._poller: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, request_id: str,
+                  status: Optional[dict] = None) -> Optional[Subscription]:
+        """
+        Start watching a request.
+        :param request_id: UUID of transformation request.
+        :param status: The status report the client already has, so that the
+            same report is not published to it again.
+        :return: The new subscription, or None if max_subscriptions clients
+            are already watching.
+        """
+        subscription = Subscription(request_id, self._max_events)
+        with self._lock:
+            if self._max_subscriptions is not None and \
+                    self._subscription_count >= self._max_subscriptions:
+                return None
+            self._subscription_count += 1
+            self._subscriptions.setdefault(request_id, set()).add(subscription)
+            if status is not None:
+                self._last_status.setdefault(request_id, status)
+            self._start_poller()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            watchers = self._subscriptions.get(subscription.request_id, set())
+            if subscription in watchers:
+                watchers.discard(subscription)
+                self._subscription_count -= 1
+            if not watchers:
+                self._subscriptions.pop(subscription.request_id, None)
+                self._last_status.pop(subscription.request_id, None)
+
+    def publish(self, request_id: str, event: str, data: dict):
+        with self._lock:
+            watchers = list(self._subscriptions.get(request_id, ()))
+        for subscription in watchers:
+            subscription.put((event, data))
+
+    def publish_status(self, request_id: str, status: dict):
+        """
+        Publish a status report, unless it is the same as the last one sent
+        for the request.
+        """
+        with self._lock:
+            if request_id not in self._subscriptions or \
+                    self._last_status.get(request_id) == status:
+                return
+            self._last_status[request_id] = status
+        self.publish(request_id, 'status', status)
+
+    def is_watched(self, request_id: str) -> bool:
+        with self._lock:
+            return request_id in self._subscriptions
+
+    def watched(self) -> Set[str]:
+        with self._lock:
+            return set(self._subscriptions)
+
+    def poll(self):
+        """Read the status of every watched request and publish any changes"""
+        from servicex.models import TransformRequest
+
+        request_ids = self.watched()
+        if not request_ids:
+            return
+        for transform in TransformRequest.return_requests(request_ids):
+            self.publish_status(transform.request_id, transform.progress_json())
+
+    def stop(self):
+        self._stopped.set()
+
+    def _start_poller(self):
+        if self._app is None or (self._poller and self._poller.is_alive()):
+            return
+        self._poller = threading.Thread(target=self._run, name='request-event-poller',
+                                        daemon=True)
+        self._poller.start()
+
+    def _run(self):
+        while not self._stopped.wait(self._poll_interval):
+            if not self.watched():
+                continue
+            with self._app.app_context():
+                try:
+                    self.poll()
+                except Exception as err:
+                    current_app.logger.error(f"Failed to poll request status: {err}")
@@ -27,6 +27,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import sys
 import traceback
+from typing import List
 
 from flask import request
 
@@ -40,17 +41,54 @@ class AddFileToDataset(ServiceXResource):
         cls.lookup_result_processor = lookup_result_processor
         return cls
 
+    @staticmethod
+    def _dataset_file(request_id, add_file_request):
+        return DatasetFile(request_id=request_id,
+                           file_path=add_file_request['file_path'],
+                           adler32=add_file_request['adler32'],
+                           file_events=add_file_request['file_events'],
+                           file_size=add_file_request['file_size'])
+
+    def add_files(self, request_id, add_file_requests, deferred=None) -> List[DatasetFile]:
+        """
+        Insert and publish a batch of files without committing.
+        :param request_id: UUID of transformation request.
+        :param add_file_requests: File records reported by the DID finder.
+        :param deferred: If given, the publish is appended to this list to be
+            run after the commit.
+        :return: The inserted records
+        """
+        submitted_request = TransformRequest.get_request_cached(request_id)
+        db_records = [self._dataset_file(request_id, f) for f in add_file_requests]
+        self.lookup_result_processor.add_files_to_dataset(submitted_request, db_records,
+                                                          deferred=deferred)
+        return db_records
+
     def put(self, request_id):
+        """
+        Add files found by a DID finder to the dataset for a request.
+        Accepts either a single file record or a list of them. Lists are
+        inserted and published as one batch.
+        :param request_id: UUID of transformation request.
+        """
         try:
             from servicex.models import db
             add_file_request = request.get_json()
-            submitted_request = TransformRequest.return_request(request_id)
 
-            db_record = DatasetFile(request_id=request_id,
-                                    file_path=add_file_request['file_path'],
-                                    adler32=add_file_request['adler32'],
-                                    file_events=add_file_request['file_events'],
-                                    file_size=add_file_request['file_size'])
+            if isinstance(add_file_request, list):
+                deferred = []
+                db_records = self.add_files(request_id, add_file_request, deferred)
+                db.session.commit()
+                for action in deferred:
+                    action()
+
+                return {
+                    "request-id": str(request_id),
+                    "file-ids": [rec.id for rec in db_records]
+                }
+
+            submitted_request = TransformRequest.get_request_cached(request_id)
+            db_record = self._dataset_file(request_id, add_file_request)
 
             self.lookup_result_processor.add_file_to_dataset(submitted_request, db_record)
 
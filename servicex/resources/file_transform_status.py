@@ -27,6 +27,7 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import datetime
 
+from flask import current_app
 from flask_restful import reqparse
 from servicex.models import db
 from servicex.resources.servicex_resource import ServiceXResource
@@ -34,6 +35,12 @@ from servicex.models import FileStatus, max_string_size
 
 
 class FileTransformationStatus(ServiceXResource):
+    file_status_buffer = None
+
+    @classmethod
+    def make_api(cls, file_status_buffer=None):
+        cls.file_status_buffer = file_status_buffer
+        return cls
 
     def __init__(self):
         self.status_parser = reqparse.RequestParser()
@@ -44,20 +51,33 @@ class FileTransformationStatus(ServiceXResource):
         self.status_parser.add_argument('pod-name', required=False)
         self.status_parser.add_argument('info', required=False)
 
+    @staticmethod
+    def file_status(request_id, file_id, status) -> FileStatus:
+        """
+        Build the record for a status update reported by a transformer.
+        :param status: The update, with timestamp, status-code, pod-name and info
+        """
+        info = status.get('info')
+        return FileStatus(file_id=file_id, request_id=request_id,
+                          timestamp=datetime.datetime.strptime(
+                              status['timestamp'],
+                              "%Y-%m-%dT%H:%M:%S.%f"),
+                          pod_name=status.get('pod-name'),
+                          status=status['status-code'],
+                          info=info[:max_string_size] if info is not None else None)
+
     def post(self, request_id, file_id):
         status = self.status_parser.parse_args()
-        print(status)
-        status.request_id = request_id
-        file_status = FileStatus(file_id=file_id, request_id=request_id,
-                                 timestamp=datetime.datetime.strptime(
-                                     status.timestamp,
-                                     "%Y-%m-%dT%H:%M:%S.%f"),
-                                 pod_name=status['pod-name'],
-                                 status=status['status-code'],
-                                 info=status.info[:max_string_size])
+        current_app.logger.debug(f"File status for {request_id}/{file_id}: {status}")
+        file_status = self.file_status(request_id, file_id, status)
+
+        # Written in bulk by the buffer's flusher thread
+        if self.file_status_buffer:
+            self.file_status_buffer.add(file_status)
+            return "Ok"
+
         file_status.save_to_db()
 
-        print(file_status)
         try:
             db.session.commit()
         except Exception:
@@ -29,16 +29,26 @@ from flask import request
 
 from servicex.models import TransformRequest, db
 from servicex.resources.servicex_resource import ServiceXResource
+from servicex.resources.transformer_file_complete import TransformerFileComplete
 
 
 class FilesetComplete(ServiceXResource):
     @classmethod
-    def make_api(cls, lookup_result_processor):
+    def make_api(cls, lookup_result_processor, event_hub=None):
         cls.lookup_result_processor = lookup_result_processor
+        cls.event_hub = event_hub
         return cls
 
-    def put(self, request_id):
-        summary = request.get_json()
+    def record_fileset_complete(self, request_id, summary, deferred=None) -> TransformRequest:
+        """
+        Record the summary of a finished dataset lookup without committing.
+        Files may have been reported done before the lookup finished, in which
+        case the request is completed here.
+        :param request_id: UUID of transformation request.
+        :param summary: Lookup summary reported by the DID finder.
+        :param deferred: If given, a transformer shutdown is appended to this
+            list to be run after the commit.
+        """
         rec = TransformRequest.return_request(request_id)
         self.lookup_result_processor.report_fileset_complete(
             rec,
@@ -48,4 +58,17 @@ class FilesetComplete(ServiceXResource):
             total_bytes=summary['total-bytes'],
             did_lookup_time=summary['elapsed-time']
         )
+        if rec.result_count and rec.status not in ("Complete", "Fatal"):
+            TransformerFileComplete().shutdown_if_complete(request_id, rec, deferred)
+        return rec
+
+    def put(self, request_id):
+        summary = request.get_json()
+        deferred = []
+        rec = self.record_fileset_complete(request_id, summary, deferred)
         db.session.commit()
+        for action in deferred:
+            action()
+
+        if self.event_hub and self.event_hub.is_watched(request_id):
+            self.event_hub.publish_status(request_id, rec.progress_json())
@@ -25,10 +25,10 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-from typing import Optional
+import json
+from typing import Callable, Iterable, Optional
 
-import pkg_resources
-from flask import current_app
+from flask import Response, current_app, stream_with_context
 from flask_jwt_extended import get_jwt_identity
 from flask_restful import Resource
 
@@ -55,11 +55,53 @@ class ServiceXResource(Resource):
     @classmethod
     def _get_app_version(cls):
         """
-        Examine installed packages to get the version number for the ServiceX App
-        :return: The version number, or the string "develop" if servicex_app not installed
+        :return: The ServiceX App version resolved when the app was created
         """
-        try:
-            app_version = pkg_resources.get_distribution('servicex_app').version
-            return app_version
-        except pkg_resources.DistributionNotFound:
-            return "develop"
+        return current_app.app_version
+
+    @staticmethod
+    def _stream_json_page(name: str, rows: Iterable, to_json: Callable[..., dict],
+                          cursor_of: Callable[..., int], limit: Optional[int] = None,
+                          fields: Optional[dict] = None) -> Response:
+        """
+        Stream a JSON object with the serialized rows as a list, so that long
+        lists are never held in memory.
+        :param name: Key for the list of rows
+        :param rows: Iterable of rows. If a limit is given, fetch one more row
+            than the limit to find out whether there is another page.
+        :param to_json: Converts a row to a JSON-serializable dict
+        :param cursor_of: Extracts the cursor value from a row
+        :param limit: Page size. If given, the object includes the cursor for
+            the next page under "next-cursor", or null on the last page
+        :param fields: Other fields to include in the object
+        """
+        def generate():
+            yield json.dumps(fields)[:-1] + ', ' if fields else '{'
+            yield json.dumps(name) + ': ['
+            next_cursor = None
+            for count, row in enumerate(rows):
+                if limit is not None and count == limit:
+                    break
+                if count:
+                    yield ', '
+                yield json.dumps(to_json(row))
+                next_cursor = cursor_of(row)
+            else:
+                next_cursor = None
+            yield ']'
+            if limit is not None:
+                yield ', "next-cursor": ' + json.dumps(next_cursor)
+            yield '}'
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    @staticmethod
+    def _stream_ndjson(rows: Iterable, to_json: Callable[..., dict]) -> Response:
+        """
+        Stream the serialized rows as newline delimited JSON, one row per line.
+        """
+        def generate():
+            for row in rows:
+                yield json.dumps(to_json(row)) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -84,14 +84,167 @@ def _workflow_name(transform_request):
 class SubmitTransformationRequest(ServiceXResource):
     @classmethod
     def make_api(cls, rabbitmq_adaptor, object_store,
-                 code_gen_service, lookup_result_processor, docker_repo_adapter):
+                 code_gen_service, lookup_result_processor, docker_repo_adapter,
+                 submission_executor=None):
         cls.rabbitmq_adaptor = rabbitmq_adaptor
         cls.object_store = object_store
         cls.code_gen_service = code_gen_service
         cls.lookup_result_processor = lookup_result_processor
         cls.docker_repo_adapter = docker_repo_adapter
+        cls.submission_executor = submission_executor
         return cls
 
+    def _create_bucket(self, request_rec):
+        if self.object_store and \
+                request_rec.result_destination == \
+                TransformRequest.OBJECT_STORE_DEST:
+            self.object_store.create_bucket(request_rec.request_id)
+            # WHat happens if object-store and object_store is None?
+
+    def _cached_result(self, request_rec):
+        """
+        Find a completed request with the same fingerprint whose results are
+        still in the object store, so they can be served instead of running
+        the transform again.
+        :return: The earlier request, or None if the transform must be run.
+        """
+        if not current_app.config.get('TRANSFORM_RESULT_CACHE_ENABLED', False) or \
+                not self.object_store or \
+                request_rec.result_destination != TransformRequest.OBJECT_STORE_DEST:
+            return None
+
+        cached = TransformRequest.find_cached_result(request_rec.fingerprint)
+        if cached and self.object_store.bucket_exists(cached.request_id):
+            return cached
+        return None
+
+    def _image_exists(self, image):
+        if current_app.config['TRANSFORMER_VALIDATE_DOCKER_IMAGE']:
+            return self.docker_repo_adapter.check_image_exists(image)
+        return True
+
+    def _generate_code(self, request_rec):
+        # If we are doing the xaod_cpp workflow, then the first thing to do is make
+        # sure the requested selection is correct, and generate the C++ files
+        if request_rec.workflow_name == 'selection_codegen':
+            namespace = current_app.config['TRANSFORMER_NAMESPACE']
+            request_rec.generated_code_cm = \
+                self.code_gen_service.generate_code_for_selection(request_rec, namespace)
+
+    def _setup_queues(self, request_id):
+        # Insure the required queues and exchange exist in RabbitMQ broker
+        self.rabbitmq_adaptor.setup_request_topology(request_id)
+
+    def _dispatch(self, request_rec, parsed_did, file_list):
+        """
+        Hand the request off to the DID finder, or feed the static file list
+        straight to the transformers.
+        """
+        if parsed_did:
+            did_request = {
+                "request_id": request_rec.request_id,
+                "did": parsed_did.did,
+                "service-endpoint": self._generate_advertised_endpoint(
+                    "servicex/internal/transformation/" +
+                    request_rec.request_id
+                )
+            }
+
+            self.rabbitmq_adaptor.basic_publish(exchange='',
+                                                routing_key=parsed_did.microservice_queue,
+                                                body=json.dumps(did_request))
+        else:
+            # Request a preflight check on the first file
+            self.lookup_result_processor.publish_preflight_request(
+                request_rec,
+                file_list[0])
+
+            file_records = [DatasetFile(request_id=request_rec.request_id,
+                                        file_path=file_path,
+                                        adler32="xxx",
+                                        file_events=0,
+                                        file_size=0)
+                            for file_path in file_list]
+            self.lookup_result_processor.add_files_to_dataset(
+                request_rec,
+                file_records
+            )
+
+            self.lookup_result_processor.report_fileset_complete(
+                request_rec,
+                num_files=len(file_list)
+            )
+
+            db.session.commit()
+
+    def _setup_request_async(self, app, request_id, parsed_did, file_list):
+        """
+        Run the slow submission steps for a request that has already been
+        persisted. Runs on the submission executor, outside of the HTTP request.
+        The request status is updated as each step starts, and the request is
+        marked Fatal if any of them fail. Once the request has been dispatched
+        its status is returned to Submitted, as in the synchronous path.
+        """
+        with app.app_context():
+            request_rec = TransformRequest.return_request(request_id)
+
+            def validate_image():
+                if not self._image_exists(request_rec.image):
+                    raise ValueError("Requested transformer docker image doesn't exist: " +
+                                     request_rec.image)
+
+            steps = [
+                ("Creating Bucket", lambda: self._create_bucket(request_rec)),
+                ("Validating Image", validate_image),
+                ("Generating Code", lambda: self._generate_code(request_rec)),
+                ("Configuring Queues", lambda: self._setup_queues(request_id)),
+                ("Submitted", lambda: self._dispatch(request_rec, parsed_did, file_list))
+            ]
+
+            status = request_rec.status
+            try:
+                for status, step in steps:
+                    request_rec.status = status
+                    request_rec.save_to_db()
+                    db.session.commit()
+                    step()
+                    request_rec.save_to_db()
+                    db.session.commit()
+            except Exception as eek:
+                traceback.print_exc(limit=20, file=sys.stdout)
+                db.session.rollback()
+                request_rec.status = 'Fatal'
+                request_rec.failure_description = f"{status} failed: {str(eek)}"
+                request_rec.save_to_db()
+                db.session.commit()
+
+    def _copy_cached_results(self, app, request_id):
+        """
+        Copy the results of the earlier request this one matched into its
+        bucket and mark it Complete. Runs on the submission executor when
+        there is one. If the copy fails the partly filled bucket is removed
+        and the request is marked Fatal.
+        """
+        with app.app_context():
+            request_rec = TransformRequest.return_request(request_id)
+            try:
+                cached = TransformRequest.return_request(request_rec.cached_from)
+                self.object_store.copy_bucket(cached.request_id, request_id)
+                request_rec.complete_from_cached(cached)
+                request_rec.save_to_db()
+                db.session.commit()
+            except Exception as eek:
+                traceback.print_exc(limit=20, file=sys.stdout)
+                db.session.rollback()
+                try:
+                    self.object_store.remove_bucket(request_id)
+                except Exception as remove_error:
+                    print(f"Unable to remove bucket {request_id}", remove_error)
+                request_rec.status = 'Fatal'
+                request_rec.failure_description = f"Copying Results failed: {str(eek)}"
+                request_rec.save_to_db()
+                db.session.commit()
+
     @auth_required
     def post(self):
         try:
@@ -108,6 +261,7 @@ class SubmitTransformationRequest(ServiceXResource):
             if bool(did) == bool(file_list):
                 raise BadRequest("Must provide did or file-list but not both")
 
+            parsed_did = None
             if did:
                 parsed_did = DIDParser(
                     did, default_scheme=config['DID_FINDER_DEFAULT_SCHEME']
@@ -116,22 +270,11 @@ class SubmitTransformationRequest(ServiceXResource):
                     msg = f"DID scheme is not supported: {parsed_did.scheme}"
                     return {'message': msg}, 400
 
-            if self.object_store and \
-                    args['result-destination'] == \
-                    TransformRequest.OBJECT_STORE_DEST:
-                self.object_store.create_bucket(request_id)
-                # WHat happens if object-store and object_store is None?
-
             if args['result-destination'] == TransformRequest.KAFKA_DEST:
                 broker = args['kafka']['broker']
             else:
                 broker = None
 
-            if config['TRANSFORMER_VALIDATE_DOCKER_IMAGE']:
-                if not self.docker_repo_adapter.check_image_exists(image):
-                    msg = f"Requested transformer docker image doesn't exist: {image}"
-                    return {'message': msg}, 400
-
             user = self.get_requesting_user()
             request_rec = TransformRequest(
                 request_id=str(request_id),
@@ -153,33 +296,47 @@ class SubmitTransformationRequest(ServiceXResource):
                 app_version=self._get_app_version(),
                 code_gen_image=config['CODE_GEN_IMAGE']
             )
+            request_rec.fingerprint = request_rec.compute_fingerprint(file_list or None)
 
-            # If we are doing the xaod_cpp workflow, then the first thing to do is make
-            # sure the requested selection is correct, and generate the C++ files
-            if request_rec.workflow_name == 'selection_codegen':
-                namespace = config['TRANSFORMER_NAMESPACE']
-                request_rec.generated_code_cm = \
-                    self.code_gen_service.generate_code_for_selection(request_rec, namespace)
-
-            # Insure the required queues and exchange exist in RabbitMQ broker
-            try:
-                self.rabbitmq_adaptor.setup_exchange('transformation_requests')
-                self.rabbitmq_adaptor.setup_exchange('transformation_failures')
+            # Identical requests are answered with a copy of the earlier
+            # request's results, made in the background
+            cached = self._cached_result(request_rec)
+            if cached:
+                print(f"Request matches completed request {cached.request_id}")
+                request_rec.status = 'Copying Results'
+                request_rec.cached_from = cached.request_id
+                request_rec.save_to_db()
+                db.session.commit()
+                app = current_app._get_current_object()
+                if self.submission_executor:
+                    self.submission_executor.submit(self._copy_cached_results, app, request_id)
+                else:
+                    self._copy_cached_results(app, request_id)
+                return {
+                    "request_id": str(request_id)
+                }
 
-                # Create queue for transformers to read from
-                self.rabbitmq_adaptor.setup_queue(request_id)
+            if self.submission_executor and config.get('SUBMISSION_ASYNC_ENABLED'):
+                request_rec.status = 'Queued'
+                request_rec.save_to_db()
+                db.session.commit()
+                self.submission_executor.submit(self._setup_request_async,
+                                                current_app._get_current_object(),
+                                                request_id, parsed_did, file_list)
+                return {
+                    "request_id": str(request_id)
+                }
 
-                self.rabbitmq_adaptor.bind_queue_to_exchange(
-                    exchange="transformation_requests",
-                    queue=request_id)
+            self._create_bucket(request_rec)
 
-                # Also setup an error queue for dead letters generated by transformer
-                self.rabbitmq_adaptor.setup_queue(request_id+"_errors")
+            if not self._image_exists(image):
+                msg = f"Requested transformer docker image doesn't exist: {image}"
+                return {'message': msg}, 400
 
-                self.rabbitmq_adaptor.bind_queue_to_exchange(
-                    exchange="transformation_failures",
-                    queue=request_id+"_errors")
+            self._generate_code(request_rec)
 
+            try:
+                self._setup_queues(request_id)
             except Exception as eek:
                 print("Unable to create transformer exchange", eek)
                 return {'message': "Error setting up transformer queues"}, 503
@@ -187,42 +344,7 @@ class SubmitTransformationRequest(ServiceXResource):
             request_rec.save_to_db()
             db.session.commit()
 
-            if did:
-                did_request = {
-                    "request_id": request_rec.request_id,
-                    "did": parsed_did.did,
-                    "service-endpoint": self._generate_advertised_endpoint(
-                        "servicex/internal/transformation/" +
-                        request_rec.request_id
-                    )
-                }
-
-                self.rabbitmq_adaptor.basic_publish(exchange='',
-                                                    routing_key=parsed_did.microservice_queue,
-                                                    body=json.dumps(did_request))
-            else:
-                # Request a preflight check on the first file
-                self.lookup_result_processor.publish_preflight_request(
-                    request_rec,
-                    file_list[0])
-
-                for file_path in file_list:
-                    file_record = DatasetFile(request_id=request_id,
-                                              file_path=file_path,
-                                              adler32="xxx",
-                                              file_events=0,
-                                              file_size=0)
-                    self.lookup_result_processor.add_file_to_dataset(
-                        request_rec,
-                        file_record
-                    )
-
-                self.lookup_result_processor.report_fileset_complete(
-                    request_rec,
-                    num_files=len(file_list)
-                )
-
-                db.session.commit()
+            self._dispatch(request_rec, parsed_did, file_list)
 
             return {
                 "request_id": str(request_id)
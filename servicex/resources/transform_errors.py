@@ -25,27 +25,51 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from flask_restful import reqparse
 
 from servicex.decorators import auth_required
 from servicex.models import TransformRequest, FileStatus
 from servicex.resources.servicex_resource import ServiceXResource
 
+errors_parser = reqparse.RequestParser()
+errors_parser.add_argument('cursor', type=int, required=False, location='args',
+                           help='Return errors after this cursor')
+errors_parser.add_argument('limit', type=int, required=False, location='args',
+                           help='Maximum number of errors to return')
+
 
 class TransformErrors(ServiceXResource):
     @auth_required
     def get(self, request_id):
         """
         Fetches errors for a given transformation request.
+        If a limit is given the errors are paged, and the response includes
+        the cursor to pass to fetch the next page, or null on the last page.
+        The response is streamed so large error lists aren't held in memory.
         :param request_id: UUID of transformation request.
         """
         transform = TransformRequest.return_request(request_id)
         if not transform:
             msg = f'Transformation request not found with id: {request_id}'
             return {'message': msg}, 404
-        results = [{
-            "pod-name": result[1].pod_name,
-            "file": result[0].file_path,
-            "events": result[0].file_events,
-            "info": result[1].info
-        } for result in FileStatus.failures_for_request(request_id)]
-        return {"errors": list(results)}
+
+        args = errors_parser.parse_args()
+        limit = args['limit']
+        if limit is not None and limit < 1:
+            return {'message': 'limit must be a positive integer'}, 400
+
+        # Fetch one extra row to find out if there is another page
+        failures = FileStatus.failures_for_request(
+            request_id, after_id=args['cursor'],
+            limit=limit + 1 if limit is not None else None)
+
+        return self._stream_json_page(
+            "errors", failures,
+            to_json=lambda result: {
+                "pod-name": result[1].pod_name,
+                "file": result[0].file_path,
+                "events": result[0].file_events,
+                "info": result[1].info
+            },
+            cursor_of=lambda result: result[1].id,
+            limit=limit)
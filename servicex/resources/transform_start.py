@@ -25,6 +25,8 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import functools
+
 from flask import current_app
 
 from servicex.models import TransformRequest, db
@@ -33,9 +35,10 @@ from servicex.resources.servicex_resource import ServiceXResource
 
 class TransformStart(ServiceXResource):
     @classmethod
-    def make_api(cls, transformer_manager):
+    def make_api(cls, transformer_manager, code_gen_service=None):
         """Initializes the transformer manage for this resource."""
         cls.transformer_manager = transformer_manager
+        cls.code_gen_service = code_gen_service
         return cls
 
     def post(self, request_id):
@@ -65,6 +68,15 @@ class TransformStart(ServiceXResource):
             x509_secret = current_app.config['TRANSFORMER_X509_SECRET']
             generated_code_cm = submitted_request.generated_code_cm
 
+            # The generated code ConfigMap is shared between identical selections.
+            # A request that finished after this one found the ConfigMap, but
+            # before this one was recorded as using it, may have deleted it.
+            ensure_generated_code = None
+            if generated_code_cm and self.code_gen_service:
+                ensure_generated_code = functools.partial(
+                    self.code_gen_service.ensure_generated_code,
+                    submitted_request.selection, submitted_request.code_gen_image, namepsace)
+
             self.transformer_manager.launch_transformer_jobs(
                 image=submitted_request.image, request_id=request_id,
                 workers=submitted_request.workers,
@@ -74,4 +86,5 @@ class TransformStart(ServiceXResource):
                 generated_code_cm=generated_code_cm,
                 result_destination=submitted_request.result_destination,
                 result_format=submitted_request.result_format,
-                kafka_broker=submitted_request.kafka_broker)
+                kafka_broker=submitted_request.kafka_broker,
+                ensure_generated_code=ensure_generated_code)
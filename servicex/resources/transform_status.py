@@ -25,44 +25,110 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from typing import Optional
+
 from flask_restful import reqparse
 from flask import jsonify
 
 from servicex.decorators import auth_required
 from servicex.models import TransformationResult, TransformRequest, db
 from servicex.resources.servicex_resource import ServiceXResource
+from servicex.resources.transform_start import TransformStart
+from servicex.transformer_manager import TransformerManager
 
 
 status_request_parser = reqparse.RequestParser()
 status_request_parser.add_argument('details', type=bool, default=False,
                                    required=False, location='args')
+status_request_parser.add_argument('cursor', type=int, required=False, location='args',
+                                   help='Return details after this cursor')
+status_request_parser.add_argument('limit', type=int, required=False, location='args',
+                                   help='Maximum number of details to return')
+status_request_parser.add_argument('format', choices=['json', 'ndjson'], default='json',
+                                   required=False, location='args')
 
 
 class TransformationStatus(ServiceXResource):
     @auth_required
     def get(self, request_id):
-        transform = TransformRequest.return_request(request_id)
+        """
+        Reports progress of a transformation request.
+        With details=true the result for each file is included. The details
+        can be paged with limit and cursor, and with format=ndjson they are
+        streamed one per line instead of the status report.
+        :param request_id: UUID of transformation request.
+        """
+        transform = TransformRequest.return_request_with_statistics(request_id)
         if not transform:
             msg = f'Transformation request not found with id: {request_id}'
             return {'message': msg}, 404
 
         status_request = status_request_parser.parse_args()
 
-        result_dict = {
-            "status": transform.status,
-            "request-id": request_id,
-            "files-processed": transform.files_processed,
-            "files-skipped": transform.files_failed,
-            "files-remaining": transform.files_remaining,
-            "stats": transform.statistics
+        result_dict = transform.progress_json()
+        result_dict["request-id"] = request_id
+        result_dict["stats"] = transform.statistics
+
+        if not status_request.details:
+            return jsonify(result_dict)
+
+        limit = status_request.limit
+        if limit is not None and limit < 1:
+            return {'message': 'limit must be a positive integer'}, 400
+
+        if status_request.format == 'ndjson':
+            results = TransformationResult.for_request(
+                request_id, after_id=status_request.cursor, limit=limit)
+            return self._stream_ndjson(results, TransformationResult.to_json)
+
+        # Fetch one extra row to find out if there is another page
+        results = TransformationResult.for_request(
+            request_id, after_id=status_request.cursor,
+            limit=limit + 1 if limit is not None else None)
+        return self._stream_json_page('details', results,
+                                      to_json=TransformationResult.to_json,
+                                      cursor_of=lambda result: result.id,
+                                      limit=limit, fields=result_dict)
+
+
+batch_status_parser = reqparse.RequestParser()
+batch_status_parser.add_argument('request-id', dest='request_ids', action='append',
+                                 required=True, location='args',
+                                 help='UUID of a transformation request, may be repeated')
+batch_status_parser.add_argument('deployment', type=bool, default=False,
+                                 required=False, location='args')
+
+
+class TransformationStatusBatch(ServiceXResource):
+    MAX_REQUESTS = 100
+
+    @auth_required
+    def get(self):
+        """
+        Reports progress of several transformation requests in one call.
+        With deployment=true the number of transformer replicas running for
+        each request is included too. Unknown request IDs are left out.
+        """
+        status_request = batch_status_parser.parse_args()
+        request_ids = list(dict.fromkeys(status_request.request_ids))
+        if len(request_ids) > self.MAX_REQUESTS:
+            msg = f'At most {self.MAX_REQUESTS} request IDs may be given'
+            return {'message': msg}, 400
+
+        results = {
+            transform.request_id: transform.progress_json()
+            for transform in TransformRequest.return_requests(request_ids)
         }
 
-        if status_request.details:
-            result_dict['details'] = TransformationResult.to_json_list(
-                transform.results
-            )
+        if status_request.deployment and results:
+            # todo - improve dependency injection
+            manager: TransformerManager = TransformStart.transformer_manager
+            deployments = manager.get_deployment_statuses(results.keys())
+            for request_id, result in results.items():
+                deployment = deployments.get(request_id)
+                result["replicas"] = deployment.replicas if deployment else None
 
-        return jsonify(result_dict)
+        return jsonify({"requests": results})
 
 
 # Status Updates POST
@@ -76,13 +142,25 @@ status_parser.add_argument('source', required=False)
 
 
 class TransformationStatusInternal(ServiceXResource):
+    @classmethod
+    def make_api(cls, event_hub=None):
+        cls.event_hub = event_hub
+        return cls
 
-    def post(self, request_id):
-        status = status_parser.parse_args()
-        status.request_id = request_id
-        if status.severity == "fatal":
-            print("+--------------------------------------------+")
-            print(r"""
+    def record_status(self, request_id, status) -> Optional[TransformRequest]:
+        """
+        Apply a status update reported by a transformer or DID finder without
+        committing. Fatal errors mark the request as failed.
+        :param request_id: UUID of transformation request.
+        :param status: The update, with severity, info and source
+        :return: The request if its status changed, otherwise None
+        """
+        if status.get('severity') != "fatal":
+            print(status)
+            return None
+
+        print("+--------------------------------------------+")
+        print(r"""
   ______   _______       _        ______ _____  _____   ____  _____
  |  ____/\|__   __|/\   | |      |  ____|  __ \|  __ \ / __ \|  __ \
  | |__ /  \  | |  /  \  | |      | |__  | |__) | |__) | |  | | |__) |
@@ -90,14 +168,24 @@ class TransformationStatusInternal(ServiceXResource):
  | | / ____ \| |/ ____ \| |____  | |____| | \ \| | \ \| |__| | | \ \
  |_|/_/    \_\_/_/    \_\______| |______|_|  \_\_|  \_\\____/|_|  \_\
             """)
-            print(f"+ Fatal error reported for {request_id} from {status.source}")
-            print(status.info)
-            print("+--------------------------------------------+")
-
-            submitted_request = TransformRequest.return_request(request_id)
-            submitted_request.status = 'Fatal'
-            submitted_request.failure_description = status.info
-            submitted_request.save_to_db()
-            db.session.commit()
-        else:
-            print(status)
+        print(f"+ Fatal error reported for {request_id} from {status.get('source')}")
+        print(status.get('info'))
+        print("+--------------------------------------------+")
+
+        submitted_request = TransformRequest.return_request(request_id)
+        submitted_request.status = 'Fatal'
+        submitted_request.failure_description = status.get('info')
+        submitted_request.save_to_db()
+        TransformRequest.invalidate_cached(request_id)
+        return submitted_request
+
+    def post(self, request_id):
+        status = status_parser.parse_args()
+        submitted_request = self.record_status(request_id, status)
+        if submitted_request is None:
+            return
+
+        db.session.commit()
+
+        if self.event_hub and self.event_hub.is_watched(request_id):
+            self.event_hub.publish_status(request_id, submitted_request.progress_json())
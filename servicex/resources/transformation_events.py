@@ -0,0 +1,102 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+import time
+
+from flask import Response, current_app
+
+from servicex.decorators import auth_required
+from servicex.models import TransformRequest
+from servicex.request_event_hub import RequestEventHub, TERMINAL_STATES
+from servicex.resources.servicex_resource import ServiceXResource
+
+
+class TransformationEvents(ServiceXResource):
+    @classmethod
+    def make_api(cls, event_hub: RequestEventHub):
+        cls.event_hub = event_hub
+        return cls
+
+    @staticmethod
+    def _format_event(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @auth_required
+    def get(self, request_id):
+        """
+        Streams the progress of a transformation request as Server-Sent Events.
+        A status event is sent straight away and then whenever the status
+        changes, and a file-complete event is sent as each file is reported.
+        The stream ends once the request is Complete or Fatal, or after
+        EVENTS_STREAM_TIMEOUT seconds, after which clients should reconnect.
+        When EVENTS_MAX_STREAMS clients are already watching through this
+        worker it returns 503, with a Retry-After header.
+        :param request_id: UUID of transformation request.
+        """
+        transform = TransformRequest.return_request(request_id)
+        if not transform:
+            msg = f'Transformation request not found with id: {request_id}'
+            return {'message': msg}, 404
+
+        status = transform.progress_json()
+        keepalive = current_app.config.get('EVENTS_KEEPALIVE_INTERVAL', 15)
+        deadline = time.monotonic() + current_app.config.get('EVENTS_STREAM_TIMEOUT', 60)
+        subscription = self.event_hub.subscribe(request_id, status)
+        if subscription is None:
+            retry_after = current_app.config.get('EVENTS_POLL_INTERVAL', 5)
+            return {'message': 'Too many event streams open, try again later'}, 503, \
+                {'Retry-After': str(retry_after)}
+
+        # The stream outlives the request context, so it must not touch the app
+        def stream():
+            try:
+                yield self._format_event('status', status)
+                if status['status'] in TERMINAL_STATES:
+                    return
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    event = subscription.get(timeout=min(keepalive, remaining))
+                    if event is None:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield self._format_event(*event)
+                    name, data = event
+                    if name == 'status' and data['status'] in TERMINAL_STATES:
+                        return
+            finally:
+                self.event_hub.unsubscribe(subscription)
+
+        resp = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 'X-Accel-Buffering': 'no'})
+        # HEAD requests and clients that hang up before the body is read never
+        # start the generator, so release the slot when the response closes
+        resp.call_on_close(lambda: self.event_hub.unsubscribe(subscription))
+        return resp
@@ -25,6 +25,8 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from typing import Optional
+
 from flask import request, current_app
 
 from servicex.models import TransformRequest, TransformationResult, DatasetFile, db
@@ -33,10 +35,52 @@ from servicex.resources.servicex_resource import ServiceXResource
 
 class TransformerFileComplete(ServiceXResource):
     @classmethod
-    def make_api(cls, transformer_manager):
+    def make_api(cls, transformer_manager, event_hub=None):
         cls.transformer_manager = transformer_manager
+        cls.event_hub = event_hub
         return cls
 
+    def shutdown_if_complete(self, request_id, submitted_request, deferred=None) -> bool:
+        """
+        Mark the request Complete and shut down its transformers once every
+        file has been reported. Nothing is done while the dataset lookup is
+        still running, since the number of files isn't known yet.
+        :param request_id: UUID of transformation request.
+        :param submitted_request: The request, with its counters up to date.
+        :param deferred: If given, the shutdown is appended to this list rather
+            than run, so the caller can do it once the status is committed.
+        :return: True if the request is now Complete.
+        """
+        files_remaining = submitted_request.files_remaining
+        if files_remaining is None or files_remaining > 0:
+            return False
+
+        namespace = current_app.config['TRANSFORMER_NAMESPACE']
+        generated_code_cm = submitted_request.generated_code_cm
+        print("Job is all done... shutting down transformers")
+        submitted_request.status = "Complete"
+        submitted_request.save_to_db()
+        TransformRequest.invalidate_cached(request_id)
+
+        def shutdown():
+            self.transformer_manager.shutdown_transformer_job(
+                request_id, namespace, generated_code_cm)
+
+        if deferred is None:
+            shutdown()
+        else:
+            deferred.append(shutdown)
+        return True
+
+    def _publish_file_complete(self, request_id, file_id, info):
+        self.event_hub.publish(request_id, 'file-complete', {
+            'file-id': file_id,
+            'file-path': info['file-path'],
+            'status': info['status'],
+            'total-events': info['total-events'],
+            'total-bytes': info['total-bytes']
+        })
+
     def put(self, request_id):
         info = request.get_json()
         submitted_request = TransformRequest.return_request(request_id)
@@ -58,15 +102,91 @@ class TransformerFileComplete(ServiceXResource):
             messages=info['num-messages']
         )
         rec.save_to_db()
+        submitted_request.record_file_result(info['status'],
+                                             total_bytes=info['total-bytes'],
+                                             total_events=info['total-events'])
 
-        if submitted_request.files_remaining <= 0:
-            namespace = current_app.config['TRANSFORMER_NAMESPACE']
-            print("Job is all done... shutting down transformers")
-            self.transformer_manager.shutdown_transformer_job(request_id, namespace)
-            submitted_request.status = "Complete"
-            submitted_request.save_to_db()
+        deferred = []
+        self.shutdown_if_complete(request_id, submitted_request, deferred)
 
         print(info)
         db.session.commit()
+        for action in deferred:
+            action()
+
+        if self.event_hub and self.event_hub.is_watched(request_id):
+            self._publish_file_complete(request_id, dataset_file.id, info)
+            self.event_hub.publish_status(request_id, submitted_request.progress_json())
+
+        return "Ok"
+
+
+class TransformerFileCompleteBatch(TransformerFileComplete):
+    """
+    Accepts a list of file completion records, in the same format as
+    TransformerFileComplete, so transformers can report many files in one
+    call. The results are written with a single bulk insert and the request's
+    counters and completion check are updated once per batch.
+    """
+    def record_files_complete(self, request_id, infos,
+                              deferred=None) -> Optional[TransformRequest]:
+        """
+        Record a batch of file completions without committing.
+        :param request_id: UUID of transformation request.
+        :param infos: File completion records.
+        :param deferred: If given, a transformer shutdown is appended to this
+            list to be run after the commit.
+        :return: The updated request, or None if it doesn't exist.
+        :raises KeyError, TypeError: If a record is malformed.
+        """
+        submitted_request = TransformRequest.return_request(request_id)
+        if submitted_request is None:
+            return None
+
+        results = [{
+            'did': submitted_request.did,
+            'file_id': info['file-id'],
+            'request_id': request_id,
+            'file_path': info['file-path'],
+            'transform_status': info['status'],
+            'transform_time': info['total-time'],
+            'total_bytes': info['total-bytes'],
+            'total_events': info['total-events'],
+            'avg_rate': info['avg-rate'],
+            'messages': info['num-messages']
+        } for info in infos]
+
+        TransformationResult.bulk_insert(results)
+        submitted_request.record_file_results(
+            (info['status'], info['total-bytes'], info['total-events']) for info in infos
+        )
+
+        self.shutdown_if_complete(request_id, submitted_request, deferred)
+        print(f"{len(infos)} files complete for {request_id}")
+        return submitted_request
+
+    def put(self, request_id):
+        infos = request.get_json()
+        if not isinstance(infos, list) or not infos:
+            return {"message": "Expected a non-empty list of file completion records"}, 400
+
+        deferred = []
+        try:
+            submitted_request = self.record_files_complete(request_id, infos, deferred)
+        except (KeyError, TypeError) as eek:
+            db.session.rollback()
+            return {"message": f"Malformed file completion record: {eek}"}, 400
+
+        if submitted_request is None:
+            return {"message": f"Request not found with id: '{request_id}'"}, 404
+
+        db.session.commit()
+        for action in deferred:
+            action()
+
+        if self.event_hub and self.event_hub.is_watched(request_id):
+            for info in infos:
+                self._publish_file_complete(request_id, info['file-id'], info)
+            self.event_hub.publish_status(request_id, submitted_request.progress_json())
 
         return "Ok"
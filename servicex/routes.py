@@ -30,21 +30,25 @@ from flask import current_app as app
 
 def add_routes(api, transformer_manager, rabbit_mq_adaptor,
                object_store, code_gen_service,
-               lookup_result_processor, docker_repo_adapter):
+               lookup_result_processor, docker_repo_adapter,
+               submission_executor=None, event_hub=None, file_status_buffer=None):
     from servicex.resources.submit_transformation_request import SubmitTransformationRequest
     from servicex.resources.transform_start import TransformStart
     from servicex.resources.transform_status \
-        import TransformationStatus, TransformationStatusInternal
+        import TransformationStatus, TransformationStatusBatch, TransformationStatusInternal
     from servicex.resources.file_transform_status import FileTransformationStatus
     from servicex.resources.all_transformation_requests import AllTransformationRequests
     from servicex.resources.transformation_request import TransformationRequest
     from servicex.resources.add_file_to_dataset import AddFileToDataset
     from servicex.resources.preflight_check import PreflightCheck
     from servicex.resources.fileset_complete import FilesetComplete
-    from servicex.resources.transformer_file_complete import TransformerFileComplete
+    from servicex.resources.transformer_file_complete import \
+        TransformerFileComplete, TransformerFileCompleteBatch
     from servicex.resources.transform_errors import TransformErrors
     from servicex.resources.info import Info
+    from servicex.resources.metrics import Metrics
     from servicex.resources.deployment_status import DeploymentStatus
+    from servicex.resources.transformation_events import TransformationEvents
 
     from servicex.resources.users.all_users import AllUsers
     from servicex.resources.users.token_refresh import TokenRefresh
@@ -72,7 +76,8 @@ def add_routes(api, transformer_manager, rabbit_mq_adaptor,
                                          object_store=object_store,
                                          code_gen_service=code_gen_service,
                                          lookup_result_processor=lookup_result_processor,
-                                         docker_repo_adapter=docker_repo_adapter)
+                                         docker_repo_adapter=docker_repo_adapter,
+                                         submission_executor=submission_executor)
 
     # Web Frontend Routes
     app.add_url_rule('/', 'home', home)
@@ -107,13 +112,17 @@ def add_routes(api, transformer_manager, rabbit_mq_adaptor,
     prefix = "/servicex/transformation"
     api.add_resource(SubmitTransformationRequest, prefix)
     api.add_resource(AllTransformationRequests, prefix)
+    api.add_resource(TransformationStatusBatch, prefix + "/status")
     prefix += "/<string:request_id>"
     api.add_resource(TransformationRequest, prefix)
     api.add_resource(TransformationStatus, prefix + "/status")
     api.add_resource(TransformErrors, prefix + "/errors")
     api.add_resource(DeploymentStatus, prefix + "/deployment-status")
+    TransformationEvents.make_api(event_hub)
+    api.add_resource(TransformationEvents, prefix + "/events")
 
     # Internal service endpoints
+    TransformationStatusInternal.make_api(event_hub)
     api.add_resource(TransformationStatusInternal,
                      '/servicex/internal/transformation/<string:request_id>/status')
 
@@ -125,17 +134,25 @@ def add_routes(api, transformer_manager, rabbit_mq_adaptor,
     api.add_resource(PreflightCheck,
                      '/servicex/internal/transformation/<string:request_id>/preflight')
 
-    FilesetComplete.make_api(lookup_result_processor)
+    FilesetComplete.make_api(lookup_result_processor, event_hub)
     api.add_resource(FilesetComplete,
                      '/servicex/internal/transformation/<string:request_id>/complete')
 
-    TransformStart.make_api(transformer_manager)
+    TransformStart.make_api(transformer_manager, code_gen_service)
     api.add_resource(TransformStart,
                      '/servicex/internal/transformation/<string:request_id>/start')
 
+    FileTransformationStatus.make_api(file_status_buffer)
     api.add_resource(FileTransformationStatus,
                      '/servicex/internal/transformation/<string:request_id>/<int:file_id>/status')
 
-    TransformerFileComplete.make_api(transformer_manager)
+    TransformerFileComplete.make_api(transformer_manager, event_hub)
     api.add_resource(TransformerFileComplete,
                      '/servicex/internal/transformation/<string:request_id>/file-complete')
+
+    TransformerFileCompleteBatch.make_api(transformer_manager, event_hub)
+    api.add_resource(TransformerFileCompleteBatch,
+                     '/servicex/internal/transformation/<string:request_id>/file-complete-batch')
+
+    Metrics.make_api(file_status_buffer)
+    api.add_resource(Metrics, '/servicex/internal/metrics')
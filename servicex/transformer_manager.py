@@ -26,16 +26,28 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import base64
-from typing import Optional
+import functools
+import threading
+from typing import Dict, Iterable, Optional
 
 import kubernetes
 from kubernetes import client
+from kubernetes.client.rest import ApiException
 from flask import current_app
 
+from servicex.deployment_informer import DeploymentInformer
+from servicex.kubernetes_work_queue import KubernetesWorkQueue
+from servicex.models import TransformRequest, db
+
 
 class TransformerManager:
 
-    def __init__(self, manager_mode):
+    def __init__(self, manager_mode, pool_size=10):
+        """
+        :param manager_mode: internal-kubernetes when running in the cluster,
+            or external-kubernetes to use the local kube config.
+        :param pool_size: Connections kept open to the API server.
+        """
         if manager_mode == 'internal-kubernetes':
             kubernetes.config.load_incluster_config()
         elif manager_mode == 'external-kubernetes':
@@ -43,6 +55,102 @@ class TransformerManager:
         else:
             raise ValueError('Manager mode '+manager_mode+' not valid')
 
+        # Every API object shares one client, and so one pool of keep-alive
+        # connections, instead of opening new ones for each call. The
+        # underlying urllib3 pool is thread-safe. It starts from a copy of
+        # the configuration loaded above; Configuration() only returns that
+        # on clients before 12, later ones return a blank configuration.
+        if hasattr(client.Configuration, 'get_default_copy'):
+            configuration = client.Configuration.get_default_copy()
+        else:
+            configuration = client.Configuration()
+        configuration.connection_pool_maxsize = pool_size
+        self._api_client = client.ApiClient(configuration)
+
+        self._informer: Optional[DeploymentInformer] = None
+        self._informer_lock = threading.Lock()
+        self._work_queue: Optional[KubernetesWorkQueue] = None
+        self._work_queue_lock = threading.Lock()
+
+    def _apps_api(self) -> client.AppsV1Api:
+        return client.AppsV1Api(self._api_client)
+
+    def _core_api(self) -> client.CoreV1Api:
+        return client.CoreV1Api(self._api_client)
+
+    def _autoscaling_api(self) -> client.AutoscalingV1Api:
+        return client.AutoscalingV1Api(self._api_client)
+
+    def _deployment_informer(self) -> Optional[DeploymentInformer]:
+        """
+        The shared cache of transformer deployment status, started on first
+        use if TRANSFORMER_WATCH_DEPLOYMENTS is enabled.
+        :return: The informer if it is ready to serve reads, otherwise None
+        """
+        if not current_app.config.get('TRANSFORMER_WATCH_DEPLOYMENTS'):
+            return None
+        with self._informer_lock:
+            if self._informer is None:
+                self._informer = DeploymentInformer(
+                    current_app.config["TRANSFORMER_NAMESPACE"], current_app.logger,
+                    api_client=self._api_client)
+                self._informer.start()
+        return self._informer if self._informer.synced else None
+
+    def _submit(self, description, operation, request_id=None):
+        """
+        Run a Kubernetes operation. If TRANSFORMER_ASYNC_OPERATIONS is enabled
+        it is queued and run in the background instead, with retries.
+        :param description: What the operation does, for the logs.
+        :param operation: Idempotent function making the API calls.
+        :param request_id: Request to mark Fatal if a queued operation fails,
+            since its error can no longer reach the caller.
+        """
+        if not current_app.config.get('TRANSFORMER_ASYNC_OPERATIONS'):
+            operation()
+            return
+
+        with self._work_queue_lock:
+            if self._work_queue is None:
+                self._work_queue = KubernetesWorkQueue(
+                    current_app.logger,
+                    max_attempts=current_app.config.get('TRANSFORMER_OPERATION_ATTEMPTS', 6))
+
+        on_failure = None
+        if request_id is not None:
+            on_failure = functools.partial(self._mark_fatal, request_id)
+        self._work_queue.submit(description, operation, on_failure)
+
+    @staticmethod
+    def _mark_fatal(request_id, message):
+        submitted_request = TransformRequest.return_request(request_id)
+        if submitted_request is None or submitted_request.status in ("Complete", "Fatal"):
+            return
+        submitted_request.status = "Fatal"
+        submitted_request.failure_description = message
+        submitted_request.save_to_db()
+        db.session.commit()
+        TransformRequest.invalidate_cached(request_id)
+
+    @staticmethod
+    def _request_finished(request_id) -> bool:
+        submitted_request = TransformRequest.return_request(request_id)
+        return submitted_request is not None and \
+            submitted_request.status in ("Complete", "Fatal")
+
+    @staticmethod
+    def _ignore_status(status, call, **kwargs):
+        """
+        Make an API call, treating the given error status as success. Used to
+        make creates and deletes idempotent so they can be retried.
+        """
+        try:
+            return call(**kwargs)
+        except ApiException as eek:
+            if eek.status != status:
+                raise
+            return None
+
     @staticmethod
     def create_job_object(request_id, image, chunk_size, rabbitmq_uri, workers,
                           result_destination, result_format, x509_secret, kafka_broker,
@@ -191,65 +299,115 @@ class TransformerManager:
 
         return hpa
 
-    @staticmethod
-    def _create_job(api_instance, job, namespace):
+    @classmethod
+    def _create_job(cls, api_instance, job, namespace):
+        # Create job, which may already exist if this is a retry
+        api_response = cls._ignore_status(409, api_instance.create_namespaced_deployment,
+                                          body=job,
+                                          namespace=namespace)
+        if api_response:
+            print("Job created. status='%s'" % str(api_response.status))
+
+    @classmethod
+    def _create_hpa(cls, api_instance, hpa, namespace):
         # Create job
-
-        api_response = api_instance.create_namespaced_deployment(
-            body=job,
-            namespace=namespace)
-        print("Job created. status='%s'" % str(api_response.status))
-
-    @staticmethod
-    def _create_hpa(api_instance, hpa, namespace):
-        # Create job
-        api_response = api_instance.create_namespaced_horizontal_pod_autoscaler(
+        api_response = cls._ignore_status(
+            409, api_instance.create_namespaced_horizontal_pod_autoscaler,
             body=hpa,
             namespace=namespace)
-        print("Job created. status='%s'" % str(api_response.status))
+        if api_response:
+            print("Job created. status='%s'" % str(api_response.status))
 
     def launch_transformer_jobs(self, image, request_id, workers, chunk_size,
                                 rabbitmq_uri, namespace, x509_secret, generated_code_cm,
                                 result_destination, result_format, kafka_broker=None,
-                                ):
-        api_v1 = client.AppsV1Api()
+                                ensure_generated_code=None):
+        """
+        Create the transformer deployment of a request, and its autoscaler.
+        :param ensure_generated_code: Operation re-creating the generated code
+            ConfigMap if it has been deleted. It is run before the deployment
+            is created, and queued ahead of it when operations are queued.
+        """
         job = self.create_job_object(request_id, image, chunk_size, rabbitmq_uri, workers,
                                      result_destination, result_format,
                                      x509_secret, kafka_broker, generated_code_cm)
 
-        self._create_job(api_v1, job, namespace)
+        name = "transformer-" + request_id
+
+        if ensure_generated_code is not None:
+            self._submit(f"check config map {generated_code_cm}", ensure_generated_code,
+                         request_id)
+
+        # The request may finish, and its transformers be shut down by another
+        # worker process, before they are created here. Checking once they
+        # exist means they are removed by one side or the other.
+        def create_job():
+            self._create_job(self._apps_api(), job, namespace)
+            if self._request_finished(request_id):
+                self._ignore_status(404, self._apps_api().delete_namespaced_deployment,
+                                    name=name, namespace=namespace)
+
+        self._submit(f"create deployment {name}", create_job, request_id)
 
         if current_app.config['TRANSFORMER_AUTOSCALE_ENABLED']:
-            autoscaler_api = kubernetes.client.AutoscalingV1Api()
             hpa = self.create_hpa_object(request_id)
-            self._create_hpa(autoscaler_api, hpa, namespace)
 
-    @staticmethod
-    def shutdown_transformer_job(request_id, namespace):
+            def create_hpa():
+                self._create_hpa(self._autoscaling_api(), hpa, namespace)
+                if self._request_finished(request_id):
+                    self._ignore_status(
+                        404,
+                        self._autoscaling_api().delete_namespaced_horizontal_pod_autoscaler,
+                        name=name, namespace=namespace)
+
+            self._submit(f"create autoscaler {name}", create_hpa, request_id)
+
+    def shutdown_transformer_job(self, request_id, namespace, generated_code_cm=None):
+        """
+        Remove the transformers of a request. The generated code ConfigMap may
+        be shared by other requests with the same selection, so it is only
+        deleted once no other running request refers to it.
+        :param request_id: Request whose transformers are shut down.
+        :param namespace: Namespace the transformers run in.
+        :param generated_code_cm: Name of the request's generated code ConfigMap.
+        """
+        name = "transformer-" + request_id
+
         if current_app.config['TRANSFORMER_AUTOSCALE_ENABLED']:
-            autoscaler_api = kubernetes.client.AutoscalingV1Api()
-            autoscaler_api.delete_namespaced_horizontal_pod_autoscaler(
-                name="transformer-" + request_id,
+            self._submit(f"delete autoscaler {name}", lambda: self._ignore_status(
+                404,
+                self._autoscaling_api().delete_namespaced_horizontal_pod_autoscaler,
+                name=name,
                 namespace=namespace
-            )
+            ))
 
-        api_v1 = client.AppsV1Api()
-        api_v1.delete_namespaced_deployment(
-            name="transformer-" + request_id,
+        self._submit(f"delete deployment {name}", lambda: self._ignore_status(
+            404, self._apps_api().delete_namespaced_deployment,
+            name=name,
             namespace=namespace
-        )
+        ))
 
-        api_core = client.CoreV1Api()
-        configmap_name = "{}-generated-source".format(request_id)
-        api_core.delete_namespaced_config_map(name=configmap_name,
-                                              namespace=namespace)
+        def delete_configmap():
+            # Checked when the deletion runs, in case another request has
+            # started to use the ConfigMap in the meantime
+            if not TransformRequest.configmap_in_use(generated_code_cm,
+                                                     exclude_request_id=request_id):
+                self._ignore_status(404, self._core_api().delete_namespaced_config_map,
+                                    name=generated_code_cm,
+                                    namespace=namespace)
+
+        if generated_code_cm:
+            self._submit(f"delete config map {generated_code_cm}", delete_configmap)
 
-    @staticmethod
     def get_deployment_status(
-        request_id: str
+        self, request_id: str
     ) -> Optional[kubernetes.client.models.v1_deployment_status.V1DeploymentStatus]:
+        informer = self._deployment_informer()
+        if informer:
+            return informer.get(request_id)
+
         namespace = current_app.config["TRANSFORMER_NAMESPACE"]
-        api = client.AppsV1Api()
+        api = self._apps_api()
         selector = f"metadata.name=transformer-{request_id}"
         # selector = f"metadata.name=aeckart-servicex-app"
         results: kubernetes.client.AppsV1beta1DeploymentList
@@ -259,9 +417,43 @@ class TransformerManager:
         deployment: kubernetes.client.AppsV1beta1Deployment = results.items[0]
         return deployment.status
 
-    @staticmethod
-    def create_configmap_from_zip(zipfile, request_id, namespace):
-        configmap_name = "{}-generated-source".format(request_id)
+    def get_deployment_statuses(
+        self, request_ids: Iterable[str]
+    ) -> Dict[str, kubernetes.client.models.v1_deployment_status.V1DeploymentStatus]:
+        """
+        Look up the transformer deployments for several requests, from the
+        deployment cache or else with one list call against the namespace.
+        :param request_ids: UUIDs of transformation requests.
+        :return: Deployment status keyed by request ID. Requests without a
+                 deployment are left out.
+        """
+        informer = self._deployment_informer()
+        if informer:
+            return informer.get_many(request_ids)
+
+        namespace = current_app.config["TRANSFORMER_NAMESPACE"]
+        api = self._apps_api()
+        names = {f"transformer-{request_id}": request_id for request_id in request_ids}
+        results: kubernetes.client.V1DeploymentList
+        results = api.list_namespaced_deployment(namespace)
+        return {
+            names[deployment.metadata.name]: deployment.status
+            for deployment in results.items
+            if deployment.metadata.name in names
+        }
+
+    def configmap_exists(self, configmap_name, namespace) -> bool:
+        api_instance = self._core_api()
+        try:
+            api_instance.read_namespaced_config_map(name=configmap_name,
+                                                    namespace=namespace)
+        except ApiException as eek:
+            if eek.status == 404:
+                return False
+            raise
+        return True
+
+    def create_configmap_from_zip(self, zipfile, configmap_name, namespace):
         data = {
             file.filename:
                 base64.b64encode(zipfile.open(file).read()).decode("ascii") for file in
@@ -281,8 +473,13 @@ class TransformerManager:
             metadata=metadata
         )
 
-        api_instance = client.CoreV1Api()
-        api_instance.create_namespaced_config_map(
-            namespace=namespace,
-            body=configmap)
+        api_instance = self._core_api()
+        try:
+            api_instance.create_namespaced_config_map(
+                namespace=namespace,
+                body=configmap)
+        except ApiException as eek:
+            # Created concurrently by an identical request
+            if eek.status != 409:
+                raise
         return configmap_name
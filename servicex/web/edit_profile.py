@@ -22,6 +22,7 @@ def edit_profile():
             user.experiment = form.experiment.data
             user.updated_at = datetime.utcnow()
             db.session.commit()
+            UserModel.invalidate_auth(sub)
             flash("Your profile has been saved!", 'success')
             return redirect(url_for('profile'))
         else:
@@ -8,7 +8,6 @@ from servicex.models import TransformRequest
 @admin_required
 def global_dashboard():
     page = request.args.get('page', 1, type=int)
-    pagination: Pagination = TransformRequest.query\
-        .order_by(TransformRequest.id.desc())\
+    pagination: Pagination = TransformRequest.dashboard_query()\
         .paginate(page=page, per_page=25, error_out=False)
     return render_template("global_dashboard.html", pagination=pagination)
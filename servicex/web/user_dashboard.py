@@ -8,8 +8,7 @@ from servicex.models import TransformRequest
 @oauth_required
 def user_dashboard():
     page = request.args.get('page', 1, type=int)
-    pagination: Pagination = TransformRequest.query\
-        .filter_by(submitted_by=session["user_id"])\
-        .order_by(TransformRequest.id.desc())\
+    pagination: Pagination = TransformRequest\
+        .dashboard_query(submitted_by=session["user_id"])\
         .paginate(page=page, per_page=15, error_out=False)
     return render_template("user_dashboard.html", pagination=pagination)
@@ -41,7 +41,7 @@ setup(
     maintainer_email='bengal1@illinois.edu',
     description='REST Frontend to ServiceX.',
     long_description=readme,
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'tests*']),
     include_package_data=True,
     zip_safe=False,
     install_requires=[
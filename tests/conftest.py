@@ -1,4 +1,7 @@
+from contextlib import contextmanager
+
 from pytest import fixture
+from sqlalchemy import event
 
 
 @fixture
@@ -7,3 +10,40 @@ def mock_jwt_extended(mocker):
     During unit tests, functions from Flask-JWT-extended are mocked to do nothing.
     """
     mocker.patch('servicex.decorators.verify_jwt_in_request')
+
+
+@fixture(autouse=True)
+def clear_model_caches():
+    """
+    Each test starts with empty model caches, since request IDs and users
+    are reused between tests' databases.
+    """
+    from servicex.models import TransformRequest, UserModel
+    TransformRequest._cache.clear()
+    UserModel._auth_cache.clear()
+
+
+@fixture
+def count_queries():
+    """
+    Context manager that collects the SQL statements executed against an
+    app's database while it is open.
+    """
+    from servicex.models import db
+
+    @contextmanager
+    def count(app):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.get_engine()
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return count
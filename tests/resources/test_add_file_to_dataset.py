@@ -33,12 +33,17 @@ def set_dataset_file_id(submitted_request, dataset_file):
     dataset_file.id = "42"
 
 
+def set_dataset_file_ids(submitted_request, dataset_files, deferred=None):
+    for i, dataset_file in enumerate(dataset_files):
+        dataset_file.id = 42 + i
+
+
 class TestAddFileToDataset(ResourceTestBase):
     def test_put_new_file(self, mocker):
         import servicex
         mock_transform_request_read = mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'get_request_cached',
             return_value=self._generate_transform_request())
 
         mock_processor = mocker.MagicMock(LookupResultProcessor)
@@ -70,7 +75,7 @@ class TestAddFileToDataset(ResourceTestBase):
 
         mock_transform_request_read = mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'get_request_cached',
             return_value=root_file_transform_request)
 
         mock_processor = mocker.MagicMock(LookupResultProcessor)
@@ -93,11 +98,42 @@ class TestAddFileToDataset(ResourceTestBase):
             "file-id": "42"
         }
 
+    def test_put_new_files_batch(self, mocker):
+        import servicex
+        mock_transform_request_read = mocker.patch.object(
+            servicex.models.TransformRequest,
+            'get_request_cached',
+            return_value=self._generate_transform_request())
+
+        mock_processor = mocker.MagicMock(LookupResultProcessor)
+        mock_processor.add_files_to_dataset.side_effect = set_dataset_file_ids
+
+        client = self._test_client(lookup_result_processor=mock_processor)
+
+        response = client.put('/servicex/internal/transformation/1234/files',
+                              json=[{
+                                  'file_path': '/foo/bar%d.root' % i,
+                                  'adler32': '12345',
+                                  'file_size': 1024,
+                                  'file_events': 500
+                              } for i in range(3)])
+        assert response.status_code == 200
+        mock_transform_request_read.assert_called_once_with('1234')
+        mock_processor.add_file_to_dataset.assert_not_called()
+        mock_processor.add_files_to_dataset.assert_called_once()
+        files = mock_processor.add_files_to_dataset.call_args[0][1]
+        assert [f.file_path for f in files] == \
+            ['/foo/bar0.root', '/foo/bar1.root', '/foo/bar2.root']
+        assert response.json == {
+            "request-id": '1234',
+            "file-ids": [42, 43, 44]
+        }
+
     def test_put_new_file_with_exception(self, mocker):
         import servicex
         mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'get_request_cached',
             return_value=self._generate_transform_request())
 
         mock_processor = mocker.MagicMock(LookupResultProcessor)
@@ -0,0 +1,112 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from datetime import datetime
+
+from servicex.models import FileStatus, db
+from tests.resource_test_base import ResourceTestBase
+
+
+class TestFileTransformationStatus(ResourceTestBase):
+    @staticmethod
+    def _status_update():
+        return {
+            'timestamp': '2020-01-01T12:00:00.000000',
+            'status-code': 'failure',
+            'pod-name': 'transformer-1',
+            'info': 'Segmentation fault'
+        }
+
+    def _populate_db(self, client):
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.save_to_db()
+            db.session.commit()
+
+    def test_post(self):
+        client = self._test_client()
+        self._populate_db(client)
+
+        response = client.post('/servicex/internal/transformation/BR549/42/status',
+                               json=self._status_update())
+        assert response.status_code == 200
+
+        with client.application.app_context():
+            file_status = FileStatus.query.one()
+            assert file_status.file_id == 42
+            assert file_status.request_id == 'BR549'
+            assert file_status.status == 'failure'
+            assert file_status.pod_name == 'transformer-1'
+            assert file_status.info == 'Segmentation fault'
+            assert file_status.timestamp == datetime(2020, 1, 1, 12)
+
+    def test_post_buffered(self, mocker):
+        mock_buffer = mocker.patch('servicex.FileStatusBuffer').return_value
+        client = self._test_client(extra_config={'FILE_STATUS_BUFFER_ENABLED': True})
+        self._populate_db(client)
+
+        response = client.post('/servicex/internal/transformation/BR549/42/status',
+                               json=self._status_update())
+        assert response.status_code == 200
+
+        mock_buffer.start.assert_called_once()
+        mock_buffer.add.assert_called_once()
+        file_status = mock_buffer.add.call_args[0][0]
+        assert file_status.file_id == 42
+        assert file_status.status == 'failure'
+        with client.application.app_context():
+            assert FileStatus.query.count() == 0
+
+    def test_metrics(self, mocker):
+        mock_buffer = mocker.patch('servicex.FileStatusBuffer').return_value
+        mock_buffer.stats.return_value = {'depth': 3}
+        client = self._test_client(extra_config={'FILE_STATUS_BUFFER_ENABLED': True})
+
+        response = client.get('/servicex/internal/metrics')
+        assert response.status_code == 200
+        assert response.json['file-status-buffer'] == {'depth': 3}
+
+    def test_metrics_no_buffer(self, client):
+        response = client.get('/servicex/internal/metrics')
+        assert response.json['file-status-buffer'] is None
+
+    def test_metrics_caches(self, client):
+        from servicex.models import TransformRequest
+        client.get('/servicex')
+        before = client.get('/servicex/internal/metrics').json['request-cache']
+        with client.application.app_context():
+            TransformRequest.get_request_cached('missing')
+            TransformRequest.get_request_cached('missing')
+
+        response = client.get('/servicex/internal/metrics')
+        request_cache = response.json['request-cache']
+        assert request_cache['max-size'] == 1000
+        assert request_cache['misses'] - before['misses'] == 2
+        assert response.json['auth-cache']['max-size'] == 10000
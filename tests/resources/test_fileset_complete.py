@@ -60,3 +60,28 @@ class TestFilesetComplete(ResourceTestBase):
             total_bytes=2046,
             did_lookup_time=42
         )
+
+    def test_put_fileset_complete_publishes_status(self, mocker):
+        import servicex
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        mock_hub.is_watched.return_value = True
+        submitted_request = self._generate_transform_request()
+        submitted_request.files = 17
+        mocker.patch.object(
+            servicex.models.TransformRequest,
+            'return_request',
+            return_value=submitted_request)
+
+        client = self._test_client(lookup_result_processor=mocker.MagicMock(LookupResultProcessor))
+
+        response = client.put('/servicex/internal/transformation/1234/complete',
+                              json={
+                                  'files': 17,
+                                  'files-skipped': 2,
+                                  'total-events': 1024,
+                                  'total-bytes': 2046,
+                                  'elapsed-time': 42
+                              })
+        assert response.status_code == 200
+        mock_hub.publish_status.assert_called_once_with(
+            '1234', submitted_request.progress_json())
@@ -36,7 +36,7 @@ class TestPreflightCheck(ResourceTestBase):
         submitted_request = self._generate_transform_request()
         mock_transform_request_read = mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'get_request_cached',
             return_value=submitted_request)
 
         mock_processor = mocker.MagicMock(LookupResultProcessor)
@@ -64,7 +64,7 @@ class TestPreflightCheck(ResourceTestBase):
 
         mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'get_request_cached',
             return_value=submitted_request)
 
         mock_processor = mocker.MagicMock(LookupResultProcessor)
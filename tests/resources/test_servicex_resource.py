@@ -25,17 +25,22 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
-import pkg_resources
+from tests.resource_test_base import ResourceTestBase
 
 
-class TestServiceXResource:
-    def test_get_app_version_no_servicex_app(self, mocker):
-        mock_get_distribution = mocker.patch(
-            "servicex.resources.servicex_resource.pkg_resources.get_distribution",
-            side_effect=pkg_resources.DistributionNotFound(None, None))
+class TestServiceXResource(ResourceTestBase):
+    def test_get_app_version(self, mocker):
+        mock_resolve = mocker.patch('servicex.resolve_app_version', return_value='1.2.3')
+        client = self._test_client()
 
         from servicex.resources.servicex_resource import ServiceXResource
-        version = ServiceXResource._get_app_version()
+        with client.application.app_context():
+            assert ServiceXResource._get_app_version() == '1.2.3'
+            assert ServiceXResource._get_app_version() == '1.2.3'
 
-        mock_get_distribution.assert_called_with("servicex_app")
-        assert version == 'develop'
+        assert client.application.app_version == '1.2.3'
+        mock_resolve.assert_called_once_with(None)
+
+    def test_get_app_version_override(self):
+        client = self._test_client(extra_config={'APP_VERSION': '9.9.9'})
+        assert client.application.app_version == '9.9.9'
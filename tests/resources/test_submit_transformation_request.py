@@ -26,7 +26,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import json
-from unittest.mock import call
+from datetime import timedelta
 
 from flask import current_app
 
@@ -98,7 +98,7 @@ class TestSubmitTransformationRequest(ResourceTestBase):
     def test_submit_transformation_request_throws_exception(
         self, mocker, mock_rabbit_adaptor
     ):
-        mock_rabbit_adaptor.setup_queue = mocker.Mock(side_effect=Exception('Test'))
+        mock_rabbit_adaptor.setup_request_topology = mocker.Mock(side_effect=Exception('Test'))
         client = self._test_client(rabbit_adaptor=mock_rabbit_adaptor)
 
         response = client.post('/servicex/transformation',
@@ -128,19 +128,7 @@ class TestSubmitTransformationRequest(ResourceTestBase):
             assert saved_obj.app_version == "3.14.15"
             assert saved_obj.code_gen_image == 'sslhep/servicex_code_gen_func_adl_xaod:develop'
 
-        setup_queue_calls = [call(request_id), call(request_id+"_errors")]
-        mock_rabbit_adaptor.setup_queue.assert_has_calls(setup_queue_calls)
-        mock_rabbit_adaptor.setup_exchange.assert_has_calls([
-            call('transformation_requests'),
-            call('transformation_failures')
-        ])
-
-        bind_to_exchange_calls = [
-            call(exchange="transformation_requests", queue=request_id),
-            call(exchange="transformation_failures", queue=request_id+"_errors"),
-        ]
-
-        assert mock_rabbit_adaptor.bind_queue_to_exchange.call_args_list == bind_to_exchange_calls
+        mock_rabbit_adaptor.setup_request_topology.assert_called_once_with(request_id)
 
         service_endpoint = \
             "http://cern.analysis.ch:5000/servicex/internal/transformation/" + \
@@ -213,15 +201,7 @@ class TestSubmitTransformationRequest(ResourceTestBase):
             assert saved_obj.app_version == "3.14.15"
             assert saved_obj.code_gen_image == 'sslhep/servicex_code_gen_func_adl_xaod:develop'
 
-        setup_queue_calls = [call(request_id), call(request_id+"_errors")]
-        mock_rabbit_adaptor.setup_queue.assert_has_calls(setup_queue_calls)
-
-        bind_to_exchange_calls = [
-            call(exchange="transformation_requests", queue=request_id),
-            call(exchange="transformation_failures", queue=request_id+"_errors"),
-        ]
-
-        assert mock_rabbit_adaptor.bind_queue_to_exchange.call_args_list == bind_to_exchange_calls
+        mock_rabbit_adaptor.setup_request_topology.assert_called_once_with(request_id)
 
         service_endpoint = \
             "http://cern.analysis.ch:5000/servicex/internal/transformation/" + \
@@ -252,11 +232,10 @@ class TestSubmitTransformationRequest(ResourceTestBase):
         preflight_call = mock_processor.publish_preflight_request.call_args
         assert preflight_call[0][1] == 'file1'
 
-        mock_processor.add_file_to_dataset.assert_called()
-        add_file_calls = mock_processor.add_file_to_dataset.call_args_list
-        assert mock_processor.add_file_to_dataset.call_count == 2
-        assert add_file_calls[0][0][1].file_path == 'file1'
-        assert add_file_calls[1][0][1].file_path == 'file2'
+        mock_processor.add_file_to_dataset.assert_not_called()
+        mock_processor.add_files_to_dataset.assert_called_once()
+        file_records = mock_processor.add_files_to_dataset.call_args[0][1]
+        assert [f.file_path for f in file_records] == ['file1', 'file2']
 
         mock_processor.report_fileset_complete.assert_called()
         fileset_complete_call = mock_processor.report_fileset_complete.call_args
@@ -340,6 +319,142 @@ class TestSubmitTransformationRequest(ResourceTestBase):
             assert saved_obj.result_destination == 'object-store'
             assert saved_obj.result_format == 'parquet'
 
+    def _result_cache_client(self, mocker, bucket_exists=True, enabled=True):
+        from servicex import ObjectStoreManager
+
+        mock_object_store = mocker.MagicMock(ObjectStoreManager)
+        mock_object_store.bucket_exists.return_value = bucket_exists
+        self.executor = self._deferred_executor(mocker)
+        client = self._test_client(
+            extra_config={'OBJECT_STORE_ENABLED': True,
+                          'TRANSFORM_RESULT_CACHE_ENABLED': enabled},
+            object_store=mock_object_store
+        )
+        return client, mock_object_store
+
+    def _complete_request(self, client, request_id):
+        from servicex.models import db
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(request_id)
+            saved_obj.status = 'Complete'
+            saved_obj.files = 3
+            saved_obj.completed_files = 3
+            saved_obj.processed_events = 3000
+            db.session.commit()
+
+    def test_submit_transformation_result_cache_hit(self, mocker, mock_rabbit_adaptor):
+        client, mock_object_store = self._result_cache_client(mocker)
+        request = self._generate_transformation_request(**{
+            "result-destination": "object-store",
+            "result-format": "parquet"
+        })
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        request_id = response.json['request_id']
+        self._complete_request(client, request_id)
+        mock_object_store.reset_mock()
+        mock_rabbit_adaptor.reset_mock()
+
+        request['title'] = 'Second time around'
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        new_request_id = response.json['request_id']
+        assert new_request_id != request_id
+        mock_object_store.bucket_exists.assert_called_with(request_id)
+        mock_object_store.copy_bucket.assert_not_called()
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(new_request_id)
+            assert saved_obj.status == 'Copying Results'
+            assert saved_obj.cached_from == request_id
+
+        self._run_deferred(self.executor)
+
+        mock_object_store.copy_bucket.assert_called_once_with(request_id, new_request_id)
+        mock_object_store.create_bucket.assert_not_called()
+        mock_rabbit_adaptor.setup_request_topology.assert_not_called()
+        with client.application.app_context():
+            assert TransformRequest.query.count() == 2
+            saved_obj = TransformRequest.return_request(new_request_id)
+            assert saved_obj.status == 'Complete'
+            assert saved_obj.title == 'Second time around'
+            assert saved_obj.cached_from == request_id
+            assert saved_obj.files == 3
+            assert saved_obj.completed_files == 3
+            assert saved_obj.processed_events == 3000
+
+    def test_submit_transformation_result_cache_copy_fails(self, mocker):
+        client, mock_object_store = self._result_cache_client(mocker)
+        mock_object_store.copy_bucket.side_effect = Exception("Connection reset")
+        request = self._generate_transformation_request(**{
+            "result-destination": "object-store",
+            "result-format": "parquet"
+        })
+
+        response = client.post('/servicex/transformation', json=request)
+        request_id = response.json['request_id']
+        self._complete_request(client, request_id)
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        new_request_id = response.json['request_id']
+        self._run_deferred(self.executor)
+
+        mock_object_store.remove_bucket.assert_called_once_with(new_request_id)
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(new_request_id)
+            assert saved_obj.status == 'Fatal'
+            assert saved_obj.failure_description == \
+                "Copying Results failed: Connection reset"
+
+    def test_submit_transformation_result_cache_different_request(self, mocker):
+        client, mock_object_store = self._result_cache_client(mocker)
+        request = self._generate_transformation_request(**{
+            "result-destination": "object-store",
+            "result-format": "parquet"
+        })
+
+        response = client.post('/servicex/transformation', json=request)
+        request_id = response.json['request_id']
+        self._complete_request(client, request_id)
+
+        request['tree-name'] = 'Events'
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        assert response.json['request_id'] != request_id
+
+    def test_submit_transformation_result_cache_bucket_deleted(self, mocker):
+        client, mock_object_store = self._result_cache_client(mocker, bucket_exists=False)
+        request = self._generate_transformation_request(**{
+            "result-destination": "object-store",
+            "result-format": "parquet"
+        })
+
+        response = client.post('/servicex/transformation', json=request)
+        request_id = response.json['request_id']
+        self._complete_request(client, request_id)
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        new_request_id = response.json['request_id']
+        assert new_request_id != request_id
+        mock_object_store.create_bucket.assert_called_with(new_request_id)
+
+    def test_submit_transformation_result_cache_disabled(self, mocker):
+        client, mock_object_store = self._result_cache_client(mocker, enabled=False)
+        request = self._generate_transformation_request(**{
+            "result-destination": "object-store",
+            "result-format": "parquet"
+        })
+
+        response = client.post('/servicex/transformation', json=request)
+        request_id = response.json['request_id']
+        self._complete_request(client, request_id)
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.json['request_id'] != request_id
+        mock_object_store.bucket_exists.assert_not_called()
+
     def test_submit_transformation_auth_enabled(
         self, mock_jwt_extended, mock_requesting_user
     ):
@@ -364,3 +479,94 @@ class TestSubmitTransformationRequest(ResourceTestBase):
             saved_obj = TransformRequest.return_request(request_id)
             assert saved_obj
             assert saved_obj.title == title
+
+    @staticmethod
+    def _deferred_executor(mocker):
+        executor = mocker.Mock()
+        mocker.patch('servicex.ThreadPoolExecutor', return_value=executor)
+        return executor
+
+    @staticmethod
+    def _run_deferred(executor):
+        fn, *args = executor.submit.call_args[0]
+        fn(*args)
+
+    def test_submit_transformation_async(self, mocker, mock_rabbit_adaptor,
+                                         mock_docker_repo_adapter):
+        executor = self._deferred_executor(mocker)
+        client = self._test_client(extra_config={'SUBMISSION_ASYNC_ENABLED': True},
+                                   rabbit_adaptor=mock_rabbit_adaptor,
+                                   docker_repo_adapter=mock_docker_repo_adapter)
+        request = self._generate_transformation_request()
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        request_id = response.json['request_id']
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(request_id)
+            assert saved_obj.status == 'Queued'
+
+        executor.submit.assert_called_once()
+        mock_rabbit_adaptor.setup_request_topology.assert_not_called()
+        mock_rabbit_adaptor.basic_publish.assert_not_called()
+        mock_docker_repo_adapter.check_image_exists.assert_not_called()
+
+        self._run_deferred(executor)
+
+        mock_docker_repo_adapter.check_image_exists.assert_called_once_with(
+            saved_obj.image)
+        mock_rabbit_adaptor.setup_request_topology.assert_called_once_with(request_id)
+        mock_rabbit_adaptor.basic_publish.assert_called_with(
+            exchange='',
+            routing_key='rucio_did_requests',
+            body=json.dumps({
+                "request_id": request_id,
+                "did": "123-45-678",
+                "service-endpoint": "http://cern.analysis.ch:5000/servicex/internal/"
+                                    "transformation/" + request_id}))
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(request_id)
+            assert saved_obj.status == 'Submitted'
+            assert saved_obj.failure_description is None
+
+    def test_abandoned_submissions_failed_at_startup(self, mocker):
+        from servicex import ObjectStoreManager
+        self._deferred_executor(mocker)
+        mock_object_store = mocker.MagicMock(ObjectStoreManager)
+        abandoned = [mocker.Mock(request_id='1234', cached_from=None),
+                     mocker.Mock(request_id='5678', cached_from='1234')]
+        mock_fail = mocker.patch.object(TransformRequest, 'fail_abandoned_setup',
+                                        return_value=abandoned)
+        client = self._test_client(extra_config={'SUBMISSION_ASYNC_ENABLED': True,
+                                                 'SUBMISSION_RECOVERY_AGE': 600,
+                                                 'OBJECT_STORE_ENABLED': True},
+                                   object_store=mock_object_store)
+
+        client.get('/servicex')
+
+        mock_fail.assert_called_once_with(timedelta(seconds=600))
+        mock_object_store.remove_bucket.assert_called_once_with('5678')
+
+    def test_submit_transformation_async_bad_image(self, mocker, mock_rabbit_adaptor,
+                                                   mock_docker_repo_adapter):
+        executor = self._deferred_executor(mocker)
+        mock_docker_repo_adapter.check_image_exists = mocker.Mock(return_value=False)
+        client = self._test_client(extra_config={'SUBMISSION_ASYNC_ENABLED': True},
+                                   rabbit_adaptor=mock_rabbit_adaptor,
+                                   docker_repo_adapter=mock_docker_repo_adapter)
+        request = self._generate_transformation_request(image="ssl-hep/foo:latest")
+
+        response = client.post('/servicex/transformation', json=request)
+        assert response.status_code == 200
+        request_id = response.json['request_id']
+
+        self._run_deferred(executor)
+
+        mock_rabbit_adaptor.setup_request_topology.assert_not_called()
+        mock_rabbit_adaptor.basic_publish.assert_not_called()
+        with client.application.app_context():
+            saved_obj = TransformRequest.return_request(request_id)
+            assert saved_obj.status == 'Fatal'
+            assert saved_obj.failure_description == \
+                "Validating Image failed: Requested transformer docker image " \
+                "doesn't exist: ssl-hep/foo:latest"
@@ -25,6 +25,8 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from datetime import datetime
+
 from tests.resource_test_base import ResourceTestBase
 from servicex.models import DatasetFile, FileStatus
 
@@ -63,7 +65,100 @@ class TestTransformErrors(ResourceTestBase):
         ]}
 
         mock_transform_request_read.assert_called_with("1234")
-        mock_transform_errors.assert_called_with("1234")
+        mock_transform_errors.assert_called_with("1234", after_id=None, limit=None)
+
+    @staticmethod
+    def _file_errors(n):
+        errors = []
+        for i in range(n):
+            status = FileStatus(pod_name='pod%d' % i, info='error %d' % i)
+            status.id = 10 + i
+            errors.append((DatasetFile(file_path='/foo/%d.root' % i, file_events=i),
+                           status))
+        return errors
+
+    def test_get_errors_paged(self, mocker, client):
+        import servicex
+
+        mocker.patch.object(
+            servicex.models.TransformRequest,
+            'return_request',
+            return_value=self._generate_transform_request())
+        mock_transform_errors = mocker.patch.object(
+            servicex.models.FileStatus,
+            'failures_for_request',
+            return_value=self._file_errors(3))
+
+        response = client.get('/servicex/transformation/1234/errors?limit=2&cursor=5')
+        assert response.status_code == 200
+        mock_transform_errors.assert_called_with("1234", after_id=5, limit=3)
+        assert [e['pod-name'] for e in response.json['errors']] == ['pod0', 'pod1']
+        assert response.json['next-cursor'] == 11
+
+    def test_get_errors_last_page(self, mocker, client):
+        import servicex
+
+        mocker.patch.object(
+            servicex.models.TransformRequest,
+            'return_request',
+            return_value=self._generate_transform_request())
+        mocker.patch.object(
+            servicex.models.FileStatus,
+            'failures_for_request',
+            return_value=self._file_errors(2))
+
+        response = client.get('/servicex/transformation/1234/errors?limit=2&cursor=5')
+        assert response.status_code == 200
+        assert len(response.json['errors']) == 2
+        assert response.json['next-cursor'] is None
+
+    def test_get_errors_bad_limit(self, mocker, client):
+        import servicex
+
+        mocker.patch.object(
+            servicex.models.TransformRequest,
+            'return_request',
+            return_value=self._generate_transform_request())
+
+        response = client.get('/servicex/transformation/1234/errors?limit=0')
+        assert response.status_code == 400
+
+    def test_get_errors_from_db(self, client):
+        from servicex.models import db
+
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.save_to_db()
+            files = [DatasetFile(request_id='BR549', file_path='/foo/%d.root' % i,
+                                 adler32='xxx', file_size=0, file_events=i)
+                     for i in range(3)]
+            for f in files:
+                f.save_to_db()
+            for f in files:
+                FileStatus(file_id=f.id, request_id='BR549', status='failure',
+                           timestamp=datetime.utcnow(), pod_name='pod',
+                           info='failed ' + f.file_path).save_to_db()
+            FileStatus(file_id=files[0].id, request_id='BR549', status='success',
+                       timestamp=datetime.utcnow(), pod_name='pod').save_to_db()
+            db.session.commit()
+
+        response = client.get('/servicex/transformation/BR549/errors')
+        assert response.status_code == 200
+        assert [e['file'] for e in response.json['errors']] == \
+            ['/foo/0.root', '/foo/1.root', '/foo/2.root']
+        assert [e['info'] for e in response.json['errors']] == \
+            ['failed /foo/0.root', 'failed /foo/1.root', 'failed /foo/2.root']
+
+        response = client.get('/servicex/transformation/BR549/errors?limit=2')
+        assert len(response.json['errors']) == 2
+        cursor = response.json['next-cursor']
+        response = client.get(f'/servicex/transformation/BR549/errors?limit=2&cursor={cursor}')
+        assert [e['file'] for e in response.json['errors']] == ['/foo/2.root']
+        assert response.json['next-cursor'] is None
 
     def test_get_errors_404(self, mocker, client):
         import servicex
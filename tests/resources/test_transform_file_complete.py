@@ -52,8 +52,8 @@ class TestTransformFileComplete(ResourceTestBase):
             'return_request',
             return_value=self._generate_transform_request())
 
-        mock_files_remaining = mocker.PropertyMock(return_value=1)
-        TransformRequest.files_remaining = mock_files_remaining
+        mocker.patch.object(TransformRequest, "files_remaining",
+                            new_callable=mocker.PropertyMock, return_value=1)
 
         mocker.patch.object(DatasetFile, "get_by_id")
         mocker.patch.object(TransformationResult, "save_to_db")
@@ -75,8 +75,8 @@ class TestTransformFileComplete(ResourceTestBase):
             'return_request',
             return_value=self._generate_transform_request())
 
-        mock_files_remaining = mocker.PropertyMock(return_value=0)
-        TransformRequest.files_remaining = mock_files_remaining
+        mocker.patch.object(TransformRequest, "files_remaining",
+                            new_callable=mocker.PropertyMock, return_value=0)
 
         mocker.patch.object(DatasetFile, "get_by_id")
         mocker.patch.object(TransformationResult, "save_to_db")
@@ -89,7 +89,8 @@ class TestTransformFileComplete(ResourceTestBase):
         assert response.status_code == 200
         mock_transform_request_read.assert_called_with('1234')
         mock_transformer_manager.shutdown_transformer_job.assert_called_with('1234',
-                                                                             'my-ws')
+                                                                             'my-ws',
+                                                                             None)
 
     def test_put_transform_file_complete_unknown_request_id(self, mocker):
         import servicex
@@ -128,18 +129,20 @@ class TestTransformFileComplete(ResourceTestBase):
             'return_request',
             return_value=self._generate_transform_request())
 
-        mock_files_remaining = mocker.PropertyMock(return_value=1)
-        TransformRequest.files_remaining = mock_files_remaining
+        mocker.patch.object(TransformRequest, "files_remaining",
+                            new_callable=mocker.PropertyMock, return_value=1)
 
         mocker.patch.object(DatasetFile, "get_by_id",
                             return_value=self._generate_dataset_file())
         mocker.patch.object(TransformationResult, "save_to_db")
+        mock_record = mocker.patch.object(TransformRequest, "record_file_result")
 
         client = self._test_client(transformation_manager=mock_transformer_manager)
         response = client.put('/servicex/internal/transformation/1234/file-complete',
                               json=self._generate_file_complete_request())
 
         assert response.status_code == 200
+        mock_record.assert_called_once_with('OK', total_bytes=325683, total_events=10000)
 
     def test_file_transform_complete_no_files_remain(self, mocker,
                                                      mock_rabbit_adaptor):
@@ -158,8 +161,8 @@ class TestTransformFileComplete(ResourceTestBase):
             'return_request',
             return_value=self._generate_transform_request())
 
-        mock_files_remaining = mocker.PropertyMock(return_value=0)
-        TransformRequest.files_remaining = mock_files_remaining
+        mocker.patch.object(TransformRequest, "files_remaining",
+                            new_callable=mocker.PropertyMock, return_value=0)
 
         client = self._test_client(transformation_manager=mock_transformer_manager,
                                    rabbit_adaptor=mock_rabbit_adaptor)
@@ -167,3 +170,153 @@ class TestTransformFileComplete(ResourceTestBase):
                               json=self._generate_file_complete_request())
 
         assert response.status_code == 200
+
+    def test_put_transform_file_complete_publishes_events(self, mocker):
+        import servicex
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        mock_hub.is_watched.return_value = True
+        mock_transformer_manager = mocker.MagicMock(TransformerManager)
+        mocker.patch.object(
+            servicex.models.TransformRequest,
+            'return_request',
+            return_value=self._generate_transform_request())
+        mocker.patch.object(TransformRequest, "files_remaining",
+                            new_callable=mocker.PropertyMock, return_value=1)
+        mocker.patch.object(TransformRequest, "record_file_result")
+        mocker.patch.object(DatasetFile, "get_by_id", return_value=mocker.Mock(id=42))
+        mocker.patch.object(TransformationResult, "save_to_db")
+
+        client = self._test_client(transformation_manager=mock_transformer_manager)
+        response = client.put('/servicex/internal/transformation/1234/file-complete',
+                              json=self._generate_file_complete_request())
+
+        assert response.status_code == 200
+        mock_hub.is_watched.assert_called_with('1234')
+        mock_hub.publish.assert_called_once_with('1234', 'file-complete', {
+            'file-id': 42,
+            'file-path': '/foo/bar.root',
+            'status': 'OK',
+            'total-events': 10000,
+            'total-bytes': 325683
+        })
+        mock_hub.publish_status.assert_called_once()
+        assert mock_hub.publish_status.call_args[0][1]['files-remaining'] == 1
+
+
+class TestTransformFileCompleteBatch(ResourceTestBase):
+    @staticmethod
+    def _file_complete_record(file_id, status='success'):
+        return {
+            'file-path': f'/foo/bar{file_id}.root',
+            'file-id': file_id,
+            'status': status,
+            'total-time': 100,
+            'num-messages': 1024,
+            'total-events': 10000,
+            'total-bytes': 325683,
+            'avg-rate': 30.2
+        }
+
+    def _populate_db(self, client, files):
+        from datetime import datetime
+        from servicex.models import db
+
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.generated_code_cm = 'generated-code-abc'
+            request.files = files
+            request.save_to_db()
+            dataset_files = [DatasetFile(request_id=request.request_id,
+                                         file_path=f'/foo/bar{i}.root',
+                                         adler32='xxx', file_events=0, file_size=0)
+                             for i in range(files)]
+            DatasetFile.bulk_save_to_db(dataset_files)
+            db.session.commit()
+            return [f.id for f in dataset_files]
+
+    def test_put_batch(self, mocker, count_queries):
+        mock_transformer_manager = mocker.MagicMock(TransformerManager)
+        client = self._test_client(transformation_manager=mock_transformer_manager)
+        file_ids = self._populate_db(client, files=3)
+
+        records = [self._file_complete_record(file_ids[0]),
+                   self._file_complete_record(file_ids[1], status='failure')]
+        with count_queries(client.application) as queries:
+            response = client.put(
+                '/servicex/internal/transformation/BR549/file-complete-batch',
+                json=records)
+        assert response.status_code == 200
+        mock_transformer_manager.shutdown_transformer_job.assert_not_called()
+        assert len([q for q in queries if q.startswith('INSERT')]) == 1
+
+        with client.application.app_context():
+            request = TransformRequest.return_request('BR549')
+            assert request.files_processed == 1
+            assert request.files_failed == 1
+            assert request.processed_bytes == 2 * 325683
+            assert request.processed_events == 2 * 10000
+            assert request.status == 'Submitted'
+            results = TransformationResult.query.filter_by(request_id='BR549').all()
+            assert sorted(r.file_id for r in results) == file_ids[:2]
+
+        response = client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                              json=[self._file_complete_record(file_ids[2])])
+        assert response.status_code == 200
+        mock_transformer_manager.shutdown_transformer_job.assert_called_once_with(
+            'BR549', 'my-ws', 'generated-code-abc')
+        with client.application.app_context():
+            assert TransformRequest.return_request('BR549').status == 'Complete'
+
+    def test_put_batch_queries_independent_of_size(self, mocker, count_queries):
+        mock_transformer_manager = mocker.MagicMock(TransformerManager)
+        client = self._test_client(transformation_manager=mock_transformer_manager)
+        file_ids = self._populate_db(client, files=50)
+
+        with count_queries(client.application) as small:
+            client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                       json=[self._file_complete_record(file_ids[0])])
+        with count_queries(client.application) as large:
+            client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                       json=[self._file_complete_record(i) for i in file_ids[1:-1]])
+        assert len(large) == len(small)
+
+    def test_put_batch_publishes_events(self, mocker):
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        mock_hub.is_watched.return_value = True
+        mock_transformer_manager = mocker.MagicMock(TransformerManager)
+        client = self._test_client(transformation_manager=mock_transformer_manager)
+        file_ids = self._populate_db(client, files=3)
+
+        response = client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                              json=[self._file_complete_record(i) for i in file_ids[:2]])
+        assert response.status_code == 200
+        assert mock_hub.publish.call_count == 2
+        mock_hub.publish_status.assert_called_once()
+        assert mock_hub.publish_status.call_args[0][1]['files-remaining'] == 1
+
+    def test_put_batch_unknown_request_id(self, mocker):
+        client = self._test_client()
+        client.get('/servicex')
+        response = client.put('/servicex/internal/transformation/1234/file-complete-batch',
+                              json=[self._file_complete_record(1)])
+        assert response.status_code == 404
+
+    def test_put_batch_malformed(self, mocker):
+        client = self._test_client()
+        self._populate_db(client, files=3)
+
+        response = client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                              json={'file-id': 1})
+        assert response.status_code == 400
+
+        response = client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                              json=[])
+        assert response.status_code == 400
+
+        response = client.put('/servicex/internal/transformation/BR549/file-complete-batch',
+                              json=[{'file-id': 1}])
+        assert response.status_code == 400
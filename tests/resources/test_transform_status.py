@@ -25,6 +25,9 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+from datetime import datetime
+
 from tests.resource_test_base import ResourceTestBase
 
 
@@ -67,6 +70,31 @@ class TestTransformStatus(ResourceTestBase):
         assert response.status_code == 200
         mock_request.save_to_db.assert_called()
 
+    def test_post_status_fatal_publishes_status(self, mocker):
+        from servicex.models import TransformRequest
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        mock_hub.is_watched.return_value = True
+        mock_request = self._generate_transform_request()
+        mock_request.save_to_db = mocker.Mock()
+        mocker.patch.object(
+            TransformRequest,
+            'return_request',
+            return_value=mock_request)
+
+        client = self._test_client()
+        response = client.post('/servicex/internal/transformation/1234/status',
+                               json={
+                                   'timestamp': '2019-09-18T16:15:09.457481',
+                                   'severity': "fatal",
+                                   'info': 'Just testing'
+                               })
+
+        assert response.status_code == 200
+        mock_hub.publish_status.assert_called_once()
+        request_id, status = mock_hub.publish_status.call_args[0]
+        assert request_id == '1234'
+        assert status['status'] == 'Fatal'
+
     def test_post_status_bad_data(self, client):
         response = client.post('/servicex/internal/transformation/1234/status',
                                json={'foo': 'bar'})
@@ -75,24 +103,29 @@ class TestTransformStatus(ResourceTestBase):
     def test_get_status(self, mocker, client):
         import servicex
 
-        mock_files_processed = mocker.PropertyMock(return_value=15)
-        servicex.models.TransformRequest.files_processed = mock_files_processed
-        mock_files_remaining = mocker.PropertyMock(return_value=12)
-        servicex.models.TransformRequest.files_remaining = mock_files_remaining
-        mock_files_failed = mocker.PropertyMock(return_value=2)
-        servicex.models.TransformRequest.files_failed = mock_files_failed
-        mock_statistics = mocker.PropertyMock(return_value={
-            "total-messages": 123,
-            "min-time": 1,
-            "max-time": 30,
-            "avg-time": 15.55,
-            "total-time": 1024
-        })
-        servicex.models.TransformRequest.statistics = mock_statistics
+        TransformRequest = servicex.models.TransformRequest
+        mock_files_processed = mocker.patch.object(
+            TransformRequest, 'files_processed',
+            new_callable=mocker.PropertyMock, return_value=15)
+        mock_files_remaining = mocker.patch.object(
+            TransformRequest, 'files_remaining',
+            new_callable=mocker.PropertyMock, return_value=12)
+        mock_files_failed = mocker.patch.object(
+            TransformRequest, 'files_failed',
+            new_callable=mocker.PropertyMock, return_value=2)
+        mocker.patch.object(
+            TransformRequest, 'statistics',
+            new_callable=mocker.PropertyMock, return_value={
+                "total-messages": 123,
+                "min-time": 1,
+                "max-time": 30,
+                "avg-time": 15.55,
+                "total-time": 1024
+            })
 
         mock_transform_request_read = mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'return_request_with_statistics',
             return_value=self._generate_transform_request())
 
         response = client.get('/servicex/transformation/1234/status')
@@ -117,9 +150,155 @@ class TestTransformStatus(ResourceTestBase):
 
         mock_transform_request_read = mocker.patch.object(
             servicex.models.TransformRequest,
-            'return_request',
+            'return_request_with_statistics',
             return_value=None)
 
         response = client.get('/servicex/transformation/1234/status')
         assert response.status_code == 404
         mock_transform_request_read.assert_called_with("1234")
+
+    def _populate_db(self, client):
+        from servicex.models import TransformationResult, db
+
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.files = 5
+            request.save_to_db()
+            for status, time in [("success", 10), ("failure", 20)]:
+                TransformationResult(
+                    did=request.did, file_id=1, request_id=request.request_id,
+                    file_path="/foo/bar.root", transform_status=status,
+                    transform_time=time, total_events=100, total_bytes=1000,
+                    avg_rate=10.0, messages=3
+                ).save_to_db()
+                request.record_file_result(status, total_bytes=1000, total_events=100)
+            db.session.commit()
+
+    def test_get_status_queries(self, client, count_queries):
+        self._populate_db(client)
+
+        with count_queries(client.application) as queries:
+            response = client.get('/servicex/transformation/BR549/status')
+
+        assert response.status_code == 200
+        assert len(queries) == 1
+        assert response.json == {
+            "status": "Submitted",
+            "request-id": "BR549",
+            "files-processed": 1,
+            "files-skipped": 1,
+            "files-remaining": 3,
+            "stats": {
+                "total-messages": 6,
+                "min-time": 10,
+                "max-time": 20,
+                "avg-time": 15.0,
+                "total-time": 30,
+                "avg-rate": 10.0,
+                "total-bytes": 2000,
+                "total-events": 200
+            }
+        }
+
+    def test_get_status_details(self, client):
+        self._populate_db(client)
+
+        response = client.get('/servicex/transformation/BR549/status?details=true')
+        assert response.status_code == 200
+        assert response.json['status'] == 'Submitted'
+        assert response.json['files-remaining'] == 3
+        assert [d['transform_status'] for d in response.json['details']] == \
+            ['success', 'failure']
+        assert 'next-cursor' not in response.json
+
+    def test_get_status_details_paged(self, client):
+        self._populate_db(client)
+
+        response = client.get('/servicex/transformation/BR549/status?details=true&limit=1')
+        assert response.status_code == 200
+        assert [d['transform_status'] for d in response.json['details']] == ['success']
+        cursor = response.json['next-cursor']
+        assert cursor == response.json['details'][0]['id']
+
+        response = client.get(
+            f'/servicex/transformation/BR549/status?details=true&limit=1&cursor={cursor}')
+        assert [d['transform_status'] for d in response.json['details']] == ['failure']
+        assert response.json['next-cursor'] is None
+
+    def test_get_status_details_ndjson(self, client):
+        self._populate_db(client)
+
+        response = client.get('/servicex/transformation/BR549/status'
+                              '?details=true&format=ndjson')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.data.decode().splitlines()
+        assert [json.loads(line)['transform_status'] for line in lines] == \
+            ['success', 'failure']
+
+    def test_get_status_details_bad_limit(self, client):
+        self._populate_db(client)
+        response = client.get('/servicex/transformation/BR549/status?details=true&limit=-1')
+        assert response.status_code == 400
+
+    def test_get_batch_status(self, client, count_queries):
+        self._populate_db(client)
+
+        with count_queries(client.application) as queries:
+            response = client.get('/servicex/transformation/status'
+                                  '?request-id=BR549&request-id=unknown')
+
+        assert response.status_code == 200
+        assert len(queries) == 1
+        assert response.json == {
+            "requests": {
+                "BR549": {
+                    "status": "Submitted",
+                    "request-id": "BR549",
+                    "files-processed": 1,
+                    "files-skipped": 1,
+                    "files-remaining": 3
+                }
+            }
+        }
+
+    def test_get_batch_status_deployment(self, mocker, client):
+        self._populate_db(client)
+        mock_transform_start = mocker.patch(
+            'servicex.resources.transform_status.TransformStart')
+        mock_manager = mock_transform_start.transformer_manager
+        mock_manager.get_deployment_statuses.return_value = {
+            'BR549': mocker.Mock(replicas=3)
+        }
+
+        response = client.get('/servicex/transformation/status'
+                              '?request-id=BR549&deployment=true')
+
+        assert response.status_code == 200
+        assert response.json['requests']['BR549']['replicas'] == 3
+        assert list(mock_manager.get_deployment_statuses.call_args[0][0]) == ['BR549']
+
+    def test_get_batch_status_no_deployment(self, mocker, client):
+        self._populate_db(client)
+        mock_transform_start = mocker.patch(
+            'servicex.resources.transform_status.TransformStart')
+        mock_transform_start.transformer_manager.get_deployment_statuses.return_value = {}
+
+        response = client.get('/servicex/transformation/status'
+                              '?request-id=BR549&deployment=true')
+
+        assert response.status_code == 200
+        assert response.json['requests']['BR549']['replicas'] is None
+
+    def test_get_batch_status_too_many(self, client):
+        query = '&'.join(f'request-id={i}' for i in range(101))
+        response = client.get(f'/servicex/transformation/status?{query}')
+        assert response.status_code == 400
+
+    def test_get_batch_status_missing_ids(self, client):
+        response = client.get('/servicex/transformation/status')
+        assert response.status_code == 400
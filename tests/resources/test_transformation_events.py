@@ -0,0 +1,133 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+
+from servicex.models import TransformRequest
+from servicex.request_event_hub import Subscription
+from servicex.resources.transformation_events import TransformationEvents
+from tests.resource_test_base import ResourceTestBase
+
+
+class TestTransformationEvents(ResourceTestBase):
+    @staticmethod
+    def _parse_events(data):
+        events = []
+        for block in data.decode().split("\n\n"):
+            lines = dict(line.split(": ", 1) for line in block.splitlines()
+                         if not line.startswith(":"))
+            if lines:
+                events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    def _client_with_hub(self, mocker, extra_config=None):
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        subscription = Subscription('1234', max_events=10)
+        mock_hub.subscribe.return_value = subscription
+        client = self._test_client(extra_config=extra_config)
+        return client, mock_hub, subscription
+
+    def test_get_events(self, mocker):
+        client, mock_hub, subscription = self._client_with_hub(mocker)
+        request = self._generate_transform_request()
+        request.status = 'Running'
+        mocker.patch.object(TransformRequest, 'return_request', return_value=request)
+        subscription.put(('file-complete', {'file-id': 42}))
+        subscription.put(('status', {'status': 'Complete'}))
+
+        response = client.get('/servicex/transformation/1234/events')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        events = self._parse_events(response.data)
+        assert [name for name, data in events] == ['status', 'file-complete', 'status']
+        assert events[0][1]['status'] == 'Running'
+        assert events[2][1] == {'status': 'Complete'}
+        mock_hub.subscribe.assert_called_once_with('1234', events[0][1])
+        mock_hub.unsubscribe.assert_called_with(subscription)
+
+    def test_get_events_already_complete(self, mocker):
+        client, mock_hub, subscription = self._client_with_hub(mocker)
+        request = self._generate_transform_request()
+        request.status = 'Complete'
+        mocker.patch.object(TransformRequest, 'return_request', return_value=request)
+
+        response = client.get('/servicex/transformation/1234/events')
+
+        events = self._parse_events(response.data)
+        assert [name for name, data in events] == ['status']
+        mock_hub.unsubscribe.assert_called_with(subscription)
+
+    def test_get_events_timeout(self, mocker):
+        client, mock_hub, subscription = self._client_with_hub(mocker, extra_config={
+            'EVENTS_KEEPALIVE_INTERVAL': 0.01,
+            'EVENTS_STREAM_TIMEOUT': 0.05
+        })
+        request = self._generate_transform_request()
+        request.status = 'Running'
+        mocker.patch.object(TransformRequest, 'return_request', return_value=request)
+
+        response = client.get('/servicex/transformation/1234/events')
+
+        assert b': keep-alive' in response.data
+        assert [name for name, data in self._parse_events(response.data)] == ['status']
+        mock_hub.unsubscribe.assert_called_with(subscription)
+
+    def test_get_events_too_many_streams(self, mocker):
+        client, mock_hub, subscription = self._client_with_hub(mocker, extra_config={
+            'EVENTS_POLL_INTERVAL': 7
+        })
+        mock_hub.subscribe.return_value = None
+        request = self._generate_transform_request()
+        request.status = 'Running'
+        mocker.patch.object(TransformRequest, 'return_request', return_value=request)
+
+        response = client.get('/servicex/transformation/1234/events')
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '7'
+        mock_hub.unsubscribe.assert_not_called()
+
+    def test_head_events_releases_subscription(self, mocker):
+        client = self._test_client(extra_config={'EVENTS_MAX_STREAMS': 2})
+        request = self._generate_transform_request()
+        request.status = 'Running'
+        mocker.patch.object(TransformRequest, 'return_request', return_value=request)
+
+        for _ in range(3):
+            response = client.head('/servicex/transformation/1234/events')
+            assert response.status_code == 200
+            response.close()
+
+        assert TransformationEvents.event_hub._subscription_count == 0
+
+    def test_get_events_404(self, mocker):
+        client, mock_hub, subscription = self._client_with_hub(mocker)
+        mocker.patch.object(TransformRequest, 'return_request', return_value=None)
+        response = client.get('/servicex/transformation/1234/events')
+        assert response.status_code == 404
+        mock_hub.subscribe.assert_not_called()
@@ -25,7 +25,9 @@ class TestTransformationRequest(ResourceTestBase):
                                  'status': "Submitted",
                                  'failure-info': None,
                                  'app-version': "1.0.1",
-                                 'code-gen-image': 'sslhep/servicex_code_gen_func_adl_xaod:develop'
+                                 'code-gen-image':
+                                     'sslhep/servicex_code_gen_func_adl_xaod:develop',
+                                 'cached-from': None
                                  }
         mock_transform_request_read.assert_called_with('1234')
 
@@ -67,7 +69,9 @@ class TestTransformationRequest(ResourceTestBase):
                                  'status': "Submitted",
                                  'failure-info': None,
                                  'app-version': "1.0.1",
-                                 'code-gen-image': 'sslhep/servicex_code_gen_func_adl_xaod:develop'
+                                 'code-gen-image':
+                                     'sslhep/servicex_code_gen_func_adl_xaod:develop',
+                                 'cached-from': None
                                  }
 
         mock_transform_request_read.assert_called_with('1234')
@@ -104,7 +108,9 @@ class TestTransformationRequest(ResourceTestBase):
                                  'status': "Submitted",
                                  'failure-info': None,
                                  'app-version': "1.0.1",
-                                 'code-gen-image': 'sslhep/servicex_code_gen_func_adl_xaod:develop'
+                                 'code-gen-image':
+                                     'sslhep/servicex_code_gen_func_adl_xaod:develop',
+                                 'cached-from': None
                                  }
 
         mock_transform_request_read.assert_called_with('1234')
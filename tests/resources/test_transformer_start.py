@@ -75,7 +75,8 @@ class TestTransformationStart(ResourceTestBase):
                                 result_destination='kafka',
                                 result_format='arrow',
                                 x509_secret='my-x509-secret',
-                                kafka_broker='http://ssl-hep.org.kafka:12345')
+                                kafka_broker='http://ssl-hep.org.kafka:12345',
+                                ensure_generated_code=None)
 
         mock_kafka_constructor.assert_called_with('http://ssl-hep.org.kafka:12345')
 
@@ -84,6 +85,52 @@ class TestTransformationStart(ResourceTestBase):
                                                                  num_partitions=100)
         mock_request.save_to_db.assert_called()
 
+    def test_transform_start_recreates_deleted_configmap(self, mocker):
+        import servicex
+        from servicex.code_gen_adapter import CodeGenAdapter
+        from servicex.transformer_manager import TransformerManager
+        mock_transformer_manager = mocker.MagicMock(TransformerManager)
+        mock_response = mocker.Mock(status_code=200, content=b"zipped")
+        mocker.patch('requests.post', return_value=mock_response)
+        mock_zip = mocker.patch("zipfile.ZipFile")
+        mocker.patch("io.BytesIO")
+        code_gen = CodeGenAdapter("http://foo.com", mock_transformer_manager)
+
+        # This request finds the ConfigMap made for an identical selection...
+        mock_transformer_manager.configmap_exists.return_value = True
+        mock_request = self._generate_transform_request()
+        mock_request.selection = "(call ResultTTree ...)"
+        mock_request.result_destination = 'object-store'
+        mock_request.save_to_db = mocker.Mock()
+        configmap = code_gen.generate_code_for_selection(mock_request, "my-ws")
+        mock_request.generated_code_cm = configmap
+        mock_transformer_manager.create_configmap_from_zip.assert_not_called()
+
+        # ...which the other request deletes as it finishes, before this one starts
+        mock_transformer_manager.configmap_exists.return_value = False
+        mock_transformer_manager.create_configmap_from_zip.return_value = configmap
+        mocker.patch.object(servicex.models.TransformRequest, 'return_request',
+                            return_value=mock_request)
+
+        client = self._test_client(
+            extra_config={'TRANSFORMER_MANAGER_ENABLED': True,
+                          'TRANSFORMER_X509_SECRET': 'my-x509-secret'},
+            transformation_manager=mock_transformer_manager,
+            code_gen_service=code_gen
+        )
+        response = client.post('/servicex/internal/transformation/1234/start')
+
+        assert response.status_code == 200
+        launch = mock_transformer_manager.launch_transformer_jobs.call_args
+        assert launch[1]['generated_code_cm'] == configmap
+
+        # The check is handed to the transformer manager rather than made here
+        mock_transformer_manager.create_configmap_from_zip.assert_not_called()
+        with client.application.app_context():
+            launch[1]['ensure_generated_code']()
+        mock_transformer_manager.create_configmap_from_zip.assert_called_once_with(
+            mock_zip(), configmap, "my-ws")
+
     def test_transform_start_no_kubernetes(self, mocker, mock_rabbit_adaptor):
         import servicex
         from servicex.transformer_manager import TransformerManager
@@ -39,3 +39,43 @@ class TestWebAppInit(ResourceTestBase):
 
         with pytest.raises(ValueError):
             self._test_client(extra_config=bad_config)
+
+    def test_docker_image_refresher(self, mocker):
+        from servicex import create_app
+        mock_adapter_cls = mocker.patch('servicex.DockerRepoAdapter')
+        config = self._app_config()
+        config.update({
+            'TRANSFORMER_MANAGER_ENABLED': False,
+            'DID_FINDER_DEFAULT_SCHEME': 'rucio',
+            'VALID_DID_SCHEMES': ['rucio'],
+            'DOCKER_REGISTRY_TIMEOUT': 5,
+            'DOCKER_IMAGE_CACHE_TTL': 600,
+            'DOCKER_IMAGE_NEGATIVE_CACHE_TTL': 30,
+            'DOCKER_IMAGE_REFRESH_INTERVAL': 300
+        })
+
+        create_app(config, provided_rabbit_adaptor=mocker.MagicMock())
+
+        mock_adapter_cls.assert_called_once_with(timeout=5, positive_ttl=600, negative_ttl=30)
+        mock_adapter_cls.return_value.start_refresher.assert_called_once_with(
+            [config['TRANSFORMER_DEFAULT_IMAGE']], 300)
+
+    def test_callback_consumer(self, mocker):
+        from servicex import create_app
+        mock_consumer_cls = mocker.patch('servicex.CallbackConsumer')
+        mock_hub = mocker.patch('servicex.RequestEventHub').return_value
+        config = self._app_config()
+        config.update({
+            'DID_FINDER_DEFAULT_SCHEME': 'rucio',
+            'VALID_DID_SCHEMES': ['rucio'],
+            'CALLBACK_QUEUE_ENABLED': True,
+            'CALLBACK_QUEUE': 'callbacks',
+            'CALLBACK_BATCH_SIZE': 50
+        })
+
+        app = create_app(config, provided_rabbit_adaptor=mocker.MagicMock())
+
+        mock_consumer_cls.assert_called_once_with(app, 'amqp://foo.com', queue_name='callbacks',
+                                                  batch_size=50, flush_interval=0.5,
+                                                  event_hub=mock_hub)
+        mock_consumer_cls.return_value.start.assert_called_once()
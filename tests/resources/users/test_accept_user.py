@@ -13,3 +13,9 @@ class TestAcceptUser(WebTestBase):
         mocker.patch('servicex.models.UserModel.find_by_email', return_value=None)
         response = client.post('/accept', json={"email": 'janedoe@example.com'})
         assert response.status_code == 404
+
+    def test_accept_user_invalidates_auth_cache(self, user, client, mocker):
+        from servicex.models import UserModel
+        invalidate = mocker.patch.object(UserModel, 'invalidate_auth')
+        client.post('/accept', json={"email": user.email})
+        invalidate.assert_called_once_with(user.sub)
@@ -0,0 +1,272 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from servicex import LookupResultProcessor, TransformerManager
+from servicex.callback_consumer import CallbackConsumer
+from servicex.models import DatasetFile, FileStatus, TransformRequest, db
+from tests.resource_test_base import ResourceTestBase
+
+
+class TestCallbackConsumer(ResourceTestBase):
+    @staticmethod
+    def _file_complete(file_id):
+        return {
+            'file-path': f'/foo/bar{file_id}.root',
+            'file-id': file_id,
+            'status': 'success',
+            'total-time': 100,
+            'num-messages': 1024,
+            'total-events': 10000,
+            'total-bytes': 325683,
+            'avg-rate': 30.2
+        }
+
+    @staticmethod
+    def _add_file(name):
+        return {'file_path': name, 'adler32': 'xxx', 'file_events': 0, 'file_size': 0}
+
+    @staticmethod
+    def _message(message_type, body, request_id='BR549', **kwargs):
+        message = {'type': message_type, 'request-id': request_id, 'body': body}
+        message.update(kwargs)
+        return message
+
+    def _consumer(self, mocker, event_hub=None):
+        self.transformer_manager = mocker.MagicMock(TransformerManager)
+        self.rabbit_adaptor = mocker.MagicMock()
+        client = self._test_client(
+            transformation_manager=self.transformer_manager,
+            lookup_result_processor=LookupResultProcessor(self.rabbit_adaptor,
+                                                          'http://cern.analysis.ch:5000/'))
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.files = None
+            request.save_to_db()
+            db.session.commit()
+        return CallbackConsumer(client.application, 'amqp://foo.com', batch_size=10,
+                                retry_interval=0, event_hub=event_hub)
+
+    def test_apply_batch(self, mocker):
+        consumer = self._consumer(mocker)
+        app = consumer._app
+
+        with app.app_context():
+            changed = consumer.apply_batch([
+                self._message('files', [self._add_file('a.root'), self._add_file('b.root')]),
+                self._message('fileset-complete', {
+                    'files': 2, 'files-skipped': 0, 'total-events': 20000,
+                    'total-bytes': 651366, 'elapsed-time': 3
+                })
+            ])
+            db.session.commit()
+            assert changed == {'BR549'}
+            file_ids = [f.id for f in DatasetFile.query.filter_by(request_id='BR549')]
+            assert len(file_ids) == 2
+            self.rabbit_adaptor.publish_many.assert_called_once()
+
+        with app.app_context():
+            changed = consumer.apply_batch([
+                self._message('file-status', {
+                    'timestamp': '2020-01-01T12:00:00.000000', 'status-code': 'start',
+                    'pod-name': 'transformer-1', 'info': 'started'
+                }, **{'file-id': file_ids[0]}),
+                self._message('file-complete', self._file_complete(file_ids[0])),
+                self._message('file-complete', self._file_complete(file_ids[1])),
+                self._message('status', {'severity': 'info', 'info': 'hello'})
+            ])
+            db.session.commit()
+            assert changed == {'BR549'}
+
+            request = TransformRequest.return_request('BR549')
+            assert request.files_processed == 2
+            assert request.status == 'Complete'
+            assert FileStatus.query.filter_by(request_id='BR549').count() == 1
+        self.transformer_manager.shutdown_transformer_job.assert_called_once_with(
+            'BR549', 'my-ws', None)
+
+    def test_apply_batch_fatal_status(self, mocker):
+        consumer = self._consumer(mocker)
+
+        with consumer._app.app_context():
+            changed = consumer.apply_batch([
+                self._message('status', {'severity': 'fatal', 'info': 'Oops',
+                                         'source': 'DID Finder'})
+            ])
+            db.session.commit()
+            assert changed == {'BR549'}
+            request = TransformRequest.return_request('BR549')
+            assert request.status == 'Fatal'
+            assert request.failure_description == 'Oops'
+
+    def test_apply_batch_unknown_type(self, mocker):
+        consumer = self._consumer(mocker)
+
+        with consumer._app.app_context():
+            with pytest.raises(ValueError):
+                consumer.apply_batch([self._message('cuckoo', {})])
+
+    def test_flush_acks_batch(self, mocker):
+        mock_hub = mocker.Mock()
+        mock_hub.is_watched.return_value = True
+        consumer = self._consumer(mocker, event_hub=mock_hub)
+        channel = mocker.Mock()
+        deliveries = [
+            (1, json.dumps(self._message('status', {'severity': 'info'}))),
+            (2, json.dumps(self._message('status', {'severity': 'fatal', 'info': 'Oops'})))
+        ]
+
+        consumer.flush(channel, deliveries)
+
+        channel.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+        channel.basic_nack.assert_not_called()
+        mock_hub.publish_status.assert_called_once()
+        assert mock_hub.publish_status.call_args[0][1]['status'] == 'Fatal'
+
+    def test_flush_drops_bad_message(self, mocker):
+        consumer = self._consumer(mocker)
+        channel = mocker.Mock()
+        deliveries = [
+            (1, json.dumps(self._message('status', {'severity': 'fatal', 'info': 'Oops'}))),
+            (2, b'not json'),
+            (3, json.dumps(self._message('cuckoo', {})))
+        ]
+
+        consumer.flush(channel, deliveries)
+
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        assert channel.basic_nack.call_args_list == [
+            mocker.call(delivery_tag=2, requeue=False),
+            mocker.call(delivery_tag=3, requeue=False)
+        ]
+        with consumer._app.app_context():
+            assert TransformRequest.return_request('BR549').status == 'Fatal'
+
+    def test_flush_publishes_only_committed_files(self, mocker):
+        consumer = self._consumer(mocker)
+        channel = mocker.Mock()
+        deliveries = [
+            (1, json.dumps(self._message('files', [self._add_file('a.root'),
+                                                   self._add_file('b.root')]))),
+            (2, json.dumps(self._message('file-complete', {'file-id': 1})))
+        ]
+
+        consumer.flush(channel, deliveries)
+
+        # The failed batch published nothing; the retry of the files message did
+        self.rabbit_adaptor.publish_many.assert_called_once()
+        bodies = self.rabbit_adaptor.publish_many.call_args[1]['bodies']
+        with consumer._app.app_context():
+            file_ids = {f.id for f in DatasetFile.query.filter_by(request_id='BR549')}
+        assert {json.loads(body)['file-id'] for body in bodies} == file_ids
+        assert len(file_ids) == 2
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+
+    def test_flush_file_complete_before_fileset_complete(self, mocker):
+        consumer = self._consumer(mocker)
+        channel = mocker.Mock()
+        consumer.flush(channel, [
+            (1, json.dumps(self._message('files', [self._add_file('a.root')])))
+        ])
+        with consumer._app.app_context():
+            file_id = DatasetFile.query.filter_by(request_id='BR549').one().id
+
+        consumer.flush(channel, [
+            (2, json.dumps(self._message('file-complete', self._file_complete(file_id))))
+        ])
+        with consumer._app.app_context():
+            request = TransformRequest.return_request('BR549')
+            assert request.files_processed == 1
+            assert request.status == 'Submitted'
+        self.transformer_manager.shutdown_transformer_job.assert_not_called()
+
+        consumer.flush(channel, [
+            (3, json.dumps(self._message('fileset-complete', {
+                'files': 1, 'files-skipped': 0, 'total-events': 10000,
+                'total-bytes': 325683, 'elapsed-time': 3
+            })))
+        ])
+        with consumer._app.app_context():
+            assert TransformRequest.return_request('BR549').status == 'Complete'
+        self.transformer_manager.shutdown_transformer_job.assert_called_once_with(
+            'BR549', 'my-ws', None)
+        channel.basic_nack.assert_not_called()
+
+    def test_flush_requeues_when_database_unavailable(self, mocker):
+        consumer = self._consumer(mocker)
+        mocker.patch.object(consumer, 'apply_batch',
+                            side_effect=OperationalError('SELECT', {}, Exception('down')))
+        channel = mocker.Mock()
+
+        consumer.flush(channel, [(1, b'{}'), (2, b'{}')])
+
+        channel.basic_ack.assert_not_called()
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, multiple=True,
+                                                   requeue=True)
+
+    def test_consume_batches(self, mocker):
+        consumer = CallbackConsumer(mocker.Mock(), 'amqp://foo.com', batch_size=2)
+        mock_flush = mocker.patch.object(consumer, 'flush')
+        channel = mocker.Mock()
+        channel.consume.return_value = iter([
+            (mocker.Mock(delivery_tag=1), None, b'a'),
+            (mocker.Mock(delivery_tag=2), None, b'b'),
+            (mocker.Mock(delivery_tag=3), None, b'c'),
+            (None, None, None),
+            (None, None, None)
+        ])
+
+        consumer.consume(channel)
+
+        channel.consume.assert_called_once_with('servicex_callbacks', inactivity_timeout=0.5)
+        assert mock_flush.call_args_list == [
+            mocker.call(channel, [(1, b'a'), (2, b'b')]),
+            mocker.call(channel, [(3, b'c')])
+        ]
+        channel.cancel.assert_called_once()
+
+    def test_consume_stops(self, mocker):
+        consumer = CallbackConsumer(mocker.Mock(), 'amqp://foo.com', batch_size=2)
+        mock_flush = mocker.patch.object(consumer, 'flush')
+        channel = mocker.Mock()
+        channel.consume.return_value = iter([(None, None, None)] * 3)
+
+        consumer.stop()
+        consumer.consume(channel)
+
+        mock_flush.assert_not_called()
+        channel.cancel.assert_called_once()
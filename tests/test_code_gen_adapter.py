@@ -36,6 +36,7 @@ class TestCodeGenAdapter:
         transform_request = TransformRequest()
         transform_request.request_id = "462-33"
         transform_request.selection = "test-string"
+        transform_request.code_gen_image = "sslhep/servicex_code_gen_func_adl_xaod:develop"
         return transform_request
 
     def test_init(self, mocker):
@@ -48,22 +49,64 @@ class TestCodeGenAdapter:
         mock_response.status_code = 200
         mock_requests_post = mocker.patch('requests.post', return_value=mock_response)
         mock_transformer_manager = mocker.Mock()
+        mock_transformer_manager.configmap_exists = mocker.Mock(return_value=False)
         mock_zip = mocker.patch("zipfile.ZipFile")
         mocker.patch("io.BytesIO")
         service = CodeGenAdapter("http://foo.com", mock_transformer_manager)
-        service.generate_code_for_selection(self._generate_test_request(), "servicex")
+        request = self._generate_test_request()
+        service.generate_code_for_selection(request, "servicex")
         mock_requests_post.assert_called()
 
+        configmap_name = service.configmap_name(
+            service.selection_hash("test-string", request.code_gen_image))
         mock_transformer_manager.create_configmap_from_zip.assert_called_with(mock_zip(),
-                                                                              "462-33",
+                                                                              configmap_name,
                                                                               "servicex")
 
+    def test_selection_hash(self):
+        image = "sslhep/servicex_code_gen_func_adl_xaod:develop"
+        key = CodeGenAdapter.selection_hash("test-string", image)
+        assert key == CodeGenAdapter.selection_hash("test-string", image)
+        assert key != CodeGenAdapter.selection_hash("other-string", image)
+        assert key != CodeGenAdapter.selection_hash("test-string", image + "2")
+        assert CodeGenAdapter.configmap_name(key).startswith("generated-code-")
+
+    def test_generate_code_reuses_configmap(self, mocker):
+        mock_requests_post = mocker.patch('requests.post')
+        mock_transformer_manager = mocker.Mock()
+        mock_transformer_manager.configmap_exists = mocker.Mock(return_value=True)
+        service = CodeGenAdapter("http://foo.com", mock_transformer_manager)
+
+        name = service.generate_code_for_selection(self._generate_test_request(), "servicex")
+        assert name.startswith("generated-code-")
+        mock_requests_post.assert_not_called()
+        mock_transformer_manager.create_configmap_from_zip.assert_not_called()
+
+    def test_generate_code_reuses_cached_zip(self, mocker):
+        mock_response = mocker.Mock()
+        mock_response.status_code = 200
+        mock_response.content = b"zipped"
+        mock_requests_post = mocker.patch('requests.post', return_value=mock_response)
+        mock_transformer_manager = mocker.Mock()
+        mock_transformer_manager.configmap_exists = mocker.Mock(return_value=False)
+        mocker.patch("zipfile.ZipFile")
+        mock_bytes_io = mocker.patch("io.BytesIO")
+        service = CodeGenAdapter("http://foo.com", mock_transformer_manager)
+
+        service.generate_code_for_selection(self._generate_test_request(), "servicex")
+        service.generate_code_for_selection(self._generate_test_request(), "servicex")
+
+        assert mock_requests_post.call_count == 1
+        assert mock_transformer_manager.create_configmap_from_zip.call_count == 2
+        mock_bytes_io.assert_called_with(b"zipped")
+
     def test_generate_code_bad_response(self, mocker):
         mock_response = mocker.Mock()
         mock_response.status_code = 500
         mock_response.json = mocker.Mock(return_value={"Message": "Ooops"})
         mocker.patch('requests.post', return_value=mock_response)
         mock_transformer_manager = mocker.Mock()
+        mock_transformer_manager.configmap_exists = mocker.Mock(return_value=False)
         service = CodeGenAdapter("http://foo.com", mock_transformer_manager)
 
         with pytest.raises(ValueError) as eek:
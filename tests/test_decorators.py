@@ -84,6 +84,67 @@ class TestDecorators(WebTestBase):
             response: Response = decorated()
             assert response.status_code == 200
 
+    def test_auth_decorator_caches_user(self, mocker, mock_jwt_extended, user):
+        user.id, user.pending = 7, False
+        mocker.patch('servicex.decorators.get_jwt_identity', return_value=user.sub)
+        find_by_sub = mocker.patch('servicex.models.UserModel.find_by_sub',
+                                   return_value=user)
+        client = self._test_client(extra_config={'ENABLE_AUTH': True})
+        with client.application.app_context():
+            from servicex.decorators import auth_required
+            decorated = auth_required(fake_route)
+            assert decorated().status_code == 200
+            assert decorated().status_code == 200
+        find_by_sub.assert_called_once_with(user.sub)
+
+    def test_auth_decorator_pending_user_not_cached(self, mocker, mock_jwt_extended, user):
+        user.pending = True
+        find_by_sub = mocker.patch('servicex.models.UserModel.find_by_sub',
+                                   return_value=user)
+        client = self._test_client(extra_config={'ENABLE_AUTH': True})
+        with client.application.app_context():
+            from servicex.decorators import auth_required
+            decorated = auth_required(fake_route)
+            assert decorated().status_code == 401
+            user.pending = False
+            assert decorated().status_code == 200
+        assert find_by_sub.call_count == 2
+
+    def test_auth_decorator_cache_disabled(self, mocker, mock_jwt_extended, user):
+        user.pending = False
+        find_by_sub = mocker.patch('servicex.models.UserModel.find_by_sub',
+                                   return_value=user)
+        client = self._test_client(extra_config={'ENABLE_AUTH': True,
+                                                 'AUTH_USER_CACHE_TTL': 0})
+        with client.application.app_context():
+            from servicex.decorators import auth_required
+            decorated = auth_required(fake_route)
+            decorated()
+            decorated()
+        assert find_by_sub.call_count == 2
+
+    def test_auth_decorator_no_queries_when_cached(self, mocker, mock_jwt_extended, count_queries):
+        from servicex.models import UserModel
+        mocker.patch('servicex.decorators.get_jwt_identity', return_value='janedoe')
+        client = self._test_client(extra_config={'ENABLE_AUTH': True})
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            user = self._test_user()
+            user.pending = False
+            user.save_to_db()
+
+        with client.application.app_context():
+            from servicex.decorators import auth_required
+            decorated = auth_required(fake_route)
+            assert decorated().status_code == 200
+            with count_queries(client.application) as queries:
+                assert decorated().status_code == 200
+            assert queries == []
+
+            UserModel.find_by_sub('janedoe').delete_from_db()
+            assert decorated().status_code == 401
+
     def test_admin_decorator_auth_disabled(self, client):
         with client.application.app_context():
             from servicex.decorators import admin_required
@@ -0,0 +1,134 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+from kubernetes.client.rest import ApiException
+
+from servicex.deployment_informer import DeploymentInformer
+
+
+class TestDeploymentInformer:
+    @pytest.fixture
+    def mock_client(self, mocker):
+        return mocker.patch('servicex.deployment_informer.client')
+
+    @pytest.fixture
+    def mock_watch(self, mocker):
+        return mocker.patch('servicex.deployment_informer.watch')
+
+    @staticmethod
+    def _deployment(mocker, name, resource_version='1'):
+        deployment = mocker.MagicMock(name=name)
+        deployment.metadata.name = name
+        deployment.metadata.resource_version = resource_version
+        return deployment
+
+    def _deployment_list(self, mocker, names, resource_version='10'):
+        results = mocker.MagicMock(name="deployment_list")
+        results.items = [self._deployment(mocker, name) for name in names]
+        results.metadata.resource_version = resource_version
+        return results
+
+    def test_list(self, mocker, mock_client):
+        api = mock_client.AppsV1Api.return_value
+        results = self._deployment_list(mocker, ['transformer-1234', 'servicex-app'])
+        api.list_namespaced_deployment.return_value = results
+
+        informer = DeploymentInformer('my-ws', mocker.Mock())
+        assert not informer.synced
+        assert informer._list(api) == '10'
+
+        api.list_namespaced_deployment.assert_called_once_with('my-ws')
+        assert informer.synced
+        assert informer.get('1234') == results.items[0].status
+        assert informer.get('servicex-app') is None
+        assert informer.get_many(['1234', '5678']) == {'1234': results.items[0].status}
+
+    def test_apply(self, mocker):
+        informer = DeploymentInformer('my-ws', mocker.Mock())
+        added = self._deployment(mocker, 'transformer-1234', resource_version='11')
+        modified = self._deployment(mocker, 'transformer-1234', resource_version='12')
+
+        assert informer._apply({'type': 'ADDED', 'object': added}) == '11'
+        assert informer.get('1234') == added.status
+
+        assert informer._apply({'type': 'MODIFIED', 'object': modified}) == '12'
+        assert informer.get('1234') == modified.status
+
+        informer._apply({'type': 'DELETED', 'object': modified})
+        assert informer.get('1234') is None
+
+    def test_apply_ignores_other_deployments(self, mocker):
+        informer = DeploymentInformer('my-ws', mocker.Mock())
+        informer._apply({'type': 'ADDED', 'object': self._deployment(mocker, 'minio')})
+        assert informer._statuses == {}
+
+    def test_apply_error(self, mocker):
+        informer = DeploymentInformer('my-ws', mocker.Mock())
+        with pytest.raises(ApiException):
+            informer._apply({'type': 'ERROR',
+                             'raw_object': {'code': 410, 'message': 'Gone'}})
+
+    def test_run_watches_from_list_version(self, mocker, mock_client, mock_watch):
+        api = mock_client.AppsV1Api.return_value
+        api.list_namespaced_deployment.return_value = \
+            self._deployment_list(mocker, [], resource_version='10')
+        informer = DeploymentInformer('my-ws', mocker.Mock(), watch_timeout=60)
+        added = self._deployment(mocker, 'transformer-1234', resource_version='11')
+
+        def stream(*args, **kwargs):
+            yield {'type': 'ADDED', 'object': added}
+            informer.stop()
+
+        mock_watch.Watch.return_value.stream.side_effect = stream
+        informer._run()
+
+        mock_watch.Watch.return_value.stream.assert_called_once_with(
+            api.list_namespaced_deployment, 'my-ws', resource_version='10',
+            timeout_seconds=60)
+        assert informer.get('1234') == added.status
+        assert informer.synced
+
+    def test_run_relists_after_error(self, mocker, mock_client, mock_watch):
+        api = mock_client.AppsV1Api.return_value
+        api.list_namespaced_deployment.return_value = self._deployment_list(mocker, [])
+        logger = mocker.Mock()
+        informer = DeploymentInformer('my-ws', logger, retry_interval=0)
+        streams = []
+
+        def stream(*args, **kwargs):
+            streams.append(kwargs)
+            if len(streams) == 1:
+                raise ApiException(status=410, reason='Gone')
+            informer.stop()
+            return iter([])
+
+        mock_watch.Watch.return_value.stream.side_effect = stream
+        informer._run()
+
+        assert api.list_namespaced_deployment.call_count == 2
+        logger.warning.assert_called_once()
@@ -25,43 +25,109 @@
 # CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import requests
+
 from servicex.docker_repo_adapter import DockerRepoAdapter
 
 
 class TestDockerRepoAdapter:
-    def test_check_image_exists(self, mocker):
-        import requests
-        mock_response = mocker.Mock()
-        mock_get = mocker.patch.object(requests, "get", return_value=mock_response)
-        mock_response.status_code = 200
+    @staticmethod
+    def _mock_session(mocker, status_code=200):
+        mock_session = mocker.Mock()
+        mock_response = mock_session.get.return_value
+        mock_response.status_code = status_code
         mock_response.json = mocker.Mock(return_value={
             'last_updated': '2020-07-22T21:13:55.317762Z'})
-        docker = DockerRepoAdapter()
+        return mock_session
+
+    def test_check_image_exists(self, mocker):
+        mock_session = self._mock_session(mocker)
+        docker = DockerRepoAdapter(session=mock_session, timeout=5)
         result = docker.check_image_exists("foo/bar:baz")
         assert result
 
-        mock_get.assert_called_with(
-            'https://hub.docker.com/v2/repositories/foo/bar/tags/baz'
+        mock_session.get.assert_called_with(
+            'https://hub.docker.com/v2/repositories/foo/bar/tags/baz', timeout=5
         )
 
     def test_check_image_exists_not_there(self, mocker):
-        import requests
-        mock_response = mocker.Mock()
-        mocker.patch.object(requests, "get", return_value=mock_response)
-        mock_response.status_code = 404
-        docker = DockerRepoAdapter()
+        mock_session = self._mock_session(mocker, status_code=404)
+        docker = DockerRepoAdapter(session=mock_session)
         result = docker.check_image_exists("foo/bar:baz")
         assert not result
 
     def test_check_image_exists_invalid_name(self, mocker):
-        import requests
-        mock_response = mocker.Mock()
-        mocker.patch.object(requests, "get", return_value=mock_response)
-        mock_response.status_code = 404
-        docker = DockerRepoAdapter()
+        mock_session = self._mock_session(mocker, status_code=404)
+        docker = DockerRepoAdapter(session=mock_session)
         result = docker.check_image_exists("foobar:baz")
         assert not result
 
         assert not docker.check_image_exists("foo/barbaz")
         assert not docker.check_image_exists("foobarbaz")
         assert not docker.check_image_exists("")
+        mock_session.get.assert_not_called()
+
+    def test_check_image_exists_cached(self, mocker):
+        mock_session = self._mock_session(mocker)
+        docker = DockerRepoAdapter(session=mock_session)
+        assert docker.check_image_exists("foo/bar:baz")
+        assert docker.check_image_exists("foo/bar:baz")
+        mock_session.get.assert_called_once()
+
+    def test_check_image_exists_not_there_cached(self, mocker):
+        mock_session = self._mock_session(mocker, status_code=404)
+        docker = DockerRepoAdapter(session=mock_session, negative_ttl=60)
+        assert not docker.check_image_exists("foo/bar:baz")
+        assert not docker.check_image_exists("foo/bar:baz")
+        mock_session.get.assert_called_once()
+
+    def test_check_image_exists_ttls(self, mocker):
+        mock_session = self._mock_session(mocker)
+        docker = DockerRepoAdapter(session=mock_session, positive_ttl=3600, negative_ttl=60)
+        mock_put = mocker.patch.object(docker._cache, 'put')
+
+        docker.check_image_exists("foo/bar:baz")
+        mock_put.assert_called_with("foo/bar:baz", True, ttl=3600)
+
+        mock_session.get.return_value.status_code = 404
+        docker.check_image_exists("foo/bar:missing")
+        mock_put.assert_called_with("foo/bar:missing", False, ttl=60)
+
+    def test_check_image_exists_rate_limited(self, mocker):
+        mock_session = self._mock_session(mocker, status_code=429)
+        docker = DockerRepoAdapter(session=mock_session)
+        assert docker.check_image_exists("foo/bar:baz")
+        assert docker.check_image_exists("foo/bar:baz")
+        assert mock_session.get.call_count == 2
+
+    def test_default_session_pooled(self):
+        docker = DockerRepoAdapter()
+        assert isinstance(docker._session, requests.Session)
+        assert docker._session.get_adapter('https://hub.docker.com')._pool_maxsize == 10
+
+    def test_refresher(self, mocker):
+        mock_session = self._mock_session(mocker)
+        docker = DockerRepoAdapter(session=mock_session)
+        mock_thread = mocker.patch('servicex.docker_repo_adapter.threading.Thread')
+        docker.start_refresher(["foo/bar:baz"], interval=600)
+
+        refresh = mock_thread.call_args[1]['target']
+        mock_thread.return_value.start.assert_called_once()
+
+        # Run one pass of the refresher
+        docker.stop_refresher()
+        refresh()
+
+        mock_session.get.assert_called_once()
+        assert docker.check_image_exists("foo/bar:baz")
+        mock_session.get.assert_called_once()
+
+    def test_refresher_survives_errors(self, mocker):
+        mock_session = self._mock_session(mocker)
+        mock_session.get.side_effect = requests.ConnectionError("Boom")
+        docker = DockerRepoAdapter(session=mock_session)
+        mock_thread = mocker.patch('servicex.docker_repo_adapter.threading.Thread')
+        docker.start_refresher(["foo/bar:baz"], interval=600)
+        docker.stop_refresher()
+        mock_thread.call_args[1]['target']()
+        mock_session.get.assert_called_once()
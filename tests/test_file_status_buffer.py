@@ -0,0 +1,129 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+
+from servicex.file_status_buffer import FileStatusBuffer
+from servicex.models import FileStatus, db
+from tests.resource_test_base import ResourceTestBase
+
+
+class TestFileStatusBuffer(ResourceTestBase):
+    def _buffer(self, **kwargs):
+        client = self._test_client()
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.save_to_db()
+            db.session.commit()
+        return FileStatusBuffer(client.application, **kwargs)
+
+    @staticmethod
+    def _status(file_id, status='start'):
+        return FileStatus(file_id=file_id, request_id='BR549', status=status,
+                          timestamp=datetime(2020, 1, 1), pod_name='transformer-1',
+                          info='info')
+
+    @staticmethod
+    def _count(buffer):
+        with buffer._app.app_context():
+            return FileStatus.query.count()
+
+    def test_flush(self):
+        buffer = self._buffer()
+        for file_id in range(3):
+            buffer.add(self._status(file_id))
+        assert len(buffer) == 3
+        assert self._count(buffer) == 0
+
+        assert buffer.flush() == 3
+        assert len(buffer) == 0
+        assert self._count(buffer) == 3
+        assert buffer.flush() == 0
+
+        stats = buffer.stats()
+        assert stats['depth'] == 0
+        assert stats['flushed'] == 3
+        assert stats['flushes'] == 1
+        assert stats['dropped'] == 0
+        assert stats['last-flush-latency'] > 0
+        assert stats['max-flush-latency'] >= stats['last-flush-latency']
+
+    def test_flush_when_full(self):
+        buffer = self._buffer(max_size=2, flush_interval=60)
+        buffer.start()
+        try:
+            buffer.add(self._status(1))
+            buffer.add(self._status(2))
+            for _ in range(100):
+                if buffer.flushed == 2:
+                    break
+                time.sleep(0.05)
+            assert buffer.flushed == 2
+            assert self._count(buffer) == 2
+        finally:
+            buffer.close()
+
+    def test_close_flushes(self):
+        buffer = self._buffer(flush_interval=60)
+        buffer.start()
+        buffer.add(self._status(1))
+        buffer.close()
+        assert len(buffer) == 0
+        assert self._count(buffer) == 1
+
+    def test_flush_database_unavailable(self, mocker):
+        buffer = self._buffer(max_pending=3)
+        mocker.patch.object(FileStatus, 'bulk_insert',
+                            side_effect=OperationalError('INSERT', {}, Exception('down')))
+        buffer.add(self._status(1))
+        buffer.add(self._status(2))
+        assert buffer.flush() == 0
+        assert len(buffer) == 2
+
+        buffer.add(self._status(3))
+        buffer.add(self._status(4))
+        assert buffer.flush() == 0
+        assert len(buffer) == 3
+        assert buffer.stats()['dropped'] == 1
+        assert [row['file_id'] for row in buffer._rows] == [2, 3, 4]
+
+    def test_flush_drops_bad_rows(self):
+        buffer = self._buffer()
+        buffer.add(self._status(1))
+        buffer.add(self._status(2, status=None))
+        buffer.add(self._status(3))
+
+        assert buffer.flush() == 2
+        assert self._count(buffer) == 2
+        assert buffer.stats()['dropped'] == 1
@@ -0,0 +1,104 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+from flask import Flask, current_app
+from kubernetes.client.rest import ApiException
+
+from servicex.kubernetes_work_queue import KubernetesWorkQueue
+
+
+class TestKubernetesWorkQueue:
+    @pytest.fixture
+    def app(self):
+        app = Flask(__name__)
+        with app.app_context():
+            yield app
+
+    @pytest.fixture
+    def work_queue(self, mocker, app):
+        work_queue = KubernetesWorkQueue(mocker.Mock(), max_attempts=3, retry_interval=0)
+        yield work_queue
+        work_queue.close()
+
+    def test_runs_operations_in_order(self, app, work_queue):
+        calls = []
+        for n in range(5):
+            work_queue.submit(f"op {n}", lambda n=n: calls.append((n, current_app.name)))
+        work_queue.join()
+
+        assert calls == [(n, app.name) for n in range(5)]
+        assert len(work_queue) == 0
+        assert work_queue.failed == 0
+
+    def test_retries(self, mocker, work_queue):
+        operation = mocker.Mock(side_effect=[ApiException(status=500), Exception("timeout"),
+                                             None])
+        work_queue.submit("op", operation)
+        work_queue.join()
+
+        assert operation.call_count == 3
+        assert work_queue.failed == 0
+
+    def test_gives_up(self, mocker, work_queue):
+        operation = mocker.Mock(side_effect=ApiException(status=503))
+        after = mocker.Mock()
+        work_queue.submit("op", operation)
+        work_queue.submit("after", after)
+        work_queue.join()
+
+        assert operation.call_count == 3
+        assert work_queue.failed == 1
+        after.assert_called_once()
+
+    def test_permanent_error_not_retried(self, mocker, work_queue):
+        operation = mocker.Mock(side_effect=ApiException(status=403))
+        work_queue.submit("op", operation)
+        work_queue.join()
+
+        operation.assert_called_once()
+        assert work_queue.failed == 1
+
+    def test_on_failure(self, mocker, app, work_queue):
+        on_failure = mocker.Mock()
+        work_queue.submit("op", mocker.Mock(side_effect=ApiException(status=503)), on_failure)
+        work_queue.submit("permanent op", mocker.Mock(side_effect=ApiException(status=422)),
+                          on_failure)
+        work_queue.submit("good op", mocker.Mock(), on_failure)
+        work_queue.join()
+
+        assert [c[0][0].split(":")[0] for c in on_failure.call_args_list] == [
+            "Failed to op", "Failed to permanent op"]
+
+    def test_close_drains_queue(self, mocker, work_queue):
+        operations = [mocker.Mock() for _ in range(3)]
+        for operation in operations:
+            work_queue.submit("op", operation)
+        work_queue.close()
+
+        for operation in operations:
+            operation.assert_called_once()
@@ -109,6 +109,45 @@ class TestLookupResutProcessor(ResourceTestBase):
                  'kafka-broker': 'http://ssl-hep.org.kafka:12345'
                  }))
 
+    def test_add_files_to_dataset(self, mocker, mock_rabbit_adaptor):
+        processor = LookupResultProcessor(mock_rabbit_adaptor,
+                                          "http://cern.analysis.ch:5000/")
+        dataset_files = [DatasetFile(request_id="BR549",
+                                     file_path="/foo/bar%d.root" % i,
+                                     adler32='12345',
+                                     file_size=1024,
+                                     file_events=500) for i in range(2)]
+
+        def set_ids(files):
+            for i, f in enumerate(files):
+                f.id = 42 + i
+
+        mock_bulk_save = mocker.patch.object(DatasetFile, "bulk_save_to_db",
+                                             side_effect=set_ids)
+
+        request = self._generate_transform_request()
+        request.result_destination = 'object-store'
+        processor.add_files_to_dataset(request, dataset_files)
+
+        mock_bulk_save.assert_called_once_with(dataset_files)
+        mock_rabbit_adaptor.basic_publish.assert_not_called()
+        mock_rabbit_adaptor.publish_many.assert_called_once()
+        publish_call = mock_rabbit_adaptor.publish_many.call_args[1]
+        assert publish_call['exchange'] == 'transformation_requests'
+        assert publish_call['routing_key'] == 'BR549'
+        assert len(publish_call['bodies']) == 2
+        assert json.loads(publish_call['bodies'][1]) == {
+            "request-id": 'BR549',
+            "file-id": 43,
+            "columns": 'electron.eta(), muon.pt()',
+            "file-path": "/foo/bar1.root",
+            "tree-name": "Events",
+            "chunk-size": 1000,
+            "service-endpoint":
+                "http://cern.analysis.ch:5000/servicex/internal/transformation/BR549",
+            'result-destination': 'object-store'
+        }
+
     def test_report_fileset_complete(self, mocker, mock_rabbit_adaptor):
         processor = LookupResultProcessor(mock_rabbit_adaptor, "http://cern.analysis.ch:5000/")
 
@@ -2,7 +2,11 @@ from datetime import datetime, timedelta
 
 from pytest import fixture
 
-from servicex.models import UserModel, TransformRequest, TransformationResult
+from sqlalchemy.dialects import sqlite
+
+from servicex.models import UserModel, TransformRequest, TransformationResult, DatasetFile, \
+    FileStatus, db
+from tests.resource_test_base import ResourceTestBase
 
 
 class TestTransformRequest:
@@ -57,12 +61,11 @@ class TestTransformRequest:
         request = TransformRequest()
         assert request.submitter_name is None
 
-    def test_result_count(self, mock_tr):
-        mock_tr.query.filter_by.return_value.count.return_value = 3
+    def test_result_count(self):
         request = TransformRequest(request_id="1234")
-        assert request.result_count == 3
-        mock_tr.query.filter_by.assert_called_once_with(request_id=request.request_id)
-        mock_tr.query.filter_by.return_value.count.assert_called_once()
+        request.completed_files = 3
+        request.failed_files = 2
+        assert request.result_count == 5
 
     def test_results(self, mock_tr):
         results = [TransformationResult(), TransformationResult()]
@@ -87,20 +90,214 @@ class TestTransformRequest:
         request.files = None
         assert request.files_remaining is None
 
-    def test_files_processed(self, mock_tr):
-        mock_tr.query.filter_by.return_value.count.return_value = 3
+    def test_files_processed(self):
         request = TransformRequest(request_id="1234")
+        assert request.files_processed == 0
+        request.completed_files = 3
         assert request.files_processed == 3
-        mock_tr.query.filter_by.assert_called_once_with(
-            request_id=request.request_id, transform_status="success"
-        )
-        mock_tr.query.filter_by.return_value.count.assert_called_once()
 
-    def test_files_failed(self, mock_tr):
-        mock_tr.query.filter_by.return_value.count.return_value = 3
+    def test_files_failed(self):
         request = TransformRequest(request_id="1234")
+        assert request.files_failed == 0
+        request.failed_files = 3
         assert request.files_failed == 3
-        mock_tr.query.filter_by.assert_called_once_with(
-            request_id=request.request_id, transform_status="failure"
-        )
-        mock_tr.query.filter_by.return_value.count.assert_called_once()
+
+    def test_record_file_result_success(self, mocker):
+        mock_save = mocker.patch.object(TransformRequest, "save_to_db")
+        request = TransformRequest(request_id="1234")
+        request.record_file_result("success", total_bytes=100, total_events=10)
+        assert str(request.completed_files) == str(TransformRequest.completed_files + 1)
+        assert request.failed_files is None
+        assert str(request.processed_bytes) == str(TransformRequest.processed_bytes + 100)
+        assert str(request.processed_events) == str(TransformRequest.processed_events + 10)
+        mock_save.assert_called_once()
+
+    def test_record_file_result_failure(self, mocker):
+        mocker.patch.object(TransformRequest, "save_to_db")
+        request = TransformRequest(request_id="1234")
+        request.record_file_result("failure", total_bytes=None, total_events=None)
+        assert request.completed_files is None
+        assert str(request.failed_files) == str(TransformRequest.failed_files + 1)
+        assert str(request.processed_bytes) == str(TransformRequest.processed_bytes + 0)
+
+    def test_record_file_results(self, mocker):
+        mock_save = mocker.patch.object(TransformRequest, "save_to_db")
+        request = TransformRequest(request_id="1234")
+        request.record_file_results([("success", 100, 10),
+                                     ("failure", None, None),
+                                     ("success", 50, 5)])
+        assert str(request.completed_files) == str(TransformRequest.completed_files + 2)
+        assert str(request.failed_files) == str(TransformRequest.failed_files + 1)
+        assert str(request.processed_bytes) == str(TransformRequest.processed_bytes + 150)
+        assert str(request.processed_events) == str(TransformRequest.processed_events + 15)
+        mock_save.assert_called_once()
+
+    def test_compute_fingerprint(self):
+        def request(**kwargs):
+            fields = dict(did='rucio://123-45-678', columns='e.e, e.p', tree_name='Events',
+                          image='sslhep/transformer:1.0', chunk_size=500,
+                          result_destination='object-store', result_format='parquet')
+            fields.update(kwargs)
+            return TransformRequest(**fields)
+
+        fingerprint = request().compute_fingerprint()
+        assert len(fingerprint) == 64
+        assert request(title='Again', workers=7).compute_fingerprint() == fingerprint
+        assert request(tree_name='Other').compute_fingerprint() != fingerprint
+        assert request(result_format='root-file').compute_fingerprint() != fingerprint
+        assert request().compute_fingerprint(['a.root']) != fingerprint
+
+
+class TestDatasetFile:
+
+    @staticmethod
+    def _files(n):
+        return [DatasetFile(request_id="1234", file_path="/foo/bar%d.root" % i,
+                            adler32="xxx", file_size=0, file_events=0)
+                for i in range(n)]
+
+    def test_bulk_save_to_db_returning(self, mocker):
+        mock_db = mocker.patch("servicex.models.db")
+        mock_db.session.get_bind.return_value.dialect.implicit_returning = True
+        mock_db.session.execute.side_effect = [
+            [mocker.Mock(id=1, file_path="/foo/bar0.root"),
+             mocker.Mock(id=2, file_path="/foo/bar1.root")],
+            [mocker.Mock(id=3, file_path="/foo/bar2.root")]
+        ]
+        files = self._files(3)
+        DatasetFile.bulk_save_to_db(files, chunk_size=2)
+        assert mock_db.session.execute.call_count == 2
+        assert [f.id for f in files] == [1, 2, 3]
+        mock_db.session.add_all.assert_not_called()
+
+    def test_bulk_save_to_db_returning_out_of_order(self, mocker):
+        mock_db = mocker.patch("servicex.models.db")
+        mock_db.session.get_bind.return_value.dialect.implicit_returning = True
+        files = self._files(3)
+        files.append(DatasetFile(request_id="1234", file_path="/foo/bar0.root"))
+        mock_db.session.execute.return_value = [
+            mocker.Mock(id=12, file_path="/foo/bar2.root"),
+            mocker.Mock(id=10, file_path="/foo/bar0.root"),
+            mocker.Mock(id=13, file_path="/foo/bar0.root"),
+            mocker.Mock(id=11, file_path="/foo/bar1.root")
+        ]
+        DatasetFile.bulk_save_to_db(files)
+        assert [f.id for f in files] == [10, 11, 12, 13]
+
+    def test_bulk_save_to_db_no_returning(self, mocker):
+        mock_db = mocker.patch("servicex.models.db")
+        mock_db.session.get_bind.return_value.dialect.implicit_returning = False
+        files = self._files(3)
+        DatasetFile.bulk_save_to_db(files)
+        mock_db.session.add_all.assert_called_once_with(files)
+        mock_db.session.flush.assert_called_once()
+        mock_db.session.execute.assert_not_called()
+
+    def test_bulk_save_to_db_empty(self, mocker):
+        mock_db = mocker.patch("servicex.models.db")
+        DatasetFile.bulk_save_to_db([])
+        mock_db.session.get_bind.assert_not_called()
+
+
+class TestRequestCache(ResourceTestBase):
+    def test_get_request_cached(self, client, count_queries):
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.save_to_db()
+            db.session.commit()
+
+        with client.application.app_context():
+            with count_queries(client.application) as queries:
+                first = TransformRequest.get_request_cached('BR549')
+                second = TransformRequest.get_request_cached('BR549')
+
+            assert len(queries) == 1
+            assert 'requests.selection' not in queries[0]
+            assert first == second
+            assert first.request_id == 'BR549'
+            assert first.columns == 'electron.eta(), muon.pt()'
+            assert first.tree_name == 'Events'
+            assert first.result_destination == 'kafka'
+            assert first.kafka_broker == 'http://ssl-hep.org.kafka:12345'
+
+            TransformRequest.invalidate_cached('BR549')
+            with count_queries(client.application) as queries:
+                TransformRequest.get_request_cached('BR549')
+            assert len(queries) == 1
+
+    def test_get_request_cached_missing(self, client):
+        client.get('/servicex')
+        with client.application.app_context():
+            assert TransformRequest.get_request_cached('missing') is None
+            assert len(TransformRequest._cache) == 0
+
+
+class TestAbandonedSetup(ResourceTestBase):
+    def _save_request(self, request_id, status, age):
+        request = self._generate_transform_request()
+        request.request_id = request_id
+        request.status = status
+        request.submit_time = datetime.utcnow() - age
+        request.workflow_name = 'straight_transform'
+        request.save_to_db()
+
+    def test_fail_abandoned_setup(self, client):
+        client.get('/servicex')
+        with client.application.app_context():
+            self._save_request('abandoned', 'Configuring Queues', timedelta(hours=1))
+            self._save_request('queued', 'Queued', timedelta(hours=1))
+            self._save_request('recent', 'Creating Bucket', timedelta(seconds=10))
+            self._save_request('dispatched', 'Submitted', timedelta(hours=1))
+            self._save_request('running', 'Running', timedelta(hours=1))
+            db.session.commit()
+
+            abandoned = TransformRequest.fail_abandoned_setup(timedelta(minutes=30))
+
+            assert sorted(r.request_id for r in abandoned) == ['abandoned', 'queued']
+            request = TransformRequest.return_request('abandoned')
+            assert request.status == 'Fatal'
+            assert request.failure_description == \
+                'Submission was interrupted while Configuring Queues'
+            for request_id, status in [('recent', 'Creating Bucket'),
+                                       ('dispatched', 'Submitted'),
+                                       ('running', 'Running')]:
+                assert TransformRequest.return_request(request_id).status == status
+
+
+class TestQueryPlans(ResourceTestBase):
+    """
+    Every query on a per-request hot path should be served by an index.
+    Add new hot queries to this list so that they come with index coverage.
+    """
+
+    @staticmethod
+    def _hot_queries():
+        return {
+            'statistics':
+                TransformRequest._statistics_query().filter_by(request_id='1234'),
+            'results':
+                TransformationResult.query.filter_by(request_id='1234'),
+            'results by status':
+                TransformationResult.query.filter_by(request_id='1234',
+                                                     transform_status='failure'),
+            'files':
+                DatasetFile.query.filter_by(request_id='1234'),
+            'failures': FileStatus.failures_for_request('1234', after_id=10, limit=100),
+            'request': TransformRequest.query.filter_by(request_id='1234')
+        }
+
+    def test_hot_queries_use_indexes(self, client):
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            for name, query in self._hot_queries().items():
+                sql = str(query.statement.compile(dialect=sqlite.dialect(),
+                                                  compile_kwargs={"literal_binds": True}))
+                plan = [row[-1] for row in db.session.execute("EXPLAIN QUERY PLAN " + sql)]
+                full_scans = [step for step in plan
+                              if step.startswith('SCAN') and 'USING' not in step]
+                assert not full_scans, f"Query for {name} scans a table: {plan}"
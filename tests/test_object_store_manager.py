@@ -46,6 +46,57 @@ class TestObjectStoreManager:
         result.create_bucket("123-455")
         mock_minio.make_bucket.assert_called_with("123-455")
 
+    def test_bucket_exists(self, mocker):
+        import minio
+        mock_minio = mocker.MagicMock(minio.api.Minio)
+        mock_minio.bucket_exists = mocker.Mock(return_value=True)
+        mocker.patch('minio.Minio', return_value=mock_minio)
+        result = ObjectStoreManager('localhost:9999', 'foo', 'bar')
+        assert result.bucket_exists("123-455")
+        mock_minio.bucket_exists.assert_called_with("123-455")
+
+    def test_copy_bucket(self, mocker):
+        import minio
+        mock_minio = mocker.MagicMock(minio.api.Minio)
+        mock_minio.list_objects.return_value = [mocker.Mock(object_name="a.parquet"),
+                                                mocker.Mock(object_name="b.parquet")]
+        mocker.patch('minio.Minio', return_value=mock_minio)
+        result = ObjectStoreManager('localhost:9999', 'foo', 'bar')
+        result.copy_bucket("123-455", "678-900")
+
+        mock_minio.make_bucket.assert_called_with("678-900")
+        mock_minio.list_objects.assert_called_with("123-455", recursive=True)
+        copies = mock_minio.copy_object.call_args_list
+        assert [c[0][:2] for c in copies] == [("678-900", "a.parquet"),
+                                              ("678-900", "b.parquet")]
+        assert copies[0][0][2].bucket_name == "123-455"
+        assert copies[0][0][2].object_name == "a.parquet"
+
+    def test_remove_bucket(self, mocker):
+        import minio
+        mock_minio = mocker.MagicMock(minio.api.Minio)
+        mock_minio.bucket_exists.return_value = True
+        mock_minio.list_objects.return_value = [mocker.Mock(object_name="a.parquet"),
+                                                mocker.Mock(object_name="b.parquet")]
+        mocker.patch('minio.Minio', return_value=mock_minio)
+        result = ObjectStoreManager('localhost:9999', 'foo', 'bar')
+        result.remove_bucket("678-900")
+
+        mock_minio.list_objects.assert_called_with("678-900", recursive=True)
+        assert [c[0] for c in mock_minio.remove_object.call_args_list] == \
+            [("678-900", "a.parquet"), ("678-900", "b.parquet")]
+        mock_minio.remove_bucket.assert_called_with("678-900")
+
+    def test_remove_bucket_missing(self, mocker):
+        import minio
+        mock_minio = mocker.MagicMock(minio.api.Minio)
+        mock_minio.bucket_exists.return_value = False
+        mocker.patch('minio.Minio', return_value=mock_minio)
+        result = ObjectStoreManager('localhost:9999', 'foo', 'bar')
+        result.remove_bucket("678-900")
+
+        mock_minio.remove_bucket.assert_not_called()
+
     def test_list_buckets(self, mocker):
         import minio
         mock_minio = mocker.MagicMock(minio.api.Minio)
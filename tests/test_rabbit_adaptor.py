@@ -26,6 +26,7 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import pika
+import pytest
 
 from servicex.rabbit_adaptor import RabbitAdaptor
 from tests.resource_test_base import ResourceTestBase
@@ -68,8 +69,12 @@ class TestRabbitAdaptor(ResourceTestBase):
             mock_connection.channel = mocker.Mock(return_value=mock_channel)
             mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
             mock_pika.channel = mocker.Mock()
-            rabbit = RabbitAdaptor("amqp://test.com")
-            rabbit.setup_queue("my_queue")
+            mocker.patch('time.sleep')
+            rabbit = RabbitAdaptor("amqp://test.com", max_retries=2)
+            with pytest.raises(pika.exceptions.ConnectionClosedByBroker):
+                rabbit.setup_queue("my_queue")
+            assert mock_channel.queue_declare.call_count == 3
+            assert mock_pika.call_count == 3  # Reconnected before each retry
 
     def test_setup_queue_wrong_state(self, mocker, client):
         with client.application.app_context():
@@ -152,7 +157,7 @@ class TestRabbitAdaptor(ResourceTestBase):
                 queue="my_queue",
                 routing_key='my_queue')
             assert mock_channel.queue_bind.call_count == 2
-            assert mock_pika.call_count == 1  # No retry
+            assert mock_pika.call_count == 2  # Retried the connection
 
     def test_bind_queue_to_exchange_channel_error(self, mocker, client):
         with client.application.app_context():
@@ -170,7 +175,8 @@ class TestRabbitAdaptor(ResourceTestBase):
             mock_pika.channel = mocker.Mock()
             rabbit = RabbitAdaptor("amqp://test.com")
 
-            rabbit.bind_queue_to_exchange("exchange1", "my_queue")
+            with pytest.raises(pika.exceptions.AMQPChannelError):
+                rabbit.bind_queue_to_exchange("exchange1", "my_queue")
             mock_pika.assert_called()
             mock_connection.channel.assert_called()
             mock_channel.queue_bind.assert_called_with(
@@ -247,7 +253,7 @@ class TestRabbitAdaptor(ResourceTestBase):
             mock_pika.assert_called()
             mock_connection.channel.assert_called()
             assert mock_channel.basic_publish.call_count == 2
-            assert mock_pika.call_count == 1  # No retry of connection
+            assert mock_pika.call_count == 2  # Retried the connection
 
     def test_basic_publish_channel_error(self, mocker, client):
         with client.application.app_context():
@@ -264,7 +270,8 @@ class TestRabbitAdaptor(ResourceTestBase):
             mock_pika.channel = mocker.Mock()
             rabbit = RabbitAdaptor("amqp://test.com")
 
-            rabbit.basic_publish("exchange1", "my_queue", "{my: body}")
+            with pytest.raises(pika.exceptions.AMQPChannelError):
+                rabbit.basic_publish("exchange1", "my_queue", "{my: body}")
             mock_pika.assert_called()
             mock_connection.channel.assert_called()
             assert mock_channel.basic_publish.call_count == 1
@@ -292,6 +299,245 @@ class TestRabbitAdaptor(ResourceTestBase):
             assert mock_channel.basic_publish.call_count == 2
             assert mock_pika.call_count == 2
 
+    def test_publish_many(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            rabbit.publish_many("exchange1", "my_queue",
+                                ["body%d" % i for i in range(5)], batch_size=2)
+            mock_pika.assert_called_once()
+            mock_channel.tx_select.assert_called_once()
+            mock_channel.confirm_delivery.assert_not_called()
+            assert mock_channel.basic_publish.call_count == 5
+            assert mock_channel.tx_commit.call_count == 3
+            mock_channel.basic_publish.assert_called_with(
+                exchange="exchange1",
+                routing_key='my_queue',
+                properties=pika.BasicProperties(delivery_mode=1),
+                body="body4",
+                mandatory=True)
+
+    def test_publish_many_connection_error(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_channel.tx_commit = mocker.Mock(
+                side_effect=[
+                    pika.exceptions.AMQPConnectionError,
+                    "ok"
+                ]
+            )
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            rabbit.publish_many("exchange1", "my_queue", ["body1", "body2"])
+            assert mock_pika.call_count == 2  # Retried the connection
+            assert mock_channel.basic_publish.call_count == 4  # Batch re-sent
+            assert mock_channel.tx_commit.call_count == 2
+
+    def test_publish_many_channel_error(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_channel.basic_publish = mocker.Mock(
+                side_effect=pika.exceptions.AMQPChannelError)
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            with pytest.raises(pika.exceptions.AMQPChannelError):
+                rabbit.publish_many("exchange1", "my_queue", ["body1", "body2"])
+            assert mock_pika.call_count == 1  # No retry
+            mock_channel.tx_commit.assert_not_called()
+
+    def test_publish_many_unroutable(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+
+            # The broker returns each message of the batch before the commit-ok
+            def return_batch():
+                on_return = mock_channel.add_on_return_callback.call_args[0][0]
+                for publish in mock_channel.basic_publish.call_args_list:
+                    on_return(mock_channel, mocker.Mock(), mocker.Mock(),
+                              publish[1]['body'])
+            mock_connection.process_data_events.side_effect = \
+                lambda time_limit: return_batch()
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            with pytest.raises(pika.exceptions.UnroutableError) as err:
+                rabbit.publish_many("exchange1", "my_queue", ["body1", "body2"])
+            assert [m.body for m in err.value.messages] == ["body1", "body2"]
+            assert mock_pika.call_count == 1  # No retry
+            mock_channel.tx_commit.assert_called_once()
+
+    def test_publish_many_reuses_pooled_connection(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mock_pika = mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com", pool_size=2)
+
+            rabbit.publish_many("exchange1", "my_queue", ["body1"])
+            rabbit.publish_many("exchange1", "my_queue", ["body2"])
+            assert mock_pika.call_count == 1
+            mock_channel.tx_select.assert_called_once()
+
+            # The shared confirm channel is not used for batches
+            rabbit.basic_publish("exchange1", "my_queue", "{my: body}")
+            assert mock_pika.call_count == 2
+            mock_channel.confirm_delivery.assert_called_once()
+
+    def test_publish_many_pool_size(self, mocker, client):
+        with client.application.app_context():
+            mocker.patch('pika.BlockingConnection')
+            rabbit = RabbitAdaptor("amqp://test.com", pool_size=2)
+
+            first = rabbit._acquire_publisher()
+            second = rabbit._acquire_publisher()
+            assert first is not second
+
+            # Pool exhausted, so the next caller gets a returned publisher
+            rabbit._release_publisher(first)
+            assert rabbit._acquire_publisher() is first
+
+    def test_close_connection_closes_publishers(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+            rabbit.publish_many("exchange1", "my_queue", ["body1"])
+
+            rabbit.close_connection()
+            mock_connection.close.assert_called_once()
+
+    def test_retry_backoff(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_channel.basic_publish = mocker.Mock(
+                side_effect=[
+                    pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.AMQPConnectionError,
+                    pika.exceptions.AMQPConnectionError,
+                    "ok"
+                ]
+            )
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            mocker.patch('random.uniform', return_value=1.0)
+            mock_sleep = mocker.patch('time.sleep')
+            rabbit = RabbitAdaptor("amqp://test.com", retry_interval=1,
+                                   max_retry_interval=3)
+
+            rabbit.basic_publish("exchange1", "my_queue", "{my: body}")
+            assert mock_channel.basic_publish.call_count == 5
+            # First retry is immediate, then the delay doubles up to the limit
+            assert mock_sleep.call_args_list == [mocker.call(1), mocker.call(2),
+                                                 mocker.call(3)]
+
+    def test_retry_gives_up(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_channel.queue_declare = mocker.Mock(
+                side_effect=pika.exceptions.AMQPConnectionError)
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            mocker.patch('time.sleep')
+            rabbit = RabbitAdaptor("amqp://test.com", max_retries=2)
+
+            with pytest.raises(pika.exceptions.AMQPConnectionError):
+                rabbit.setup_queue("my_queue")
+            assert mock_channel.queue_declare.call_count == 3
+
+    def test_declarations_cached(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            for _ in range(2):
+                rabbit.setup_exchange("exchange1")
+                rabbit.setup_queue("my_queue")
+                rabbit.bind_queue_to_exchange("exchange1", "my_queue")
+
+            mock_channel.exchange_declare.assert_called_once_with(exchange="exchange1")
+            mock_channel.queue_declare.assert_called_once_with(queue="my_queue")
+            mock_channel.queue_bind.assert_called_once()
+
+            # A new connection forgets what was declared on the old one
+            rabbit.reset_closed()
+            rabbit.setup_exchange("exchange1")
+            assert mock_channel.exchange_declare.call_count == 2
+
+    def test_declarations_not_cached_on_failure(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_channel.queue_bind = mocker.Mock(
+                side_effect=[pika.exceptions.AMQPChannelError, "ok"])
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            with pytest.raises(pika.exceptions.AMQPChannelError):
+                rabbit.bind_queue_to_exchange("exchange1", "my_queue")
+            rabbit.bind_queue_to_exchange("exchange1", "my_queue")
+            assert mock_channel.queue_bind.call_count == 2
+
+    def test_declarations_cache_bounded(self, mocker, client):
+        with client.application.app_context():
+            mocker.patch('pika.BlockingConnection')
+            rabbit = RabbitAdaptor("amqp://test.com")
+            rabbit.MAX_DECLARED = 2
+
+            rabbit.setup_queue("q1")
+            rabbit.setup_queue("q2")
+            rabbit.setup_queue("q3")
+            assert rabbit._declared == {('queue', 'q3')}
+
+    def test_setup_request_topology(self, mocker, client):
+        with client.application.app_context():
+            mock_connection = mocker.Mock()
+            mock_channel = mocker.Mock()
+            mock_connection.channel = mocker.Mock(return_value=mock_channel)
+            mocker.patch('pika.BlockingConnection', return_value=mock_connection)
+            rabbit = RabbitAdaptor("amqp://test.com")
+
+            rabbit.setup_request_topology("1234")
+            assert mock_channel.exchange_declare.call_args_list == [
+                mocker.call(exchange='transformation_requests'),
+                mocker.call(exchange='transformation_failures')
+            ]
+            assert mock_channel.queue_declare.call_args_list == [
+                mocker.call(queue='1234'),
+                mocker.call(queue='1234_errors')
+            ]
+            assert mock_channel.queue_bind.call_args_list == [
+                mocker.call(exchange='transformation_requests', queue='1234',
+                            routing_key='1234'),
+                mocker.call(exchange='transformation_failures', queue='1234_errors',
+                            routing_key='1234_errors')
+            ]
+
+            # The shared exchanges are not declared again for the next request
+            rabbit.setup_request_topology("5678")
+            assert mock_channel.exchange_declare.call_count == 2
+            assert mock_channel.queue_declare.call_count == 4
+            assert mock_channel.queue_bind.call_count == 4
+
     def test_setup_exchange(self, mocker, client):
         with client.application.app_context():
             mock_connection = mocker.Mock()
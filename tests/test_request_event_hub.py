@@ -0,0 +1,127 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+from servicex.request_event_hub import RequestEventHub, Subscription
+
+
+class TestRequestEventHub:
+    def test_publish_to_watchers(self):
+        hub = RequestEventHub()
+        first = hub.subscribe('1234')
+        second = hub.subscribe('1234')
+        other = hub.subscribe('5678')
+
+        hub.publish('1234', 'file-complete', {'file-id': 42})
+
+        assert first.get(timeout=0) == ('file-complete', {'file-id': 42})
+        assert second.get(timeout=0) == ('file-complete', {'file-id': 42})
+        assert other.get(timeout=0) is None
+
+    def test_unsubscribe(self):
+        hub = RequestEventHub()
+        subscription = hub.subscribe('1234')
+        assert hub.is_watched('1234')
+
+        hub.unsubscribe(subscription)
+        hub.publish('1234', 'file-complete', {'file-id': 42})
+
+        assert not hub.is_watched('1234')
+        assert hub.watched() == set()
+        assert subscription.get(timeout=0) is None
+
+    def test_max_subscriptions(self):
+        hub = RequestEventHub(max_subscriptions=2)
+        first = hub.subscribe('1234')
+        assert hub.subscribe('5678') is not None
+        assert hub.subscribe('1234') is None
+
+        hub.unsubscribe(first)
+        hub.unsubscribe(first)
+        assert hub.subscribe('1234') is not None
+        assert hub.subscribe('1234') is None
+
+    def test_publish_status_skips_repeats(self):
+        hub = RequestEventHub()
+        subscription = hub.subscribe('1234', {'status': 'Submitted'})
+
+        hub.publish_status('1234', {'status': 'Submitted'})
+        hub.publish_status('1234', {'status': 'Running'})
+        hub.publish_status('1234', {'status': 'Running'})
+
+        assert subscription.get(timeout=0) == ('status', {'status': 'Running'})
+        assert subscription.get(timeout=0) is None
+
+    def test_publish_status_unwatched(self):
+        hub = RequestEventHub()
+        hub.publish_status('1234', {'status': 'Running'})
+        subscription = hub.subscribe('1234')
+        hub.publish_status('1234', {'status': 'Running'})
+        assert subscription.get(timeout=0) == ('status', {'status': 'Running'})
+
+    def test_slow_watcher_drops_oldest(self):
+        subscription = Subscription('1234', max_events=2)
+        for i in range(3):
+            subscription.put(('file-complete', {'file-id': i}))
+
+        assert subscription.get(timeout=0) == ('file-complete', {'file-id': 1})
+        assert subscription.get(timeout=0) == ('file-complete', {'file-id': 2})
+
+    def test_poll(self, mocker):
+        from servicex.models import TransformRequest
+        running = mocker.Mock(request_id='1234')
+        running.progress_json.return_value = {'status': 'Running'}
+        mock_return_requests = mocker.patch.object(
+            TransformRequest, 'return_requests', return_value=[running])
+
+        hub = RequestEventHub()
+        first = hub.subscribe('1234')
+        second = hub.subscribe('1234')
+        hub.poll()
+
+        mock_return_requests.assert_called_once_with({'1234'})
+        assert first.get(timeout=0) == ('status', {'status': 'Running'})
+        assert second.get(timeout=0) == ('status', {'status': 'Running'})
+
+    def test_poll_nothing_watched(self, mocker):
+        from servicex.models import TransformRequest
+        mock_return_requests = mocker.patch.object(TransformRequest, 'return_requests')
+        RequestEventHub().poll()
+        mock_return_requests.assert_not_called()
+
+    def test_no_poller_without_app(self, mocker):
+        mock_thread = mocker.patch('servicex.request_event_hub.threading.Thread')
+        RequestEventHub().subscribe('1234')
+        mock_thread.assert_not_called()
+
+    def test_poller_started_once(self, mocker):
+        mock_thread = mocker.patch('servicex.request_event_hub.threading.Thread')
+        mock_thread.return_value.is_alive.return_value = True
+        hub = RequestEventHub(mocker.Mock())
+        hub.subscribe('1234')
+        hub.subscribe('5678')
+        mock_thread.assert_called_once()
+        mock_thread.return_value.start.assert_called_once()
@@ -30,6 +30,7 @@ import zipfile
 
 import pytest
 import re
+from unittest.mock import call
 from servicex import TransformerManager
 
 from tests.resource_test_base import ResourceTestBase
@@ -65,6 +66,61 @@ class TestTransformerManager(ResourceTestBase):
             mock_kubernetes.config.load_incluster_config.assert_not_called()
             mock_kubernetes.config.load_kube_config.assert_not_called()
 
+    def test_shared_api_client(self, mock_kubernetes):
+        transformer = TransformerManager('external-kubernetes', pool_size=7)
+        configuration = mock_kubernetes.client.Configuration.get_default_copy.return_value
+        assert configuration.connection_pool_maxsize == 7
+        mock_kubernetes.client.ApiClient.assert_called_once_with(configuration)
+
+        client = self._test_client(
+            extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False},
+            transformation_manager=transformer,
+        )
+        with client.application.app_context():
+            transformer.get_deployment_status("1234")
+            transformer.get_deployment_statuses(["1234"])
+            transformer.configmap_exists("generated-code-abc", "my-ws")
+
+        api_client = mock_kubernetes.client.ApiClient.return_value
+        mock_kubernetes.client.ApiClient.assert_called_once()
+        assert mock_kubernetes.client.AppsV1Api.call_args_list == [
+            call(api_client), call(api_client)]
+        mock_kubernetes.client.CoreV1Api.assert_called_once_with(api_client)
+
+    def test_shared_api_client_uses_loaded_config(self, mocker, tmp_path):
+        from kubernetes import client
+        kube_config = tmp_path / "config"
+        kube_config.write_text("""
+apiVersion: v1
+kind: Config
+clusters:
+- name: test
+  cluster:
+    server: https://k8s.example.com:6443
+contexts:
+- name: test
+  context:
+    cluster: test
+    user: test
+current-context: test
+users:
+- name: test
+  user:
+    token: abc123
+""")
+        mocker.patch('kubernetes.config.kube_config.KUBE_CONFIG_DEFAULT_LOCATION',
+                     str(kube_config))
+        previous = client.Configuration._default
+        try:
+            transformer = TransformerManager('external-kubernetes', pool_size=7)
+        finally:
+            client.Configuration.set_default(previous)
+
+        configuration = transformer._api_client.configuration
+        assert configuration.host == 'https://k8s.example.com:6443'
+        assert configuration.connection_pool_maxsize == 7
+        assert transformer._apps_api().api_client is transformer._api_client
+
     def test_launch_transformer_jobs(self, mocker):
         import kubernetes
 
@@ -84,6 +140,9 @@ class TestTransformerManager(ResourceTestBase):
         client = self._test_client(transformation_manager=transformer,
                                    extra_config=cfg)
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -133,6 +192,9 @@ class TestTransformerManager(ResourceTestBase):
             extra_config=cfg, transformation_manager=transformer
         )
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -163,6 +225,9 @@ class TestTransformerManager(ResourceTestBase):
             extra_config=additional_config, transformation_manager=transformer
         )
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -195,6 +260,9 @@ class TestTransformerManager(ResourceTestBase):
             extra_config=cfg, transformation_manager=transformer
         )
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -234,6 +302,9 @@ class TestTransformerManager(ResourceTestBase):
             extra_config=my_config, transformation_manager=transformer
         )
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -271,6 +342,9 @@ class TestTransformerManager(ResourceTestBase):
             extra_config=cfg, transformation_manager=transformer
         )
 
+        # The first request initialises the database
+        client.get('/servicex')
+
         with client.application.app_context():
             transformer.launch_transformer_jobs(
                 image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
@@ -302,13 +376,14 @@ class TestTransformerManager(ResourceTestBase):
 
         transformer = TransformerManager('external-kubernetes')
         client = self._test_client(transformation_manager=transformer)
+        client.get('/servicex')
 
         with client.application.app_context():
-            transformer.shutdown_transformer_job('1234', 'my-ns')
+            transformer.shutdown_transformer_job('1234', 'my-ns', 'generated-code-abc')
             mock_api.delete_namespaced_deployment.assert_called_with(name='transformer-1234',
                                                                      namespace='my-ns')
             mock_core_api.delete_namespaced_config_map.assert_called_with(
-                name='1234-generated-source',
+                name='generated-code-abc',
                 namespace='my-ns'
             )
             mock_autoscaling.delete_namespaced_horizontal_pod_autoscaler.assert_called_with(
@@ -336,17 +411,267 @@ class TestTransformerManager(ResourceTestBase):
             extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False},
             transformation_manager=transformer,
         )
+        client.get('/servicex')
 
         with client.application.app_context():
-            transformer.shutdown_transformer_job('1234', 'my-ns')
+            transformer.shutdown_transformer_job('1234', 'my-ns', 'generated-code-abc')
             mock_api.delete_namespaced_deployment.assert_called_with(name='transformer-1234',
                                                                      namespace='my-ns')
             mock_core_api.delete_namespaced_config_map.assert_called_with(
-                name='1234-generated-source',
+                name='generated-code-abc',
                 namespace='my-ns'
             )
             mock_autoscaling.delete_namespaced_horizontal_pod_autoscaler.assert_not_called()
 
+    def test_shutdown_transformer_jobs_shared_configmap(self, mocker):
+        from datetime import datetime
+        import kubernetes
+        from servicex.models import TransformRequest, db
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mocker.patch.object(kubernetes.client, 'AppsV1Api')
+        mock_core_api = mocker.MagicMock(kubernetes.client.CoreV1Api)
+        mocker.patch.object(kubernetes.client, 'CoreV1Api',
+                            return_value=mock_core_api)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False},
+            transformation_manager=transformer,
+        )
+        client.get('/servicex')
+
+        with client.application.app_context():
+            for request_id in ['1234', '5678']:
+                request = self._generate_transform_request()
+                request.request_id = request_id
+                request.submit_time = datetime.utcnow()
+                request.workflow_name = 'selection_codegen'
+                request.generated_code_cm = 'generated-code-abc'
+                request.save_to_db()
+            db.session.commit()
+
+            transformer.shutdown_transformer_job('1234', 'my-ns', 'generated-code-abc')
+            mock_core_api.delete_namespaced_config_map.assert_not_called()
+
+            TransformRequest.return_request('1234').status = 'Complete'
+            db.session.commit()
+            transformer.shutdown_transformer_job('5678', 'my-ns', 'generated-code-abc')
+            mock_core_api.delete_namespaced_config_map.assert_called_with(
+                name='generated-code-abc', namespace='my-ns')
+
+    def test_shutdown_transformer_jobs_no_generated_code(self, mocker):
+        import kubernetes
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mocker.patch.object(kubernetes.client, 'AppsV1Api')
+        mock_core_api = mocker.MagicMock(kubernetes.client.CoreV1Api)
+        mocker.patch.object(kubernetes.client, 'CoreV1Api',
+                            return_value=mock_core_api)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False},
+            transformation_manager=transformer,
+        )
+
+        with client.application.app_context():
+            transformer.shutdown_transformer_job('1234', 'my-ns')
+            mock_core_api.delete_namespaced_config_map.assert_not_called()
+
+    def test_async_operations(self, mocker):
+        import kubernetes
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.AppsV1Api)
+        mocker.patch.object(kubernetes.client, 'AppsV1Api', return_value=mock_api)
+        mock_autoscaling = mocker.Mock()
+        mocker.patch.object(kubernetes.client, 'AutoscalingV1Api', return_value=mock_autoscaling)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_CPU_LIMIT': 1,
+                          'TRANSFORMER_CPU_SCALE_THRESHOLD': 30,
+                          'TRANSFORMER_ASYNC_OPERATIONS': True},
+            transformation_manager=transformer,
+        )
+
+        # The first request initialises the database
+        client.get('/servicex')
+
+        with client.application.app_context():
+            transformer.launch_transformer_jobs(
+                image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
+                chunk_size=5000, rabbitmq_uri='ampq://test.com', namespace='my-ns',
+                result_destination='kafka', result_format='arrow', x509_secret='x509',
+                generated_code_cm=None)
+            transformer.shutdown_transformer_job('1234', 'my-ns')
+            transformer._work_queue.join()
+
+        mock_api.create_namespaced_deployment.assert_called_once()
+        mock_api.delete_namespaced_deployment.assert_called_once_with(name='transformer-1234',
+                                                                      namespace='my-ns')
+        mock_autoscaling.create_namespaced_horizontal_pod_autoscaler.assert_called_once()
+        mock_autoscaling.delete_namespaced_horizontal_pod_autoscaler.assert_called_once_with(
+            name='transformer-1234', namespace='my-ns')
+        transformer._work_queue.close()
+
+    def test_async_launch_ensures_generated_code_first(self, mocker):
+        import kubernetes
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.AppsV1Api)
+        mocker.patch.object(kubernetes.client, 'AppsV1Api', return_value=mock_api)
+        mocker.patch.object(kubernetes.client, 'AutoscalingV1Api')
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_CPU_LIMIT': 1,
+                          'TRANSFORMER_CPU_SCALE_THRESHOLD': 30,
+                          'TRANSFORMER_AUTOSCALE_ENABLED': False,
+                          'TRANSFORMER_ASYNC_OPERATIONS': True},
+            transformation_manager=transformer,
+        )
+        client.get('/servicex')
+
+        calls = []
+        ensure_generated_code = mocker.Mock(
+            side_effect=lambda: calls.append('ensure_generated_code'))
+        mock_api.create_namespaced_deployment.side_effect = \
+            lambda **kwargs: calls.append('create_deployment')
+
+        with client.application.app_context():
+            transformer.launch_transformer_jobs(
+                image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
+                chunk_size=5000, rabbitmq_uri='ampq://test.com', namespace='my-ns',
+                result_destination='kafka', result_format='arrow', x509_secret='x509',
+                generated_code_cm='my-config-map',
+                ensure_generated_code=ensure_generated_code)
+            transformer._work_queue.join()
+
+        assert calls == ['ensure_generated_code', 'create_deployment']
+        transformer._work_queue.close()
+
+    def test_operations_are_idempotent(self, mocker):
+        import kubernetes
+        from kubernetes.client.rest import ApiException
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.AppsV1Api)
+        mock_api.create_namespaced_deployment.side_effect = ApiException(status=409)
+        mock_api.delete_namespaced_deployment.side_effect = ApiException(status=404)
+        mocker.patch.object(kubernetes.client, 'AppsV1Api', return_value=mock_api)
+        mock_autoscaling = mocker.Mock()
+        mock_autoscaling.create_namespaced_horizontal_pod_autoscaler.side_effect = \
+            ApiException(status=409)
+        mock_autoscaling.delete_namespaced_horizontal_pod_autoscaler.side_effect = \
+            ApiException(status=404)
+        mocker.patch.object(kubernetes.client, 'AutoscalingV1Api', return_value=mock_autoscaling)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_CPU_LIMIT': 1,
+                          'TRANSFORMER_CPU_SCALE_THRESHOLD': 30},
+            transformation_manager=transformer,
+        )
+
+        # The first request initialises the database
+        client.get('/servicex')
+
+        with client.application.app_context():
+            transformer.launch_transformer_jobs(
+                image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
+                chunk_size=5000, rabbitmq_uri='ampq://test.com', namespace='my-ns',
+                result_destination='kafka', result_format='arrow', x509_secret='x509',
+                generated_code_cm=None)
+            transformer.shutdown_transformer_job('1234', 'my-ns')
+
+            mock_api.create_namespaced_deployment.side_effect = ApiException(status=500)
+            with pytest.raises(ApiException):
+                transformer.launch_transformer_jobs(
+                    image='sslhep/servicex-transformer:pytest', request_id='1234',
+                    workers=17, chunk_size=5000, rabbitmq_uri='ampq://test.com',
+                    namespace='my-ns', result_destination='kafka', result_format='arrow',
+                    x509_secret='x509', generated_code_cm=None)
+
+    def _saved_request(self, client, status):
+        from datetime import datetime
+        from servicex.models import db
+        with client.application.app_context():
+            request = self._generate_transform_request()
+            request.request_id = '1234'
+            request.submit_time = datetime.utcnow()
+            request.workflow_name = 'straight_transform'
+            request.status = status
+            request.save_to_db()
+            db.session.commit()
+
+    def test_async_launch_failure_marks_request_fatal(self, mocker):
+        import kubernetes
+        from kubernetes.client.rest import ApiException
+        from servicex.models import TransformRequest
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.AppsV1Api)
+        mock_api.create_namespaced_deployment.side_effect = ApiException(status=403)
+        mocker.patch.object(kubernetes.client, 'AppsV1Api', return_value=mock_api)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False,
+                          'TRANSFORMER_CPU_LIMIT': 1,
+                          'TRANSFORMER_ASYNC_OPERATIONS': True},
+            transformation_manager=transformer,
+        )
+        client.get('/servicex')
+        self._saved_request(client, 'Running')
+
+        with client.application.app_context():
+            transformer.launch_transformer_jobs(
+                image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
+                chunk_size=5000, rabbitmq_uri='ampq://test.com', namespace='my-ns',
+                result_destination='kafka', result_format='arrow', x509_secret='x509',
+                generated_code_cm=None)
+            transformer._work_queue.join()
+
+            request = TransformRequest.return_request('1234')
+            assert request.status == 'Fatal'
+            assert 'create deployment transformer-1234' in request.failure_description
+        transformer._work_queue.close()
+
+    def test_launch_after_request_finished(self, mocker):
+        import kubernetes
+
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.AppsV1Api)
+        mocker.patch.object(kubernetes.client, 'AppsV1Api', return_value=mock_api)
+        mock_autoscaling = mocker.Mock()
+        mocker.patch.object(kubernetes.client, 'AutoscalingV1Api', return_value=mock_autoscaling)
+
+        transformer = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_CPU_LIMIT': 1,
+                          'TRANSFORMER_CPU_SCALE_THRESHOLD': 30},
+            transformation_manager=transformer,
+        )
+        client.get('/servicex')
+        # Another worker completed the request and shut down its transformers
+        self._saved_request(client, 'Complete')
+
+        with client.application.app_context():
+            transformer.launch_transformer_jobs(
+                image='sslhep/servicex-transformer:pytest', request_id='1234', workers=17,
+                chunk_size=5000, rabbitmq_uri='ampq://test.com', namespace='my-ns',
+                result_destination='kafka', result_format='arrow', x509_secret='x509',
+                generated_code_cm=None)
+
+        mock_api.create_namespaced_deployment.assert_called_once()
+        mock_api.delete_namespaced_deployment.assert_called_once_with(
+            name='transformer-1234', namespace='my-ns')
+        mock_autoscaling.create_namespaced_horizontal_pod_autoscaler.assert_called_once()
+        mock_autoscaling.delete_namespaced_horizontal_pod_autoscaler.assert_called_once_with(
+            name='transformer-1234', namespace='my-ns')
+
     def test_create_configmap_from_zip(self, mocker):
         import kubernetes
         mocker.patch.object(kubernetes.config, 'load_kube_config')
@@ -366,7 +691,7 @@ class TestTransformerManager(ResourceTestBase):
         mock_open.read = mocker.Mock(return_value=b'hi there')
         mock_zip.open = mocker.Mock(return_value=mock_open)
 
-        transformer.create_configmap_from_zip(mock_zip, "my-request", "servicex")
+        transformer.create_configmap_from_zip(mock_zip, "generated-code-abc", "servicex")
 
         mock_create_namespaced_config_map.assert_called()
         calls = mock_create_namespaced_config_map.call_args
@@ -375,7 +700,43 @@ class TestTransformerManager(ResourceTestBase):
             b64encode(b"hi there").\
             decode("ascii")
         assert calls[1]['namespace'] == 'servicex'
-        assert calls[1]['body'].metadata.name == 'my-request-generated-source'
+        assert calls[1]['body'].metadata.name == 'generated-code-abc'
+
+    def test_create_configmap_from_zip_exists(self, mocker):
+        import kubernetes
+        from kubernetes.client.rest import ApiException
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.CoreV1Api)
+        mocker.patch.object(kubernetes.client, 'CoreV1Api',
+                            return_value=mock_api)
+        mock_api.create_namespaced_config_map.side_effect = ApiException(status=409)
+
+        transformer = TransformerManager('external-kubernetes')
+        mock_zip = mocker.MagicMock(zipfile.ZipFile)
+        mock_zip.filelist = []
+
+        name = transformer.create_configmap_from_zip(mock_zip, "generated-code-abc", "servicex")
+        assert name == "generated-code-abc"
+
+    def test_configmap_exists(self, mocker):
+        import kubernetes
+        from kubernetes.client.rest import ApiException
+        mocker.patch.object(kubernetes.config, 'load_kube_config')
+        mock_api = mocker.MagicMock(kubernetes.client.CoreV1Api)
+        mocker.patch.object(kubernetes.client, 'CoreV1Api',
+                            return_value=mock_api)
+
+        transformer = TransformerManager('external-kubernetes')
+        assert transformer.configmap_exists("generated-code-abc", "servicex")
+        mock_api.read_namespaced_config_map.assert_called_with(name="generated-code-abc",
+                                                               namespace="servicex")
+
+        mock_api.read_namespaced_config_map.side_effect = ApiException(status=404)
+        assert not transformer.configmap_exists("generated-code-abc", "servicex")
+
+        mock_api.read_namespaced_config_map.side_effect = ApiException(status=500)
+        with pytest.raises(ApiException):
+            transformer.configmap_exists("generated-code-abc", "servicex")
 
     def test_get_deployment_status(self, mocker, mock_kubernetes):
         mock_api = mock_kubernetes.client.AppsV1Api.return_value
@@ -394,6 +755,70 @@ class TestTransformerManager(ResourceTestBase):
             status = transformer_manager.get_deployment_status("1234")
             assert status == mock_deployment.status
 
+    def test_get_deployment_statuses(self, mocker, mock_kubernetes):
+        mock_api = mock_kubernetes.client.AppsV1Api.return_value
+        mock_deployment_list = mocker.MagicMock(name="mock_deployment_list")
+        mock_api.list_namespaced_deployment.return_value = mock_deployment_list
+        deployments = []
+        for name in ['transformer-1234', 'transformer-5678', 'servicex-app']:
+            deployment = mocker.MagicMock(name=name)
+            deployment.metadata.name = name
+            deployments.append(deployment)
+        mock_deployment_list.items = deployments
+
+        transformer_manager = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_AUTOSCALE_ENABLED': False},
+            transformation_manager=transformer_manager,
+        )
+
+        with client.application.app_context():
+            statuses = transformer_manager.get_deployment_statuses(["1234", "9999"])
+            assert statuses == {"1234": deployments[0].status}
+            mock_api.list_namespaced_deployment.assert_called_once_with('my-ws')
+
+    def test_get_deployment_status_from_informer(self, mocker, mock_kubernetes):
+        mock_informer_cls = mocker.patch('servicex.transformer_manager.DeploymentInformer')
+        mock_informer = mock_informer_cls.return_value
+        mock_informer.synced = True
+        mock_api = mock_kubernetes.client.AppsV1Api.return_value
+
+        transformer_manager = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_WATCH_DEPLOYMENTS': True},
+            transformation_manager=transformer_manager,
+        )
+
+        with client.application.app_context():
+            assert transformer_manager.get_deployment_status("1234") == \
+                mock_informer.get.return_value
+            assert transformer_manager.get_deployment_statuses(["1234"]) == \
+                mock_informer.get_many.return_value
+
+        mock_informer_cls.assert_called_once_with(
+            'my-ws', mocker.ANY, api_client=mock_kubernetes.client.ApiClient.return_value)
+        mock_informer.start.assert_called_once()
+        mock_informer.get.assert_called_once_with("1234")
+        mock_api.list_namespaced_deployment.assert_not_called()
+
+    def test_get_deployment_status_informer_not_synced(self, mocker, mock_kubernetes):
+        mock_informer_cls = mocker.patch('servicex.transformer_manager.DeploymentInformer')
+        mock_informer_cls.return_value.synced = False
+        mock_api = mock_kubernetes.client.AppsV1Api.return_value
+        mock_deployment = mocker.MagicMock(name="mock_deployment")
+        mock_api.list_namespaced_deployment.return_value.items = [mock_deployment]
+
+        transformer_manager = TransformerManager('external-kubernetes')
+        client = self._test_client(
+            extra_config={'TRANSFORMER_WATCH_DEPLOYMENTS': True},
+            transformation_manager=transformer_manager,
+        )
+
+        with client.application.app_context():
+            assert transformer_manager.get_deployment_status("1234") == \
+                mock_deployment.status
+        mock_informer_cls.return_value.get.assert_not_called()
+
     def test_get_deployment_status_404(self, mocker, mock_kubernetes):
         mock_api = mock_kubernetes.client.AppsV1Api.return_value
         mock_deployment_list = mocker.MagicMock(name="mock_deployment_list")
@@ -0,0 +1,50 @@
+# Copyright (c) 2019, IRIS-HEP
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+#
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# * Neither the name of the copyright holder nor the names of its
+#   contributors may be used to endorse or promote products derived from
+#   this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import pytest
+
+from servicex.version import resolve_app_version
+
+# Python < 3.8 resolves the version with pkg_resources instead
+metadata = pytest.importorskip('importlib.metadata')
+
+
+class TestResolveAppVersion:
+    def test_installed(self, mocker):
+        mock_version = mocker.patch('importlib.metadata.version', return_value='1.0.4')
+        assert resolve_app_version() == '1.0.4'
+        mock_version.assert_called_once_with('servicex_app')
+
+    def test_not_installed(self, mocker):
+        mocker.patch('importlib.metadata.version',
+                     side_effect=metadata.PackageNotFoundError('servicex_app'))
+        assert resolve_app_version() == 'develop'
+
+    def test_override(self, mocker):
+        mock_version = mocker.patch('importlib.metadata.version')
+        assert resolve_app_version('2.0.0') == '2.0.0'
+        mock_version.assert_not_called()
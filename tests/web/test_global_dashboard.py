@@ -11,7 +11,7 @@ class TestGlobalDashboard(WebTestBase):
     @fixture
     def mock_query(self, mocker):
         mock_tr = mocker.patch("servicex.web.global_dashboard.TransformRequest")
-        return mock_tr.query.order_by.return_value
+        return mock_tr.dashboard_query.return_value
 
     def test_get_empty_state(self, client, user, mock_query, captured_templates):
         pagination = Pagination(mock_query, page=1, per_page=15, total=0, items=[])
@@ -31,3 +31,20 @@ class TestGlobalDashboard(WebTestBase):
         template, context = captured_templates[0]
         assert template.name == "global_dashboard.html"
         assert context["pagination"] == pagination
+
+    def test_get_page_queries(self, count_queries):
+        client = self._test_client(extra_config={'ENABLE_AUTH': True})
+        self._populate_requests(client, count=30)
+        with client.session_transaction() as sess:
+            sess['is_authenticated'] = True
+            sess['admin'] = True
+
+        with count_queries(client.application) as queries:
+            response: Response = client.get(url_for('global-dashboard'))
+
+        assert response.status_code == 200
+        # One to count the requests for the pager and one for the page itself
+        assert len(queries) == 2
+        assert b'Request 29' in response.data
+        assert b'John Doe' in response.data
+        assert b'Jane Doe' in response.data
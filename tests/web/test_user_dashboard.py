@@ -11,7 +11,7 @@ class TestUserDashboard(WebTestBase):
     @fixture
     def mock_query(self, mocker):
         mock_tr = mocker.patch("servicex.web.user_dashboard.TransformRequest")
-        return mock_tr.query.filter_by.return_value.order_by.return_value
+        return mock_tr.dashboard_query.return_value
 
     def test_get_empty_state(self, client, user, mock_query, captured_templates):
         with client.session_transaction() as sess:
@@ -35,3 +35,19 @@ class TestUserDashboard(WebTestBase):
         template, context = captured_templates[0]
         assert template.name == 'user_dashboard.html'
         assert context["pagination"] == pagination
+
+    def test_get_page_queries(self, count_queries):
+        client = self._test_client(extra_config={'ENABLE_AUTH': True})
+        users = self._populate_requests(client, count=30)
+        with client.session_transaction() as sess:
+            sess['is_authenticated'] = True
+            sess['user_id'] = users[0]
+
+        with count_queries(client.application) as queries:
+            response: Response = client.get(url_for('user-dashboard'))
+
+        assert response.status_code == 200
+        # One to count the requests for the pager and one for the page itself
+        assert len(queries) == 2
+        assert b'Request 28' in response.data
+        assert b'Request 29' not in response.data
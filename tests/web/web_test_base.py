@@ -166,6 +166,34 @@ class WebTestBase:
         defaults.update(kwargs)
         return TransformRequest(**defaults)
 
+    @staticmethod
+    def _populate_requests(client, count=10):
+        """Save two users and count requests alternating between them"""
+        from servicex.models import UserModel, db
+
+        # The first request initialises the database
+        client.get('/servicex')
+        with client.application.app_context():
+            # The session registry is per-thread, so drop any session that
+            # another test's application left behind
+            db.session.remove()
+            users = []
+            for name in ['Jane Doe', 'John Doe']:
+                user = UserModel(name=name, email=f"{name.split()[0]}@example.com",
+                                 sub=name.split()[0], institution='UChicago',
+                                 experiment='ATLAS', refresh_token=name)
+                user.save_to_db()
+                users.append(user.id)
+            for i in range(count):
+                WebTestBase._test_transformation_req(
+                    id=i + 1, request_id=f"request-{i}", title=f"Request {i}",
+                    status='Running', files=10, completed_files=i,
+                    submitted_by=users[i % 2], result_destination='object-store',
+                    result_format='parquet', workflow_name='straight_transform'
+                ).save_to_db()
+            db.session.commit()
+        return users
+
     @fixture
     def client(self):
         return self._test_client()